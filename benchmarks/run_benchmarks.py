@@ -0,0 +1,273 @@
+"""
+Microbenchmarks for the evaluator, the operator modules and the log database.
+
+    python benchmarks/run_benchmarks.py [--quick] [--filter TEXT] [--output results.json]
+                                        [--save-baseline] [--tolerance 0.25]
+
+Every case reports ops/s, p50/p99 latency per call and memory allocated per call.
+Results are compared with benchmarks/baseline.json when it exists; a case that is
+slower than the baseline by more than the tolerance is a regression and makes the
+script exit with status 1. Logging goes to a temporary database, never to the real log.
+
+No baseline is committed, since ops/s depend on the machine. Create one on the machine
+the comparisons run on, before making the change to be measured:
+
+    python benchmarks/run_benchmarks.py --save-baseline
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+CALCULATOR_DIR = os.path.join(BENCHMARK_DIR, "..", "calculator")
+BASELINE_FILE = os.path.join(BENCHMARK_DIR, "baseline.json")
+
+os.environ.setdefault("CALCULATOR_HEADLESS", "1")
+sys.path.insert(0, CALCULATOR_DIR)
+
+import basic_operators  # noqa: E402
+import complex_operators  # noqa: E402
+import db_log  # noqa: E402
+import expression_evaluator  # noqa: E402
+import trigonometry  # noqa: E402
+
+# Expressions of the evaluator cases. They use variables, since constant expressions
+# are folded to a single value when they are compiled and would measure little else
+# than the cache lookup.
+EXPRESSIONS = {
+    "simple": "a+b*c-d/e",
+    "nested": "((a+b)*(c+d)-(e-f)/(g+h))^2",
+    "trig_heavy": "sin(a)+cos(b)*tan(c)-arcsin(d)+arccos(e)*arctan(f)+cot(a)+arccot(b)",
+    "error_path": "a/(b-b)",
+}
+
+# Values of the variables of the evaluator cases
+VARIABLES = {"a": 1, "b": 2, "c": 0.5, "d": 0.3, "e": 0.2, "f": 4, "g": 7, "h": 8}
+
+
+def measure(function, min_time=0.2, samples=30):
+    """
+    Times a zero-argument callable.
+    :param min_time: Approximate total seconds spent measuring.
+    :param samples: Number of timed batches used for the latency percentiles.
+    :return: A dictionary of ops/s, p50/p99 latency in microseconds and memory per call.
+    """
+    # Calibrate the batch size so that one batch takes about min_time / samples
+    batch = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(batch):
+            function()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time / samples or batch >= 1_000_000:
+            break
+        batch *= 2
+
+    latencies = []
+    total_time = 0.0
+    for _ in range(samples):
+        start = time.perf_counter()
+        for _ in range(batch):
+            function()
+        elapsed = time.perf_counter() - start
+        total_time += elapsed
+        latencies.append(elapsed / batch)
+    latencies.sort()
+
+    # Memory allocated per call, measured separately since tracing slows the calls down
+    calls = min(batch, 1000)
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    tracemalloc.reset_peak()
+    blocks_before = sys.getallocatedblocks()
+    for _ in range(calls):
+        function()
+    blocks_after = sys.getallocatedblocks()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {
+        "ops_per_sec": round(batch * samples / total_time, 1),
+        "p50_us": round(latencies[len(latencies) // 2] * 1e6, 3),
+        "p99_us": round(latencies[min(len(latencies) - 1, math.ceil(len(latencies) * 0.99) - 1)] * 1e6, 3),
+        "peak_bytes_per_call": round(max(0, peak - before) / calls, 1),
+        "net_blocks_per_call": round((blocks_after - blocks_before) / calls, 3),
+        "calls_per_sample": batch,
+    }
+
+
+def raises(function, *arguments):
+    """
+    Returns a callable that calls function and swallows the ValueError it raises.
+    """
+    def call():
+        try:
+            function(*arguments)
+        except ValueError:
+            pass
+    return call
+
+
+def evaluator_cases():
+    cases = {}
+    for name, expression in EXPRESSIONS.items():
+        function = expression_evaluator.evaluate_expression
+        if name == "error_path":
+            cases[f"evaluate_expression.{name}"] = raises(function, expression, VARIABLES)
+        else:
+            cases[f"evaluate_expression.{name}"] = lambda e=expression: function(e, VARIABLES)
+        cases[f"evaluate_expression.{name}.no_log"] = raises(function, expression, VARIABLES, False)
+    return cases
+
+
+def operator_cases():
+    return {
+        "basic_operators.add": lambda: basic_operators.add(1.5, 2.25),
+        "basic_operators.subtract": lambda: basic_operators.subtract(1.5, 2.25),
+        "basic_operators.multiply": lambda: basic_operators.multiply(1.5, 2.25),
+        "basic_operators.divide": lambda: basic_operators.divide(1.5, 2.25),
+        "basic_operators.negate": lambda: basic_operators.negate(1.5),
+        "complex_operators.exponent": lambda: complex_operators.exponent(1.5, 2.25),
+        "complex_operators.logarithm": lambda: complex_operators.logarithm(100.0, 10),
+        "trigonometry.sin": lambda: trigonometry.sin(0.5),
+        "trigonometry.cos": lambda: trigonometry.cos(0.5),
+        "trigonometry.tan": lambda: trigonometry.tan(0.5),
+        "trigonometry.cot": lambda: trigonometry.cot(0.5),
+        "trigonometry.arcsin": lambda: trigonometry.arcsin(0.5),
+        "trigonometry.arccos": lambda: trigonometry.arccos(0.5),
+        "trigonometry.arctan": lambda: trigonometry.arctan(0.5),
+        "trigonometry.arccot": lambda: trigonometry.arccot(0.5),
+    }
+
+
+# Number of rows fill_database put in the table, None once a case wrote to it
+filled_rows = None
+
+
+def fill_database(rows):
+    """
+    Empties the benchmark database and inserts the given number of log rows, unless the
+    table already holds them from an earlier case.
+    """
+    global filled_rows
+    if filled_rows == rows:
+        return
+    db_log.reset_logs()
+    chunk = 50_000
+    for start in range(0, rows, chunk):
+        count = min(chunk, rows - start)
+        db_log.log_operations(
+            ("Expression Evaluation", f"{i}+{i}", 2 * i) for i in range(start, start + count)
+        )
+    filled_rows = rows
+
+
+def empty_database():
+    """
+    Empties the benchmark database for a case that writes to it.
+    """
+    global filled_rows
+    db_log.reset_logs()
+    filled_rows = None
+
+
+def database_cases(sizes):
+    """
+    Yields (name, callable, setup) tuples; setup prepares the table before measuring, so
+    every case can run on its own, e.g. when selected with --filter.
+    """
+    yield "db_log.log_operation", lambda: db_log.log_operation("Benchmark", "1+1", 2), empty_database
+    for rows in sizes:
+        setup = (lambda n=rows: fill_database(n))
+        yield f"db_log.fetch_logs[{rows}]", db_log.fetch_logs, setup
+        yield f"db_log.fetch_logs_page[{rows}]", (lambda n=rows: db_log.fetch_logs_page(after_id=n // 2, limit=100)), setup
+        yield f"db_log.fetch_logs_page.newest[{rows}]", (lambda: db_log.fetch_logs_page(limit=100, newest_first=True)), setup
+
+
+def compare(results, baseline, tolerance):
+    """
+    Compares ops/s with the baseline.
+    :return: A list of (case, baseline ops/s, current ops/s, change) for regressions.
+    """
+    regressions = []
+    for name, result in results.items():
+        reference = baseline.get("results", {}).get(name)
+        if not reference:
+            continue
+        change = result["ops_per_sec"] / reference["ops_per_sec"] - 1
+        result["change_vs_baseline"] = round(change, 3)
+        if change < -tolerance:
+            regressions.append((name, reference["ops_per_sec"], result["ops_per_sec"], change))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--quick", action="store_true", help="Shorter runs and small tables only.")
+    parser.add_argument("--filter", default="", help="Only run cases whose name contains this text.")
+    parser.add_argument("--db-sizes", default="1000,10000,100000",
+                        help="Comma separated table sizes for the fetch cases, up to 1000000.")
+    parser.add_argument("--output", help="Write the results as JSON to this file.")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="Baseline file to compare with.")
+    parser.add_argument("--save-baseline", action="store_true", help="Store the results as the new baseline.")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Allowed relative drop in ops/s before a case counts as a regression.")
+    args = parser.parse_args(argv)
+
+    min_time = 0.05 if args.quick else 0.3
+    sizes = [1000] if args.quick else [int(size) for size in args.db_sizes.split(",") if size]
+
+    temp_dir = tempfile.mkdtemp(prefix="calculator_bench_")
+    db_log.DB_FILE = os.path.join(temp_dir, "benchmark_log.db")
+
+    results = {}
+    cases = [(name, function, None) for name, function in {**evaluator_cases(), **operator_cases()}.items()]
+    cases += list(database_cases(sizes))
+    for name, function, setup in cases:
+        if args.filter not in name:
+            continue
+        if setup is not None:
+            setup()
+        results[name] = measure(function, min_time=min_time)
+        result = results[name]
+        print(f"{name:48} {result['ops_per_sec']:>14,.0f} ops/s  p50 {result['p50_us']:>10.2f} us"
+              f"  p99 {result['p99_us']:>10.2f} us  {result['peak_bytes_per_call']:>10.1f} B/call",
+              flush=True)
+    db_log.close_db()
+
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": results,
+    }
+
+    regressions = []
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as file:
+            regressions = compare(results, json.load(file), args.tolerance)
+        for name, before, after, change in regressions:
+            print(f"REGRESSION: {name}: {before:,.0f} -> {after:,.0f} ops/s ({change:+.1%})")
+        if not regressions:
+            print(f"No regressions against {args.baseline} (tolerance {args.tolerance:.0%}).")
+    elif not args.save_baseline:
+        print(f"No baseline at {args.baseline}, run with --save-baseline to create one.")
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w") as file:
+            json.dump(report, file, indent=2)
+        print(f"Baseline saved to {args.baseline}.")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,81 @@
+"""
+Measures the cold import time of expression_evaluator in fresh interpreters and fails
+if the median exceeds a budget, or if the headless import path pulls in tkinter.
+
+    python benchmarks/startup.py [--runs 15] [--budget-ms 75]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+CALCULATOR_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "calculator")
+
+# Runs in a fresh interpreter: times the import and reports which heavy modules got loaded
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import expression_evaluator
+elapsed = time.perf_counter() - start
+print(json.dumps({"seconds": elapsed, "tkinter": "tkinter" in sys.modules, "numpy": "numpy" in sys.modules}))
+"""
+
+
+def measure(runs):
+    """
+    Imports expression_evaluator in `runs` fresh interpreters.
+    :return: A list of the probe results.
+    """
+    env = dict(os.environ, CALCULATOR_HEADLESS="1")
+    results = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", PROBE], cwd=CALCULATOR_DIR, env=env,
+            capture_output=True, text=True, check=True
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=15, help="Number of fresh interpreters to start.")
+    parser.add_argument("--budget-ms", type=float, default=75.0, help="Maximum median import time.")
+    parser.add_argument("--json", action="store_true", help="Print the result as JSON.")
+    args = parser.parse_args(argv)
+
+    measure(1)  # Warm up the bytecode cache so only the import itself is measured
+    results = measure(args.runs)
+    times = sorted(result["seconds"] * 1000 for result in results)
+    summary = {
+        "runs": args.runs,
+        "median_ms": round(statistics.median(times), 2),
+        "min_ms": round(times[0], 2),
+        "max_ms": round(times[-1], 2),
+        "budget_ms": args.budget_ms,
+        "imports_tkinter": any(result["tkinter"] for result in results),
+        "imports_numpy": any(result["numpy"] for result in results),
+    }
+    failures = []
+    if summary["median_ms"] > args.budget_ms:
+        failures.append(f"median import time {summary['median_ms']} ms exceeds the budget of {args.budget_ms} ms")
+    if summary["imports_tkinter"]:
+        failures.append("importing expression_evaluator loads tkinter")
+    if summary["imports_numpy"]:
+        failures.append("importing expression_evaluator loads numpy")
+    summary["passed"] = not failures
+
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        print(f"expression_evaluator cold import: median {summary['median_ms']} ms "
+              f"(min {summary['min_ms']}, max {summary['max_ms']}, {args.runs} runs, budget {args.budget_ms} ms)")
+        for failure in failures:
+            print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,182 @@
+# Array versions of the calculator operations, used to evaluate one expression over many inputs.
+# Every kernel returns the result array and a boolean mask of the elements that are valid under
+# the domain rules of the scalar functions (None means all valid). Requires NumPy.
+import numpy as np
+import basic_operators
+import complex_operators
+import trigonometry
+from expression_parser import PUSH, LOAD, UNARY, BINARY, STORE, FETCH
+
+# Tolerance used by the scalar functions to detect poles and undefined values
+POLE_TOLERANCE = 1e-10
+
+
+def to_radians(angles):
+    """
+    Converts angles to radians if the configuration is set to degrees.
+    """
+    if trigonometry.angle_unit == "degrees":
+        return np.radians(angles)
+    return angles
+
+
+def masked(function, valid, *arguments):
+    """
+    Applies a NumPy function only where the mask is valid, leaving NaN elsewhere.
+    """
+    shape = np.broadcast_shapes(*(np.shape(a) for a in arguments), np.shape(valid))
+    out = np.full(shape, np.nan)
+    function(*arguments, out=out, where=valid)
+    return out, valid
+
+
+def add(a, b):
+    return np.add(a, b), None
+
+
+def subtract(a, b):
+    return np.subtract(a, b), None
+
+
+def multiply(a, b):
+    return np.multiply(a, b), None
+
+
+def negate(a):
+    return np.negative(a), None
+
+
+def divide(a, b):
+    """
+    Division with elements divided by zero marked invalid.
+    """
+    return masked(np.divide, np.asarray(b) != 0, a, b)
+
+
+def exponent(base, power):
+    """
+    Exponentiation with the rules of complex_operators.exponent applied per element.
+    """
+    base = np.asarray(base, dtype=float)
+    power = np.asarray(power, dtype=float)
+    undefined = (base == 0) & (power == 0)
+    undefined |= (base < 0) & (power != np.trunc(power))
+    undefined |= (base == 0) & (power < 0)
+    values, valid = masked(np.power, ~undefined, base, power)
+    return values, valid & np.isfinite(values)
+
+
+def logarithm(value, base=np.e):
+    """
+    Logarithm with non-positive values and invalid bases marked invalid.
+    """
+    value = np.asarray(value, dtype=float)
+    base = np.asarray(base, dtype=float)
+    valid = (value > 0) & (base > 0) & (base != 1)
+    safe_value = np.where(valid, value, 1.0)
+    safe_base = np.where(valid, base, np.e)
+    return masked(np.divide, valid, np.log(safe_value), np.log(safe_base))
+
+
+def sin(angles):
+    return np.sin(to_radians(angles)), None
+
+
+def cos(angles):
+    return np.cos(to_radians(angles)), None
+
+
+def tan(angles):
+    """
+    Tangent with angles where the cosine is zero marked invalid.
+    """
+    angles = to_radians(np.asarray(angles, dtype=float))
+    return masked(np.tan, np.abs(np.cos(angles)) > POLE_TOLERANCE, angles)
+
+
+def cot(angles):
+    """
+    Cotangent with angles where the sine is zero marked invalid.
+    """
+    angles = to_radians(np.asarray(angles, dtype=float))
+    valid = np.abs(np.sin(angles)) > POLE_TOLERANCE
+    values, valid = masked(np.tan, valid, angles)
+    return masked(np.divide, valid, 1.0, values)
+
+
+def arcsin(values):
+    values = np.asarray(values, dtype=float)
+    return masked(np.arcsin, (values >= -1) & (values <= 1), values)
+
+
+def arccos(values):
+    values = np.asarray(values, dtype=float)
+    return masked(np.arccos, (values >= -1) & (values <= 1), values)
+
+
+def arctan(values):
+    return np.arctan(values), None
+
+
+def arccot(values):
+    """
+    Arccotangent with values close to zero marked invalid.
+    """
+    values = np.asarray(values, dtype=float)
+    inverse, valid = masked(np.divide, np.abs(values) > POLE_TOLERANCE, 1.0, values)
+    return masked(np.arctan, valid, inverse)
+
+
+# Map the scalar functions used in compiled expressions to their array kernels
+ARRAY_KERNELS = {
+    basic_operators.add: add,
+    basic_operators.subtract: subtract,
+    basic_operators.multiply: multiply,
+    basic_operators.divide: divide,
+    basic_operators.negate: negate,
+    complex_operators.exponent: exponent,
+    complex_operators.logarithm: logarithm,
+    trigonometry.sin: sin,
+    trigonometry.cos: cos,
+    trigonometry.tan: tan,
+    trigonometry.cot: cot,
+    trigonometry.arcsin: arcsin,
+    trigonometry.arccos: arccos,
+    trigonometry.arctan: arctan,
+    trigonometry.arccot: arccot
+}
+
+
+def evaluate_arrays(compiled, arrays):
+    """
+    Runs a CompiledExpression with array kernels.
+    :param compiled: The CompiledExpression to evaluate.
+    :param arrays: A mapping of variable names to array-like values.
+    :return: A tuple of the result array and the boolean validity mask.
+    """
+    stack = []
+    temps = [None] * compiled.temps
+    valid = True
+    with np.errstate(all="ignore"):
+        for opcode, argument, name in compiled.instructions:
+            if opcode == PUSH:
+                stack.append(argument)
+            elif opcode == LOAD:
+                stack.append(arrays[argument])
+            elif opcode == FETCH:
+                stack.append(temps[argument])
+            elif opcode == STORE:
+                temps[argument] = stack[-1]
+            else:
+                count = 1 if opcode == UNARY else 2 if opcode == BINARY else name[1]
+                arguments = stack[-count:]
+                del stack[-count:]
+                values, element_valid = ARRAY_KERNELS[argument](*arguments)
+                if element_valid is not None:
+                    valid = valid & element_valid
+                stack.append(values)
+
+    shape = np.broadcast_shapes(*(np.shape(a) for a in arrays.values()))
+    result = np.broadcast_to(np.asarray(stack[0], dtype=float), shape)
+    valid = np.broadcast_to(np.asarray(valid, dtype=bool), shape)
+    return np.where(valid, result, np.nan), valid
@@ -1,45 +1,35 @@
-from config import load_config
-
-# Load configuration
-config = load_config()
-enable_precision = config.get("enable_precision", False)
-precision_value = config.get("precision_value", None) if enable_precision else None
+# The operators work on any numeric type (float, int, Decimal, Fraction) and don't round:
+# precision is applied once to the final result, see numeric_backends.
 
 def add(a, b):
     """
-    Adds two numbers and applies rounding if precision is enabled.
+    Adds two numbers.
     """
-    result = a + b
-    if precision_value is not None:
-        result = round(result, precision_value)
-    return result
+    return a + b
 
 def subtract(a, b):
     """
-    Subtracts the second number from the first and applies rounding if precision is enabled.
+    Subtracts the second number from the first.
     """
-    result = a - b
-    if precision_value is not None:
-        result = round(result, precision_value)
-    return result
+    return a - b
 
 def multiply(a, b):
     """
-    Multiplies two numbers and applies rounding if precision is enabled.
+    Multiplies two numbers.
     """
-    result = a * b
-    if precision_value is not None:
-        result = round(result, precision_value)
-    return result
+    return a * b
 
 def divide(a, b):
     """
-    Divides the first number by the second and applies rounding if precision is enabled.
+    Divides the first number by the second.
     Handles division by zero gracefully by raising a ZeroDivisionError.
     """
     if b == 0:
         raise ZeroDivisionError("Division by zero is not allowed.")
-    result = a / b
-    if precision_value is not None:
-        result = round(result, precision_value)
-    return result
+    return a / b
+
+def negate(a):
+    """
+    Returns the number with its sign flipped.
+    """
+    return -a
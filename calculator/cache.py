@@ -0,0 +1,81 @@
+from collections import OrderedDict
+from threading import Lock
+
+
+class LRUCache:
+    """
+    A bounded least-recently-used cache with hit/miss/eviction counters.
+    Safe to share between threads.
+    """
+
+    def __init__(self, maxsize=256):
+        """
+        :param maxsize: Maximum number of entries kept. 0 disables caching.
+        """
+        self._data = OrderedDict()
+        self._lock = Lock()
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        """
+        Returns the cached value for a key and marks it as recently used.
+        """
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """
+        Stores a value, evicting the least recently used entries if the cache is full.
+        """
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def resize(self, maxsize):
+        """
+        Changes the maximum size, evicting entries if the cache shrinks.
+        """
+        with self._lock:
+            self.maxsize = maxsize
+            while len(self._data) > max(maxsize, 0):
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """
+        Removes all entries and resets the counters.
+        """
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def info(self):
+        """
+        Returns the cache statistics as a dictionary.
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+            }
+
+    def __len__(self):
+        return len(self._data)
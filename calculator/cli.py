@@ -0,0 +1,133 @@
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from collections import deque
+
+# The command line never shows popups, so keep tkinter out of the process
+os.environ.setdefault("CALCULATOR_HEADLESS", "1")
+
+from expression_evaluator import iter_evaluate  # noqa: E402
+
+# Columns of the CSV output, also the keys of the JSON Lines records
+OUTPUT_FIELDS = ["line", "expression", "result", "error"]
+
+
+def read_expressions(file, line_numbers):
+    """
+    Yields the expressions of a text file one line at a time, skipping blank lines and
+    lines starting with '#'. The number of every yielded line is appended to line_numbers.
+    """
+    for number, line in enumerate(file, start=1):
+        expression = line.strip()
+        if not expression or expression.startswith("#"):
+            continue
+        line_numbers.append(number)
+        yield expression
+
+
+def format_result(value):
+    """
+    Returns a result as a JSON value: floats and ints as numbers, Decimal and Fraction
+    results of the exact backends as strings so that no digits are lost.
+    """
+    if value is None or isinstance(value, (int, float)):
+        return value
+    return str(value)
+
+
+def open_input(path):
+    if path == "-":
+        return sys.stdin
+    return open(path, "r", encoding="utf-8")
+
+
+def open_output(path):
+    if path == "-":
+        return sys.stdout
+    return open(path, "w", encoding="utf-8", newline="")
+
+
+def run(args):
+    """
+    Evaluates the input file and writes one output row per expression.
+    :return: A tuple of the number of evaluated expressions and the number of errors.
+    """
+    source = open_input(args.input)
+    target = open_output(args.output)
+    line_numbers = deque()
+    count = errors = 0
+    try:
+        if args.format == "csv":
+            writer = csv.writer(target)
+            if not args.no_header:
+                writer.writerow(OUTPUT_FIELDS)
+
+            def write(row):
+                writer.writerow(row)
+        else:
+            def write(row):
+                target.write(json.dumps(dict(zip(OUTPUT_FIELDS, row))) + "\n")
+
+        results = iter_evaluate(read_expressions(source, line_numbers), args.workers,
+                                args.chunk_size, args.backend, not args.no_log)
+        for outcome in results:
+            number = line_numbers.popleft()
+            count += 1
+            if outcome.error is not None:
+                errors += 1
+                if not args.quiet:
+                    print(f"line {number}: {outcome.error}", file=sys.stderr)
+            write([number, outcome.expression, format_result(outcome.result), outcome.error])
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if target is not sys.stdout:
+            target.close()
+        else:
+            target.flush()
+    return count, errors
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Evaluate one expression per line and write the results as CSV or JSON Lines."
+    )
+    parser.add_argument("input", nargs="?", default="-", help="Input file, '-' (default) reads stdin.")
+    parser.add_argument("-o", "--output", default="-", help="Output file, '-' (default) writes stdout.")
+    parser.add_argument("-f", "--format", choices=["csv", "jsonl"], default="csv", help="Output format.")
+    parser.add_argument("-j", "--workers", type=int, default=1,
+                        help="Number of worker processes, 0 for one per CPU.")
+    parser.add_argument("--chunk-size", type=int, default=1000,
+                        help="Expressions per chunk sent to a worker and per log insert.")
+    parser.add_argument("--backend", choices=["float", "decimal", "fraction"],
+                        help="Numeric backend, defaults to the numeric_backend setting.")
+    parser.add_argument("--no-log", action="store_true", help="Don't write the evaluations to the log database.")
+    parser.add_argument("--no-header", action="store_true", help="Omit the CSV header row.")
+    parser.add_argument("-q", "--quiet", action="store_true", help="Don't report failed lines on stderr.")
+    args = parser.parse_args(argv)
+    if args.workers <= 0:
+        args.workers = os.cpu_count() or 1
+    if args.chunk_size <= 0:
+        parser.error("--chunk-size must be positive.")
+
+    start = time.perf_counter()
+    try:
+        count, errors = run(args)
+    except OSError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+    except KeyboardInterrupt:
+        return 130
+    elapsed = time.perf_counter() - start
+
+    rate = count / elapsed if elapsed > 0 else 0.0
+    print(f"Evaluated {count} expressions ({errors} errors) in {elapsed:.2f} s, {rate:,.0f} expressions/s.",
+          file=sys.stderr)
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,17 +1,69 @@
 import json
 import logging
+import os
+import threading
+import time
 from error_handler import handle_error
 
-def load_config(config_file="config.json"):
+# The configuration file shipped with the package, independent of the working directory
+CONFIG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.json")
+
+# Minimum seconds between two checks of the configuration file's modification time
+RELOAD_CHECK_INTERVAL = 1.0
+
+# SQLite settings used by db_log when the configuration doesn't specify them
+DATABASE_DEFAULTS = {
+    "db_journal_mode": "wal",       # Write-ahead log, readers don't block the writer
+    "db_synchronous": "normal",     # Safe with WAL, avoids an fsync per commit
+    "db_cache_size": -8000,         # Page cache size, negative values are in KiB
+    "db_busy_timeout": 5000,        # Milliseconds to wait for a lock held by another process
+    "db_mmap_size": 67108864        # Bytes of the database file to memory-map
+}
+
+# Settings of the background log writer used by db_log when log_async is enabled
+LOG_WRITER_DEFAULTS = {
+    "log_async": False,             # Queue log records and write them on a background thread
+    "log_batch_size": 500,          # Records written per transaction
+    "log_flush_interval": 0.5,      # Seconds a record may wait before being written
+    "log_queue_size": 10000,        # Records that may wait before the overflow policy applies
+    "log_overflow": "block"         # "block", "drop" or "count" when the queue is full
+}
+
+# Retention policy of the log table, old rows are moved to archive databases by log_archive
+RETENTION_DEFAULTS = {
+    "log_retention_max_age_days": None,     # Archive logs older than this many days
+    "log_retention_max_rows": None,         # Keep at most this many rows in the live table
+    "log_retention_max_file_mb": None,      # Keep the live data below this size
+    "log_retention_interval": 300,          # Seconds between background retention runs
+    "log_archive_dir": "log_archive",       # Directory of the monthly archive partitions
+    "log_archive_compress": True            # Gzip the partitions of past months
+}
+
+# Persistent cache of evaluation results, see result_cache.py
+RESULT_CACHE_DEFAULTS = {
+    "result_cache_enabled": False,          # Reuse the results of earlier evaluations
+    "result_cache_size": 100000,            # Results kept in the database
+    "result_cache_memory_size": 4096        # Results kept in memory in front of the database
+}
+
+def read_config(config_file=CONFIG_FILE):
+    """
+    Reads and validates a configuration file. Raises on any error.
+    :return: A dictionary containing the configuration.
+    """
+    with open(config_file, "r") as file:
+        config = json.load(file)
+        return clean_config(config)
+
+def load_config(config_file=CONFIG_FILE):
     """
     Loads configuration from a JSON file with error handling.
+    Modules should use get_config instead, which loads the file once per process.
     :param config_file: Path to the configuration file.
     :return: A dictionary containing the configuration.
     """
     try:
-        with open(config_file, "r") as file:
-            config = json.load(file)
-            return clean_config(config)
+        return read_config(config_file)
     except FileNotFoundError as e:
         handle_error(f"Configuration file '{config_file}' not found: {e}", display_to_user=False)
     except json.JSONDecodeError as e:
@@ -23,7 +75,17 @@ def load_config(config_file="config.json"):
     return {
         "enable_precision": False,
         "precision_value": None,
-        "angle_unit": "radians"  # Default to radians if config file fails
+        "angle_unit": "radians",  # Default to radians if config file fails
+        "expression_cache_size": 256,
+        "log_evaluations": True,
+        "log_trace": False,
+        "metrics_enabled": False,
+        "numeric_backend": "float",
+        "decimal_precision": 28,
+        **DATABASE_DEFAULTS,
+        **LOG_WRITER_DEFAULTS,
+        **RETENTION_DEFAULTS,
+        **RESULT_CACHE_DEFAULTS
     }
 
 def clean_config(config):
@@ -37,12 +99,46 @@ def clean_config(config):
     config.setdefault("enable_precision", False)
     config.setdefault("precision_value", 2 if config["enable_precision"] else None)
     config.setdefault("angle_unit", "radians")  # Default to radians
+    config.setdefault("expression_cache_size", 256)
+    config.setdefault("log_evaluations", True)  # One log record per evaluation
+    config.setdefault("log_trace", False)  # Embed the function calls in the record
+    config.setdefault("metrics_enabled", False)  # Per-stage timings, see metrics.py
+    config.setdefault("numeric_backend", "float")  # float, decimal or fraction
+    config.setdefault("decimal_precision", 28)  # Significant digits of the decimal backend
+    for key, value in {**DATABASE_DEFAULTS, **LOG_WRITER_DEFAULTS, **RETENTION_DEFAULTS,
+                       **RESULT_CACHE_DEFAULTS}.items():
+        config.setdefault(key, value)
 
     # Validate keys and types
     required_keys = {
         "enable_precision": bool,
         "precision_value": (int, type(None)),
-        "angle_unit": str  # Must be a string
+        "angle_unit": str,  # Must be a string
+        "expression_cache_size": int,
+        "log_evaluations": bool,
+        "log_trace": bool,
+        "metrics_enabled": bool,
+        "numeric_backend": str,
+        "decimal_precision": int,
+        "db_journal_mode": str,
+        "db_synchronous": str,
+        "db_cache_size": int,
+        "db_busy_timeout": int,
+        "db_mmap_size": int,
+        "log_async": bool,
+        "log_batch_size": int,
+        "log_flush_interval": (int, float),
+        "log_queue_size": int,
+        "log_overflow": str,
+        "log_retention_max_age_days": (int, float, type(None)),
+        "log_retention_max_rows": (int, type(None)),
+        "log_retention_max_file_mb": (int, float, type(None)),
+        "log_retention_interval": (int, float),
+        "log_archive_dir": str,
+        "log_archive_compress": bool,
+        "result_cache_enabled": bool,
+        "result_cache_size": int,
+        "result_cache_memory_size": int
     }
 
     for key, expected_type in required_keys.items():
@@ -57,4 +153,116 @@ def clean_config(config):
     if config["angle_unit"] not in ["radians", "degrees"]:
         raise ValueError("Invalid angle_unit. Must be 'radians' or 'degrees'.")
 
-    return config
\ No newline at end of file
+    if config["expression_cache_size"] < 0:
+        raise ValueError("Invalid expression_cache_size. Must be zero or positive.")
+
+    # Validate the SQLite pragma values, they are formatted into PRAGMA statements
+    if config["db_journal_mode"].lower() not in ["delete", "truncate", "persist", "memory", "wal", "off"]:
+        raise ValueError("Invalid db_journal_mode.")
+    if config["db_synchronous"].lower() not in ["off", "normal", "full", "extra"]:
+        raise ValueError("Invalid db_synchronous. Must be 'off', 'normal', 'full' or 'extra'.")
+
+    if config["decimal_precision"] < 1:
+        raise ValueError("Invalid decimal_precision. Must be at least 1.")
+
+    if config["log_overflow"] not in ["block", "drop", "count"]:
+        raise ValueError("Invalid log_overflow. Must be 'block', 'drop' or 'count'.")
+
+    if config["log_retention_max_rows"] is not None and config["log_retention_max_rows"] < 0:
+        raise ValueError("Invalid log_retention_max_rows. Must be zero or positive.")
+
+    if config["result_cache_size"] < 0 or config["result_cache_memory_size"] < 0:
+        raise ValueError("Invalid result cache size. Must be zero or positive.")
+
+    return config
+
+
+class Config:
+    """
+    Process-wide configuration. The values are reloaded when the modification time of
+    the file changes, and subscribers are notified so they can update derived state.
+    A reload that fails keeps the previous values.
+    """
+
+    def __init__(self, config_file=CONFIG_FILE):
+        self.config_file = config_file
+        self._lock = threading.Lock()
+        self._subscribers = []
+        self._mtime = self.file_mtime()
+        self._checked = time.monotonic()
+        self.values = load_config(config_file)
+
+    def file_mtime(self):
+        try:
+            return os.stat(self.config_file).st_mtime_ns
+        except OSError:
+            return None
+
+    def get(self, key, default=None):
+        return self.values.get(key, default)
+
+    def __getitem__(self, key):
+        return self.values[key]
+
+    @property
+    def precision_value(self):
+        """
+        The number of decimals to round to, or None if precision is disabled.
+        """
+        values = self.values
+        return values.get("precision_value") if values.get("enable_precision") else None
+
+    def subscribe(self, callback):
+        """
+        Registers callback(new_values, old_values), called after every reload.
+        """
+        self._subscribers.append(callback)
+
+    def check_reload(self):
+        """
+        Reloads the configuration if the file changed. Cheap enough to call on every
+        evaluation: the file is looked at no more than every RELOAD_CHECK_INTERVAL seconds.
+        :return: True if the configuration was reloaded.
+        """
+        now = time.monotonic()
+        if now - self._checked < RELOAD_CHECK_INTERVAL:
+            return False
+        self._checked = now
+        if self.file_mtime() == self._mtime:
+            return False
+        return self.reload()
+
+    def reload(self):
+        """
+        Reads the file again, swaps in the new values and notifies the subscribers.
+        """
+        with self._lock:
+            mtime = self.file_mtime()
+            try:
+                values = read_config(self.config_file)
+            except Exception as e:
+                handle_error(f"Keeping previous configuration, reload failed: {e}", display_to_user=False)
+                self._mtime = mtime
+                return False
+            old_values, self.values, self._mtime = self.values, values, mtime
+            for callback in list(self._subscribers):
+                try:
+                    callback(values, old_values)
+                except Exception as e:
+                    handle_error(f"Configuration subscriber failed: {e}", display_to_user=False)
+            return True
+
+
+_config = None
+_config_lock = threading.Lock()
+
+def get_config():
+    """
+    Returns the process-wide Config, loading the configuration file on first use.
+    """
+    global _config
+    if _config is None:
+        with _config_lock:
+            if _config is None:
+                _config = Config()
+    return _config
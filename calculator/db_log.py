@@ -1,141 +1,1154 @@
+import atexit
+import json
+import os
+import queue
 import sqlite3
-from datetime import datetime
+import threading
+import time
+from datetime import datetime, timezone
+import metrics
+from config import get_config
 
 # Path to the database file
 DB_FILE = "calculator_log.db"
 
-def connect_db():
+# Load configuration. Pragmas apply to connections opened after a reload,
+# the writer and retention settings to writers and workers started after it.
+settings = get_config()
+config = settings.values
+
+def apply_config(values, old_values):
+    global config
+    config = values
+
+settings.subscribe(apply_config)
+
+# Configuration keys of the retention policy, enforced by log_archive when any is set
+RETENTION_KEYS = ("log_retention_max_age_days", "log_retention_max_rows", "log_retention_max_file_mb")
+
+# Columns returned by the fetch functions, in order
+LOG_COLUMNS = "id, operator, expression, result, timestamp"
+
+# Ids scanned in id order by a page filtered by time before the rest of the page is
+# looked up through the timestamp index, see select_page
+TIME_FILTER_WINDOW = 5000
+
+# Per-thread buffer of records collected instead of written (see start_capture)
+_capture = threading.local()
+
+# Long-lived connection of each thread, see connect_db
+_local = threading.local()
+
+# Database files whose schema has been set up by this process
+_schema_ready = set()
+_schema_lock = threading.Lock()
+
+def setup_schema(connection):
+    """
+    Creates the table if it doesn't exist. Runs once per process and database file.
+    """
+    with _schema_lock:
+        if DB_FILE in _schema_ready:
+            return
+        with connection:
+            # Create the table with the correct schema
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS operation_logs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    operator TEXT NOT NULL,   -- The operation type (e.g., "Expression Evaluation")
+                    expression TEXT NOT NULL, -- The full mathematical expression
+                    result TEXT NOT NULL,     -- The result of the evaluation
+                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    details TEXT              -- Optional JSON, e.g. the trace of the function calls
+                )
+            """)
+            # Add the details column to databases created before it existed
+            columns = [row[1] for row in connection.execute("PRAGMA table_info(operation_logs)")]
+            if "details" not in columns:
+                connection.execute("ALTER TABLE operation_logs ADD COLUMN details TEXT")
+            # Indexes for time range and operator queries
+            connection.execute("""
+                CREATE INDEX IF NOT EXISTS idx_operation_logs_timestamp ON operation_logs (timestamp)
+            """)
+            connection.execute("""
+                CREATE INDEX IF NOT EXISTS idx_operation_logs_operator ON operation_logs (operator)
+            """)
+            # Counters that let readers detect changes without scanning the table
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS log_metadata (
+                    key TEXT PRIMARY KEY,
+                    value INTEGER NOT NULL
+                )
+            """)
+        setup_summaries(connection)
+        setup_search(connection)
+        _schema_ready.add(DB_FILE)
+
+# Summary tables of the logs, see setup_summaries.
+# Time buckets are prefixes of the timestamp: 'YYYY-MM-DD HH:MM' and 'YYYY-MM-DD HH'.
+SUMMARY_TABLES = {"minute": ("log_summary_minute", 16), "hour": ("log_summary_hour", 13)}
+
+# Condition identifying failed evaluations
+ERROR_CONDITION = "operator = 'Error'"
+
+def watermark(key):
+    """
+    Returns an SQL expression reading a watermark from log_metadata: the last log id
+    covered by a summary or index that is brought up to date in batches, see catch_up.
+    """
+    return f"(SELECT COALESCE(MAX(value), 0) FROM log_metadata WHERE key = '{key}')"
+
+def catch_up(key, statements):
+    """
+    Adds the logs appended since the last call to a summary or index: runs the statements
+    with the first id not yet covered and the last id as parameters, then moves the watermark
+    `key` forward, all in one transaction.
+    :return: The number of rows the statements changed.
+    """
+    connection = connect_db()
+    if connection.execute("SELECT COALESCE(MAX(id), 0) FROM operation_logs").fetchone()[0] \
+            <= connection.execute(f"SELECT {watermark(key)}").fetchone()[0]:
+        return 0
+    count = 0
+    with connection:
+        # Read the watermark again inside the write transaction, another process may have moved it
+        connection.execute("BEGIN IMMEDIATE")
+        first = connection.execute(f"SELECT {watermark(key)}").fetchone()[0] + 1
+        last = connection.execute("SELECT COALESCE(MAX(id), 0) FROM operation_logs").fetchone()[0]
+        for statement in statements:
+            count += max(connection.execute(statement, (first, last)).rowcount, 0)
+        connection.execute("""
+            INSERT INTO log_metadata (key, value) VALUES (?, ?)
+            ON CONFLICT (key) DO UPDATE SET value = excluded.value
+        """, (key, last))
+    return count
+
+def summary_triggers():
     """
-    Connect to the SQLite database. Creates the database and table if they don't exist.
-    """
-    connection = sqlite3.connect(DB_FILE)
-    cursor = connection.cursor()
-    # Create the table with the correct schema
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS operation_logs (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            operator TEXT NOT NULL,   -- The operation type (e.g., "Expression Evaluation")
-            expression TEXT NOT NULL, -- The full mathematical expression
-            result TEXT NOT NULL,     -- The result of the evaluation
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+    Returns the CREATE TRIGGER statements that keep the summary tables in sync for the logs
+    they already cover: deletions, and rows inserted with an id below the watermark.
+    """
+    covered = watermark("summary_indexed_id")
+    insert_steps = []
+    delete_steps = []
+    for table, length in SUMMARY_TABLES.values():
+        bucket = f"coalesce(substr({{row}}.timestamp, 1, {length}), '')"
+        insert_steps.append(f"""
+            INSERT INTO {table} (bucket, operator, is_error, count)
+            VALUES ({bucket.format(row="NEW")}, NEW.operator, NEW.{ERROR_CONDITION}, 1)
+            ON CONFLICT (bucket, operator, is_error) DO UPDATE SET count = count + 1;""")
+        delete_steps.append(f"""
+            UPDATE {table} SET count = count - 1
+            WHERE bucket = {bucket.format(row="OLD")} AND operator = OLD.operator AND is_error = (OLD.{ERROR_CONDITION});
+            DELETE FROM {table}
+            WHERE bucket = {bucket.format(row="OLD")} AND operator = OLD.operator AND count <= 0;""")
+    insert_steps.append(f"""
+            INSERT INTO log_expression_counts (expression, count, errors)
+            VALUES (NEW.expression, 1, NEW.{ERROR_CONDITION})
+            ON CONFLICT (expression) DO UPDATE SET count = count + 1, errors = errors + excluded.errors;""")
+    delete_steps.append(f"""
+            UPDATE log_expression_counts SET count = count - 1, errors = errors - (OLD.{ERROR_CONDITION})
+            WHERE expression = OLD.expression;
+            DELETE FROM log_expression_counts WHERE expression = OLD.expression AND count <= 0;""")
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS log_summary_insert AFTER INSERT ON operation_logs\n"
+        f"        WHEN NEW.id <= {covered} BEGIN{''.join(insert_steps)}\n        END",
+        f"CREATE TRIGGER IF NOT EXISTS log_summary_delete AFTER DELETE ON operation_logs\n"
+        f"        WHEN OLD.id <= {covered} BEGIN{''.join(delete_steps)}\n        END",
+    ]
+
+def setup_summaries(connection):
+    """
+    Creates the summary tables: per-minute and per-hour log counts by operator and error
+    status, and the number of times each expression was logged.
+    Updating three tables from a trigger on every insert would make each log several times
+    more expensive to write, so appended logs are added in one grouped statement by
+    update_summaries before the summaries are read. The existing logs are added the same way.
+    """
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        exists = connection.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'log_expression_counts'"
+        ).fetchone()
+        for table, length in SUMMARY_TABLES.values():
+            connection.execute(f"""
+                CREATE TABLE IF NOT EXISTS {table} (
+                    bucket TEXT NOT NULL,
+                    operator TEXT NOT NULL,
+                    is_error INTEGER NOT NULL,
+                    count INTEGER NOT NULL,
+                    PRIMARY KEY (bucket, operator, is_error)
+                ) WITHOUT ROWID
+            """)
+        connection.execute("""
+            CREATE TABLE IF NOT EXISTS log_expression_counts (
+                expression TEXT PRIMARY KEY,
+                count INTEGER NOT NULL,
+                errors INTEGER NOT NULL
+            ) WITHOUT ROWID
+        """)
+        connection.execute(
+            "CREATE INDEX IF NOT EXISTS idx_log_expression_counts_count ON log_expression_counts (count)"
         )
+        if not exists:
+            connection.execute("DELETE FROM log_metadata WHERE key = 'summary_indexed_id'")
+        for statement in summary_triggers():
+            connection.execute(statement)
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+
+def update_summaries():
+    """
+    Adds the logs appended since the last call to the summary tables.
+    """
+    statements = [f"""
+        INSERT INTO {table} (bucket, operator, is_error, count)
+        SELECT coalesce(substr(timestamp, 1, {length}), ''), operator, {ERROR_CONDITION}, COUNT(*)
+        FROM operation_logs WHERE id BETWEEN ? AND ? GROUP BY 1, 2, 3
+        ON CONFLICT (bucket, operator, is_error) DO UPDATE SET count = count + excluded.count
+    """ for table, length in SUMMARY_TABLES.values()]
+    statements.append(f"""
+        INSERT INTO log_expression_counts (expression, count, errors)
+        SELECT expression, COUNT(*), SUM({ERROR_CONDITION})
+        FROM operation_logs WHERE id BETWEEN ? AND ? GROUP BY expression
+        ON CONFLICT (expression) DO UPDATE SET count = count + excluded.count, errors = errors + excluded.errors
     """)
-    connection.commit()
+    return catch_up("summary_indexed_id", statements)
+
+# Full-text index over the expression and result columns. It is an external-content FTS5
+# table: it stores only the index, the text is read from operation_logs.
+# Writing to FTS5 from a trigger is about ten times slower than a bulk insert, so like the
+# summaries, logs appended after the last search are indexed in one statement (see
+# update_search_index) and the triggers only handle the rows the index already covers.
+SEARCH_INDEXED = watermark("search_indexed_id")
+SEARCH_TRIGGERS = {
+    "log_search_insert": f"""
+        CREATE TRIGGER IF NOT EXISTS log_search_insert AFTER INSERT ON operation_logs
+        WHEN NEW.id <= {SEARCH_INDEXED} BEGIN
+            INSERT INTO operation_logs_fts (rowid, expression, result) VALUES (NEW.id, NEW.expression, NEW.result);
+        END""",
+    "log_search_delete": f"""
+        CREATE TRIGGER IF NOT EXISTS log_search_delete AFTER DELETE ON operation_logs
+        WHEN OLD.id <= {SEARCH_INDEXED} BEGIN
+            INSERT INTO operation_logs_fts (operation_logs_fts, rowid, expression, result)
+            VALUES ('delete', OLD.id, OLD.expression, OLD.result);
+        END""",
+    "log_search_update": f"""
+        CREATE TRIGGER IF NOT EXISTS log_search_update AFTER UPDATE OF id, expression, result ON operation_logs
+        WHEN OLD.id <= {SEARCH_INDEXED} BEGIN
+            INSERT INTO operation_logs_fts (operation_logs_fts, rowid, expression, result)
+            VALUES ('delete', OLD.id, OLD.expression, OLD.result);
+            INSERT INTO operation_logs_fts (rowid, expression, result) VALUES (NEW.id, NEW.expression, NEW.result);
+        END""",
+}
+
+# Shortest search text the index can answer. The trigram tokenizer matches any substring
+# of at least three characters; shorter texts are searched with LIKE.
+search_min_length = 3
+
+def setup_search(connection):
+    """
+    Creates the full-text index and its triggers. The existing logs are indexed by the
+    first search. Uses the trigram tokenizer when SQLite has it (3.34+), so "n(3" finds
+    "sin(30)"; otherwise the default tokenizer, which matches whole numbers and names.
+    """
+    global search_min_length
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        row = connection.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'operation_logs_fts'"
+        ).fetchone()
+        if row is None:
+            options = "content='operation_logs', content_rowid='id'"
+            try:
+                connection.execute(
+                    f"CREATE VIRTUAL TABLE operation_logs_fts USING fts5(expression, result, {options}, tokenize='trigram')"
+                )
+            except sqlite3.OperationalError:
+                connection.execute(f"CREATE VIRTUAL TABLE operation_logs_fts USING fts5(expression, result, {options})")
+            connection.execute("DELETE FROM log_metadata WHERE key = 'search_indexed_id'")
+            row = connection.execute(
+                "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'operation_logs_fts'"
+            ).fetchone()
+        search_min_length = 3 if "trigram" in row[0] else 1
+        # Indexes for sorting the log viewer by the text columns
+        connection.execute("CREATE INDEX IF NOT EXISTS idx_operation_logs_expression ON operation_logs (expression)")
+        connection.execute("CREATE INDEX IF NOT EXISTS idx_operation_logs_result ON operation_logs (result)")
+        for statement in SEARCH_TRIGGERS.values():
+            connection.execute(statement)
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+
+def update_search_index():
+    """
+    Adds the logs appended since the last call to the full-text index.
+    :return: The number of newly indexed logs.
+    """
+    return catch_up("search_indexed_id", ["""
+        INSERT INTO operation_logs_fts (rowid, expression, result)
+        SELECT id, expression, result FROM operation_logs WHERE id BETWEEN ? AND ?
+    """])
+
+def open_connection():
+    """
+    Opens a new connection to the database with the pragmas from the configuration.
+    WAL journaling lets readers and a writer from several processes work concurrently,
+    and the busy timeout makes writers wait for each other instead of failing.
+    """
+    connection = sqlite3.connect(DB_FILE, timeout=config["db_busy_timeout"] / 1000)
+    connection.execute(f"PRAGMA busy_timeout = {int(config['db_busy_timeout'])}")
+    connection.execute(f"PRAGMA journal_mode = {config['db_journal_mode']}")
+    connection.execute(f"PRAGMA synchronous = {config['db_synchronous']}")
+    connection.execute(f"PRAGMA cache_size = {int(config['db_cache_size'])}")
+    connection.execute(f"PRAGMA mmap_size = {int(config['db_mmap_size'])}")
+    return connection
+
+def connect_db():
+    """
+    Returns the connection of the current thread, opening it on first use.
+    The connection stays open for the lifetime of the thread and is replaced after a
+    fork or when DB_FILE changes. Creates the database and table if they don't exist.
+    """
+    connection = getattr(_local, "connection", None)
+    if connection is not None and _local.key == (os.getpid(), DB_FILE):
+        return connection
+    if connection is not None and _local.key[0] == os.getpid():
+        connection.close()
+    connection = open_connection()
+    setup_schema(connection)
+    _local.connection = connection
+    _local.key = (os.getpid(), DB_FILE)
     return connection
 
+def close_db():
+    """
+    Closes the connection of the current thread, if any.
+    """
+    connection = getattr(_local, "connection", None)
+    if connection is not None and _local.key[0] == os.getpid():
+        connection.close()
+    _local.connection = None
 
-def log_operation(operator, expression, result):
+
+def log_operation(operator, expression, result, details=None):
     """
     Logs an operation to the database.
     :param operator: The operator type (e.g., "Expression Evaluation")
     :param expression: The full mathematical expression
     :param result: The result of the operation
+    :param details: Optional JSON text with structured information about the operation
     """
+    records = getattr(_capture, "records", None)
+    if records is not None:
+        records.append((operator, expression, str(result), details))
+        return
+    writer = get_async_writer()
+    if writer is not None:
+        writer.submit((operator, expression, str(result), current_timestamp(), details))
+        return
+    timed = metrics.enabled
+    if timed:
+        start = time.perf_counter()
     try:
         connection = connect_db()
-        cursor = connection.cursor()
-        cursor.execute("""
-            INSERT INTO operation_logs (operator, expression, result)
-            VALUES (?, ?, ?)
-        """, (operator, expression, str(result)))
-        connection.commit()
-        connection.close()
+        with connection:
+            connection.execute("""
+                INSERT INTO operation_logs (operator, expression, result, details)
+                VALUES (?, ?, ?, ?)
+            """, (operator, expression, str(result), details))
     except Exception as e:
         print(f"Error logging operation: {e}")
+    if timed:
+        metrics.observe("db_write_seconds", start, mode="single")
 
-<<<<<<< HEAD
-=======
 
->>>>>>> develop
-def fetch_logs():
+def log_operations(records):
     """
-    Fetches all operation logs from the database.
+    Logs many operations to the database in a single transaction.
+    :param records: An iterable of (operator, expression, result) or
+        (operator, expression, result, details) tuples
+    """
+    timed = metrics.enabled
+    if timed:
+        start = time.perf_counter()
+    try:
+        connection = connect_db()
+        with connection:
+            connection.executemany("""
+                INSERT INTO operation_logs (operator, expression, result, details)
+                VALUES (?, ?, ?, ?)
+            """, ((record[0], record[1], str(record[2]), record[3] if len(record) > 3 else None)
+                  for record in records))
+    except Exception as e:
+        print(f"Error logging operations: {e}")
+    if timed:
+        metrics.observe("db_write_seconds", start, mode="batch")
+
+
+def current_timestamp():
+    """
+    Returns the current UTC time in the format SQLite uses for CURRENT_TIMESTAMP.
+    """
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+
+class AsyncLogWriter:
+    """
+    Writes log records from a bounded queue on a background thread.
+    Records are inserted with executemany in one transaction once batch_size records
+    are waiting or flush_interval seconds have passed since the first one arrived.
+    """
+
+    # Queue marker asking the writer thread to write its current batch immediately
+    FLUSH = object()
+    # Queue marker asking the writer thread to write its batch and exit
+    STOP = object()
+
+    def __init__(self, batch_size=500, flush_interval=0.5, queue_size=10000, overflow="block"):
+        """
+        :param batch_size: Maximum number of records written per transaction.
+        :param flush_interval: Maximum seconds a record waits before being written.
+        :param queue_size: Maximum number of records waiting to be written.
+        :param overflow: What to do when the queue is full: "block" waits for space,
+            "drop" discards the record, "count" discards it and later writes a single
+            record stating how many were dropped.
+        """
+        if overflow not in ("block", "drop", "count"):
+            raise ValueError("Invalid overflow policy. Must be 'block', 'drop' or 'count'.")
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow = overflow
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.pid = os.getpid()
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+        self.unreported_drops = 0
+        self.thread = threading.Thread(target=self.run, name="log-writer", daemon=True)
+        self.thread.start()
+
+    def submit(self, record):
+        """
+        Queues an (operator, expression, result, timestamp, details) record for writing.
+        """
+        if self.overflow == "block":
+            self.queue.put(record)
+            return
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            if self.overflow == "count":
+                self.unreported_drops += 1
+
+    def run(self):
+        """
+        Main loop of the writer thread.
+        """
+        running = True
+        while running:
+            batch = []
+            item = self.queue.get()
+            markers = 0
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if item is self.STOP:
+                    running = False
+                if item is self.FLUSH or item is self.STOP:
+                    markers += 1
+                    break
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self.queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+            done = len(batch) + markers
+            self.write(batch)
+            for _ in range(done):
+                self.queue.task_done()
+
+    def write(self, batch):
+        """
+        Inserts a batch of records in a single transaction.
+        """
+        if self.unreported_drops:
+            count, self.unreported_drops = self.unreported_drops, 0
+            batch.append(("Dropped", "Log queue full", f"{count} log records dropped", current_timestamp(), None))
+        if not batch:
+            return
+        timed = metrics.enabled
+        if timed:
+            start = time.perf_counter()
+        try:
+            connection = connect_db()
+            with connection:
+                connection.executemany("""
+                    INSERT INTO operation_logs (operator, expression, result, timestamp, details)
+                    VALUES (?, ?, ?, ?, ?)
+                """, batch)
+            self.written += len(batch)
+            self.batches += 1
+        except Exception as e:
+            print(f"Error writing log batch: {e}")
+        if timed:
+            metrics.observe("db_write_seconds", start, mode="async")
+
+    def flush(self):
+        """
+        Blocks until every record queued so far has been written.
+        """
+        if self.thread.is_alive():
+            self.queue.put(self.FLUSH)
+            self.queue.join()
+
+    def stop(self):
+        """
+        Writes the remaining records and stops the writer thread.
+        """
+        if self.thread.is_alive():
+            self.queue.put(self.STOP)
+            self.thread.join()
+        close_db()
+
+    def stats(self):
+        """
+        Returns the writer counters as a dictionary.
+        """
+        return {
+            "queued": self.queue.qsize(),
+            "written": self.written,
+            "dropped": self.dropped,
+            "batches": self.batches
+        }
+
+
+# The background writer used by log_operation, see start_async_writer
+_writer = None
+_writer_lock = threading.Lock()
+
+def start_async_writer(batch_size=None, flush_interval=None, queue_size=None, overflow=None):
+    """
+    Switches log_operation to asynchronous mode: records are queued and written in
+    batches by a background thread. Arguments default to the log_* configuration keys.
+    Remaining records are flushed when the interpreter exits.
+    :return: The AsyncLogWriter in use.
+    """
+    global _writer
+    with _writer_lock:
+        if _writer is not None and _writer.pid == os.getpid():
+            _writer.stop()
+        _writer = AsyncLogWriter(
+            batch_size if batch_size is not None else config["log_batch_size"],
+            flush_interval if flush_interval is not None else config["log_flush_interval"],
+            queue_size if queue_size is not None else config["log_queue_size"],
+            overflow if overflow is not None else config["log_overflow"]
+        )
+        return _writer
+
+def stop_async_writer():
+    """
+    Flushes the queued records and switches log_operation back to synchronous writes.
+    """
+    global _writer
+    with _writer_lock:
+        if _writer is not None and _writer.pid == os.getpid():
+            _writer.stop()
+        _writer = None
+
+def get_async_writer():
+    """
+    Returns the background writer of this process, or None in synchronous mode.
+    A writer inherited through fork has no thread, so a new one is started.
+    """
+    writer = _writer
+    if writer is not None and writer.pid != os.getpid():
+        writer = start_async_writer(writer.batch_size, writer.flush_interval,
+                                    writer.queue.maxsize, writer.overflow)
+    return writer
+
+def flush():
+    """
+    Blocks until all queued log records have been written. No-op in synchronous mode.
+    """
+    writer = get_async_writer()
+    if writer is not None:
+        writer.flush()
+
+atexit.register(stop_async_writer)
+
+def writer_metrics():
+    """
+    Returns the counters of the background writer for metrics snapshots.
+    """
+    writer = _writer
+    if writer is None:
+        return {}
+    return {f"log_writer_{key}": value for key, value in writer.stats().items()}
+
+metrics.register_collector(writer_metrics)
+
+
+def start_capture():
+    """
+    Makes log_operation collect records in memory for the current thread instead of
+    writing them. Used by worker processes that hand their records back to the parent.
+    """
+    _capture.records = []
+
+
+def drain_captured():
+    """
+    Returns the records captured so far on the current thread and empties the buffer.
+    """
+    records = getattr(_capture, "records", None) or []
+    if records:
+        _capture.records = []
+    return records
+
+
+def stop_capture():
+    """
+    Stops capturing on the current thread and returns the records that were not drained.
+    """
+    records = drain_captured()
+    _capture.records = None
+    return records
+
+
+def build_filters(filters):
+    """
+    Turns a filter dictionary into SQL conditions and parameters.
+    Supported keys: "operator", "since" and "until" (timestamps as 'YYYY-MM-DD HH:MM:SS').
+    :return: A tuple of the list of conditions and the list of parameters.
+    """
+    conditions = []
+    parameters = []
+    for key, value in (filters or {}).items():
+        if value is None:
+            continue
+        if key == "operator":
+            conditions.append("operator = ?")
+        elif key == "since":
+            conditions.append("timestamp >= ?")
+        elif key == "until":
+            conditions.append("timestamp < ?")
+        else:
+            raise ValueError(f"Unsupported log filter: '{key}'")
+        parameters.append(value)
+    return conditions, parameters
+
+
+def select_page(connection, columns, filters, after_id, limit, newest_first):
+    """
+    Selects up to limit rows after after_id in id order. Pages filtered by time are read
+    from a window of ids first and, if that doesn't fill them, through the timestamp
+    index; ids need not follow timestamps (imports keep the original timestamps), so a
+    scan in id order alone could walk the whole table to find a few recent rows.
+    """
+    conditions, parameters = build_filters(filters)
+    order = "DESC" if newest_first else "ASC"
+    if after_id is not None:
+        conditions.append("id < ?" if newest_first else "id > ?")
+        parameters.append(after_id)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    query = f"SELECT {columns} FROM operation_logs {{}} ORDER BY id {order} LIMIT ?"
+    if not filters or (filters.get("since") is None and filters.get("until") is None):
+        return connection.execute(query.format(where), (*parameters, limit)).fetchall()
+
+    if after_id is None:
+        row = connection.execute(f"SELECT id FROM operation_logs ORDER BY id {order} LIMIT 1").fetchone()
+        if row is None:
+            return []
+        after_id = row[0] + 1 if newest_first else row[0] - 1
+    # The window ends at this id: everything up to it is read in id order, the rest
+    # from the index entries of the time range, only selecting the ids of the page
+    bound = after_id - TIME_FILTER_WINDOW if newest_first else after_id + TIME_FILTER_WINDOW
+    within, beyond = ("id >= ?", "id < ?") if newest_first else ("id <= ?", "id > ?")
+    rows = connection.execute(query.format(f"{where} AND {within}"), (*parameters, bound, limit)).fetchall()
+    if len(rows) < limit:
+        rows += connection.execute(query.format(f"""
+            WHERE id IN (
+                SELECT id FROM operation_logs INDEXED BY idx_operation_logs_timestamp
+                {where} AND {beyond} ORDER BY id {order} LIMIT ?
+            )
+        """), (*parameters, bound, limit - len(rows), limit - len(rows))).fetchall()
+    return rows
+
+
+def fetch_logs_page(after_id=None, limit=100, filters=None, newest_first=False, include_archived=False):
+    """
+    Fetches one page of logs using the id of the last row of the previous page (keyset
+    pagination), so the cost doesn't depend on how far into the table the page is.
+    :param after_id: Id of the last row already seen, None for the first page.
+    :param limit: Maximum number of rows returned.
+    :param filters: Optional filter dictionary, see build_filters.
+    :param newest_first: Return rows in descending id order, e.g. for the last N logs.
+    :param include_archived: Also return logs moved to the archive by log_archive.
     :return: A list of log entries
     """
+    if include_archived:
+        import log_archive
+        rows = fetch_logs_page(after_id, limit, filters, newest_first)
+        rows += log_archive.fetch_archived_page(after_id, limit, filters, newest_first)
+        rows.sort(key=lambda row: row[0], reverse=newest_first)
+        return rows[:limit]
+    try:
+        return select_page(connect_db(), LOG_COLUMNS, filters, after_id, limit, newest_first)
+    except ValueError:
+        raise
+    except Exception as e:
+        print(f"Error fetching logs: {e}")
+        return []
+
+
+def iter_logs(chunk_size=1000, filters=None, include_archived=False, columns=LOG_COLUMNS):
+    """
+    Streams logs in id order, reading chunk_size rows at a time so memory use stays constant.
+    :param chunk_size: Number of rows fetched from SQLite at a time.
+    :param filters: Optional filter dictionary, see build_filters.
+    :param include_archived: Stream the archived logs (oldest first) before the live ones.
+    :param columns: The columns to select, e.g. LOG_COLUMNS + ", details"; must start with id.
+    """
+    if include_archived:
+        import log_archive
+        yield from log_archive.iter_archived_logs(chunk_size, filters, columns)
+    if filters and (filters.get("since") is not None or filters.get("until") is not None):
+        # Read page by page, so that every chunk can use the timestamp index
+        after_id = None
+        while True:
+            rows = select_page(connect_db(), columns, filters, after_id, chunk_size, False)
+            if not rows:
+                break
+            yield from rows
+            after_id = rows[-1][0]
+        return
+    conditions, parameters = build_filters(filters)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    cursor = connect_db().cursor()
     try:
+        cursor.execute(f"SELECT {columns} FROM operation_logs {where} ORDER BY id", parameters)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield from rows
+    finally:
+        cursor.close()
+
+
+# Columns the logs can be sorted by in search_logs
+SORT_COLUMNS = ("id", "operator", "expression", "result", "timestamp")
+
+def search_conditions(text=None, operator=None):
+    """
+    Returns the FROM clause, conditions and parameters selecting the logs that contain
+    text in their expression or result and have the given operator.
+    Rows are read from operation_logs as "l", joined with the index as "f" when it is used.
+    """
+    conditions, parameters = [], []
+    source = "operation_logs l"
+    if text and len(text) >= search_min_length:
+        # A quoted FTS5 string matches the text literally, operators and brackets included
+        source = "operation_logs_fts f JOIN operation_logs l ON l.id = f.rowid"
+        conditions.append("operation_logs_fts MATCH ?")
+        parameters.append('"' + text.replace('"', '""') + '"')
+    elif text:
+        pattern = "%" + text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        conditions.append("(l.expression LIKE ? ESCAPE '\\' OR l.result LIKE ? ESCAPE '\\')")
+        parameters += [pattern, pattern]
+    if operator is not None:
+        conditions.append("l.operator = ?")
+        parameters.append(operator)
+    return source, conditions, parameters
+
+
+def search_logs(text=None, operator=None, sort="id", descending=False, after=None, before=None,
+                offset=0, limit=100):
+    """
+    Fetches one page of the logs matching a search, in the requested order. Filtering and
+    sorting run in SQL on the full-text index and the column indexes.
+    Pages are addressed by the sort key of a neighbouring row (keyset pagination), which costs
+    the same on every page; offset is meant for jumping to an arbitrary position.
+    :param text: Only logs whose expression or result contains this text.
+    :param operator: Only logs of this operator.
+    :param sort: The column to sort by, one of SORT_COLUMNS. Ties are ordered by id.
+    :param descending: Sort in descending order.
+    :param after: Sort key (see sort_key) of the row before the page: return the rows following it.
+    :param before: Sort key of the row after the page: return the rows preceding it.
+    :param offset: Number of matching rows to skip; SQLite still reads them.
+    :param limit: Maximum number of rows returned.
+    :return: A list of log entries in display order.
+    """
+    if sort not in SORT_COLUMNS:
+        raise ValueError(f"Invalid sort column '{sort}'. Must be one of: {', '.join(SORT_COLUMNS)}.")
+    source, conditions, parameters = search_conditions(text, operator)
+    # With a full-text search the index produces the rows in rowid order; sorting by its
+    # rowid rather than by l.id lets SQLite skip the sort and stop after the page
+    id_column = "f.rowid" if source.startswith("operation_logs_fts") else "l.id"
+    backwards = before is not None
+    ascending = descending == backwards
+    direction = "ASC" if ascending else "DESC"
+    comparison = ">" if ascending else "<"
+    bound = after if after is not None else before
+
+    # The page is read in segments, each an index range: SQLite only seeks on the first
+    # column of a row value like (operator, id) > (?, ?), so with few distinct values the
+    # rows tied with the bound would be scanned. NULLs sort first, so they are the last
+    # segment of a descending order.
+    if sort == "id":
+        segments = [([], [], f"{id_column} {direction}")]
+        if bound is not None:
+            segments = [([f"{id_column} {comparison} ?"], [bound[-1]], f"{id_column} {direction}")]
+    else:
+        order = f"l.{sort} {direction}, {id_column} {direction}"
+        if bound is None:
+            segments = [([], [], order)]
+        elif bound[0] is None:
+            segments = [([f"l.{sort} IS NULL", f"{id_column} {comparison} ?"], [bound[1]], f"{id_column} {direction}")]
+            if ascending:
+                segments.append(([f"l.{sort} IS NOT NULL"], [], order))
+        else:
+            segments = [
+                ([f"l.{sort} = ?", f"{id_column} {comparison} ?"], [bound[0], bound[1]], f"{id_column} {direction}"),
+                ([f"l.{sort} {comparison} ?"], [bound[0]], order)
+            ]
+            if not ascending:
+                segments.append(([f"l.{sort} IS NULL"], [], f"{id_column} {direction}"))
+
+    columns = ", ".join(f"l.{column}" for column in LOG_COLUMNS.split(", "))
+    # A single segment skips the offset in SQL, otherwise the rows are skipped here
+    skip = offset if len(segments) == 1 else 0
+    wanted = offset - skip + limit
+    rows = []
+    try:
+        if id_column == "f.rowid":
+            update_search_index()
         connection = connect_db()
-        cursor = connection.cursor()
-        cursor.execute("SELECT * FROM operation_logs ORDER BY timestamp ASC")
-        logs = cursor.fetchall()
-        connection.close()
-        return logs
+        for extra_conditions, extra_parameters, order in segments:
+            where = " AND ".join(conditions + extra_conditions)
+            rows += connection.execute(
+                f"SELECT {columns} FROM {source} {'WHERE ' + where if where else ''} ORDER BY {order} LIMIT ? OFFSET ?",
+                (*parameters, *extra_parameters, wanted - len(rows), skip)
+            ).fetchall()
+            if len(rows) >= wanted:
+                break
+    except sqlite3.OperationalError as e:
+        print(f"Error searching logs: {e}")
+        return []
+    rows = rows[offset - skip:]
+    if backwards:
+        rows.reverse()
+    return rows
+
+
+def sort_key(row, sort="id"):
+    """
+    Returns the key of a log row in the order of search_logs, to pass as after or before.
+    """
+    return (row[SORT_COLUMNS.index(sort)], row[0])
+
+
+def count_logs(text=None, operator=None):
+    """
+    Returns the number of logs matching a search, see search_logs. Without a text the count
+    comes from the summary tables.
+    """
+    if not text:
+        return sum(count for operator_, count in operator_counts() if operator is None or operator_ == operator)
+    source, conditions, parameters = search_conditions(text, operator)
+    try:
+        if source.startswith("operation_logs_fts"):
+            update_search_index()
+        return connect_db().execute(
+            f"SELECT COUNT(*) FROM {source} WHERE {' AND '.join(conditions)}", parameters
+        ).fetchone()[0]
+    except sqlite3.OperationalError as e:
+        print(f"Error counting logs: {e}")
+        return 0
+
+
+def last_log_id():
+    """
+    Returns the largest log id, 0 if there are no logs. Used to detect new logs.
+    """
+    try:
+        return connect_db().execute("SELECT COALESCE(MAX(id), 0) FROM operation_logs").fetchone()[0]
+    except Exception as e:
+        print(f"Error reading the last log id: {e}")
+        return 0
+
+
+def record_deletion(connection):
+    """
+    Increments the deletion counter. Called inside the transaction of every delete so
+    readers caching ids can tell that rows disappeared, see deletion_count.
+    """
+    connection.execute("""
+        INSERT INTO log_metadata (key, value) VALUES ('deletions', 1)
+        ON CONFLICT (key) DO UPDATE SET value = value + 1
+    """)
+
+
+def deletion_count():
+    """
+    Returns how many delete operations have been made on the log table.
+    """
+    try:
+        row = connect_db().execute("SELECT value FROM log_metadata WHERE key = 'deletions'").fetchone()
+        return row[0] if row else 0
+    except Exception as e:
+        print(f"Error reading deletion count: {e}")
+        return 0
+
+
+def fetch_log_details(log_id):
+    """
+    Returns the details of a log decoded from JSON, or None if it has none.
+    """
+    try:
+        row = connect_db().execute("SELECT details FROM operation_logs WHERE id = ?", (log_id,)).fetchone()
+        return json.loads(row[0]) if row and row[0] else None
+    except Exception as e:
+        print(f"Error fetching details of log with ID {log_id}: {e}")
+        return None
+
+
+def fetch_logs(include_archived=False):
+    """
+    Fetches all operation logs from the database.
+    Prefer fetch_logs_page or iter_logs for large tables.
+    :param include_archived: Also return logs moved to the archive by log_archive.
+    :return: A list of log entries
+    """
+    try:
+        return list(iter_logs(include_archived=include_archived))
     except Exception as e:
         print(f"Error fetching logs: {e}")
         return []
 
-<<<<<<< HEAD
-=======
 
->>>>>>> develop
 def reset_logs():
     """
-    Deletes all entries from the operation_logs table and resets the id counter.
+    Deletes all entries from the operation_logs table and resets the id counter, unless
+    logs have been archived: new logs must not reuse the IDs of archived ones.
     """
+    import log_archive
     try:
-        connection = connect_db()  # Establish database connection
-        cursor = connection.cursor()
-        # Delete all rows in the operation_logs table
-        cursor.execute("DELETE FROM operation_logs")
-        # Reset the autoincrement counter for the id column
-        cursor.execute("DELETE FROM sqlite_sequence WHERE name = 'operation_logs'")
-        connection.commit()  # Commit changes
-        connection.close()  # Close the connection
-        print("All logs have been cleared and the ID counter has been reset.")
+        flush()  # Don't let queued records reappear after the reset
+        connection = connect_db()  # Reuse the thread's database connection
+        with connection:  # Commit changes, or roll back on failure
+            # Without the summary triggers SQLite can drop all rows at once instead of
+            # deleting them one by one; the summaries are emptied along with the logs
+            connection.execute("DROP TRIGGER IF EXISTS log_summary_delete")
+            connection.execute("DROP TRIGGER IF EXISTS log_search_delete")
+            # Delete all rows in the operation_logs table
+            connection.execute("DELETE FROM operation_logs")
+            for table, length in SUMMARY_TABLES.values():
+                connection.execute(f"DELETE FROM {table}")
+            connection.execute("DELETE FROM log_expression_counts")
+            connection.execute("INSERT INTO operation_logs_fts (operation_logs_fts) VALUES ('delete-all')")
+            connection.execute("DELETE FROM log_metadata WHERE key IN ('summary_indexed_id', 'search_indexed_id')")
+            connection.execute(summary_triggers()[1])
+            connection.execute(SEARCH_TRIGGERS["log_search_delete"])
+            # Reset the autoincrement counter for the id column
+            keep_ids = log_archive.has_partitions()
+            if not keep_ids:
+                connection.execute("DELETE FROM sqlite_sequence WHERE name = 'operation_logs'")
+            record_deletion(connection)
+        if keep_ids:
+            print("All logs have been cleared, the ID counter is kept since there are archived logs.")
+        else:
+            print("All logs have been cleared and the ID counter has been reset.")
     except Exception as e:
         print(f"Failed to reset logs: {e}")
-<<<<<<< HEAD
-=======
 
 
 def delete_log(log_id):
     """
     Deletes a specific log entry from the database by its ID.
+    The IDs of the other logs are left untouched, see log_number for sequential numbering.
     :param log_id: The ID of the log to delete.
     """
     try:
         connection = connect_db()
-        cursor = connection.cursor()
-        cursor.execute("DELETE FROM operation_logs WHERE id = ?", (log_id,))
-        connection.commit()
-        connection.close()
+        with connection:
+            connection.execute("DELETE FROM operation_logs WHERE id = ?", (log_id,))
+            record_deletion(connection)
         print(f"Log with ID {log_id} has been deleted.")
     except Exception as e:
         print(f"Error deleting log with ID {log_id}: {e}")
 
 
-def reorganize_ids():
+def delete_logs(ids=None, first_id=None, last_id=None, filters=None):
     """
-    Renumbers the IDs in the operation_logs table to ensure they are sequential.
+    Deletes the logs matching all the given criteria in a single transaction.
+    Every criterion is answered from the primary key or an index.
+    :param ids: An iterable of log IDs.
+    :param first_id: Smallest ID of an inclusive ID range.
+    :param last_id: Largest ID of an inclusive ID range.
+    :param filters: Optional filter dictionary, see build_filters.
+    :return: The number of deleted logs.
     """
+    conditions, parameters = build_filters(filters)
+    if first_id is not None:
+        conditions.append("id >= ?")
+        parameters.append(first_id)
+    if last_id is not None:
+        conditions.append("id <= ?")
+        parameters.append(last_id)
+    if ids is not None:
+        ids = list(ids)
+        if not ids:
+            return 0
+        conditions.append("id IN (SELECT value FROM json_each(?))")
+        parameters.append(json.dumps(ids))
+    if not conditions:
+        raise ValueError("No deletion criteria given, use reset_logs to delete all logs.")
+
     try:
         connection = connect_db()
-        cursor = connection.cursor()
+        with connection:
+            cursor = connection.execute(
+                f"DELETE FROM operation_logs WHERE {' AND '.join(conditions)}", parameters
+            )
+            record_deletion(connection)
+        return cursor.rowcount
+    except Exception as e:
+        print(f"Error deleting logs: {e}")
+        return 0
 
-        # Step 1: Create a temporary table with sequential IDs
-        cursor.execute("""
-            CREATE TEMPORARY TABLE temp_logs AS
-            SELECT operator, expression, result, timestamp FROM operation_logs ORDER BY id
-        """)
 
-        # Step 2: Delete all rows from the original table
-        cursor.execute("DELETE FROM operation_logs")
+def log_number(log_id):
+    """
+    Returns the sequential display number of a log, i.e. its 1-based position in ID order.
+    Callers showing consecutive rows only need it for the first row of a page.
+    """
+    try:
+        row = connect_db().execute("SELECT COUNT(*) FROM operation_logs WHERE id <= ?", (log_id,)).fetchone()
+        return row[0]
+    except Exception as e:
+        print(f"Error numbering log with ID {log_id}: {e}")
+        return None
 
-        # Step 3: Insert rows back with sequential IDs
-        cursor.execute("""
-            INSERT INTO operation_logs (id, operator, expression, result, timestamp)
-            SELECT ROW_NUMBER() OVER (ORDER BY ROWID) AS id, operator, expression, result, timestamp
-            FROM temp_logs
-        """)
 
-        # Step 4: Drop the temporary table
-        cursor.execute("DROP TABLE temp_logs")
+def log_counts(interval="hour", since=None, until=None, operator=None):
+    """
+    Returns the number of logs per time bucket, operator and error status, read from the
+    summary tables, so the cost depends on the number of buckets and of logs added since
+    the last read, not on the size of the log table.
+    :param interval: "minute" or "hour".
+    :param since: Only buckets at or after this time ('YYYY-MM-DD HH:MM:SS' or a prefix).
+    :param until: Only buckets before this time. Both limits are rounded to whole buckets.
+    :param operator: Only count logs of this operator.
+    :return: A list of (bucket, operator, is_error, count) tuples in time order.
+    """
+    if interval not in SUMMARY_TABLES:
+        raise ValueError("Invalid interval. Must be 'minute' or 'hour'.")
+    table, length = SUMMARY_TABLES[interval]
+    conditions, parameters = [], []
+    if since is not None:
+        conditions.append("bucket >= ?")
+        parameters.append(since[:length])
+    if until is not None:
+        conditions.append("bucket < ?")
+        parameters.append(until[:length])
+    if operator is not None:
+        conditions.append("operator = ?")
+        parameters.append(operator)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    try:
+        update_summaries()
+        return connect_db().execute(
+            f"SELECT bucket, operator, is_error, count FROM {table} {where} ORDER BY bucket, operator",
+            parameters
+        ).fetchall()
+    except Exception as e:
+        print(f"Error reading log counts: {e}")
+        return []
 
-        # Step 5: Reset the AUTOINCREMENT counter
-        cursor.execute("DELETE FROM sqlite_sequence WHERE name = 'operation_logs'")
 
-        connection.commit()
-        connection.close()
-        print("IDs reorganized successfully.")
+def error_rates(interval="hour", since=None, until=None):
+    """
+    Returns the share of failed evaluations per time bucket.
+    :return: A list of (bucket, total, errors, error rate) tuples in time order.
+    """
+    totals = {}
+    for bucket, operator, is_error, count in log_counts(interval, since, until):
+        total, errors = totals.get(bucket, (0, 0))
+        totals[bucket] = (total + count, errors + (count if is_error else 0))
+    return [(bucket, total, errors, errors / total) for bucket, (total, errors) in totals.items()]
+
+
+def operator_counts(since=None, until=None):
+    """
+    Returns the number of logs per operator, most frequent first.
+    :return: A list of (operator, count) tuples.
+    """
+    counts = {}
+    interval = "minute" if since is not None or until is not None else "hour"
+    for bucket, operator, is_error, count in log_counts(interval, since, until):
+        counts[operator] = counts.get(operator, 0) + count
+    return sorted(counts.items(), key=lambda item: item[1], reverse=True)
+
+
+def top_expressions(limit=10, errors_only=False):
+    """
+    Returns the most frequently logged expressions.
+    :param errors_only: Rank the expressions by the number of times they failed instead.
+    :return: A list of (expression, count, errors) tuples.
+    """
+    try:
+        update_summaries()
+        if errors_only:
+            return connect_db().execute(
+                "SELECT expression, count, errors FROM log_expression_counts WHERE errors > 0 "
+                "ORDER BY errors DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return connect_db().execute(
+            "SELECT expression, count, errors FROM log_expression_counts ORDER BY count DESC LIMIT ?", (limit,)
+        ).fetchall()
     except Exception as e:
-        print(f"Error reorganizing IDs: {e}")
->>>>>>> develop
+        print(f"Error reading expression counts: {e}")
+        return []
+
+
+def log_statistics():
+    """
+    Returns an overview of the live logs for dashboards: totals, error rate, counts per
+    operator and the time range covered.
+    """
+    try:
+        update_summaries()
+        connection = connect_db()
+        total, errors, first, last = connection.execute(
+            "SELECT COALESCE(SUM(count), 0), COALESCE(SUM(count * is_error), 0), MIN(bucket), MAX(bucket) "
+            "FROM log_summary_hour"
+        ).fetchone()
+    except Exception as e:
+        print(f"Error reading log statistics: {e}")
+        return None
+    return {
+        "total": total,
+        "errors": errors,
+        "error_rate": errors / total if total else 0.0,
+        "operators": dict(operator_counts()),
+        "first_hour": first,
+        "last_hour": last,
+    }
+
+
+if config.get("log_async"):
+    start_async_writer()
+
+if any(config.get(key) is not None for key in RETENTION_KEYS):
+    import log_archive
+    log_archive.start_retention_worker()
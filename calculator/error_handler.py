@@ -1,5 +1,19 @@
 import logging
-from tkinter import messagebox
+import os
+import sys
+
+# Whether errors can be shown in popups. Without a display, or with CALCULATOR_HEADLESS=1,
+# handle_error only logs. Tkinter is imported the first time a popup is actually shown.
+headless = os.environ.get("CALCULATOR_HEADLESS", "") not in ("", "0") or (
+    sys.platform.startswith("linux") and not os.environ.get("DISPLAY") and not os.environ.get("WAYLAND_DISPLAY")
+)
+
+def set_headless(enabled):
+    """
+    Enables or disables headless mode, in which errors are never shown in popups.
+    """
+    global headless
+    headless = enabled
 
 def log_error(error_message):
     """
@@ -16,6 +30,7 @@ def show_error_popup(error_message):
     Displays an error message to the user via a popup.
     """
     try:
+        from tkinter import messagebox
         messagebox.showerror("Error", error_message)
     except Exception as e:
         # Log the failure to show a popup
@@ -24,10 +39,16 @@ def show_error_popup(error_message):
 def handle_error(error, display_to_user=False):
     """
     Handles an error by logging it and optionally showing it to the user.
+    In headless mode nothing is shown, and a structured description of the error is returned.
     :param error: The error message or exception object.
     :param display_to_user: Boolean to determine if an error popup should be shown.
     """
     error_message = str(error) if error else "An unknown error occurred."
     log_error(error_message)
-    if display_to_user:
-        return show_error_popup(error_message)
\ No newline at end of file
+    if display_to_user and not headless:
+        return show_error_popup(error_message)
+    if headless:
+        return {
+            "error": error_message,
+            "type": type(error).__name__ if isinstance(error, BaseException) else "Error"
+        }
@@ -1,88 +1,299 @@
-from db_log import log_operation
-import re
-import basic_operators
-import complex_operators
-import trigonometry
-from math import pi
-from config import load_config
+import db_log
+import instrumentation
+import metrics
+from collections import namedtuple
+from time import perf_counter
+from config import get_config
+from expression_parser import compile_expression, optimize
+from numeric_backends import FLOAT, get_backend, cache_key, describe_error
+from cache import LRUCache
 
 # Load configuration
-config = load_config()
-enable_precision = config.get("enable_precision", False)
-precision_value = config.get("precision_value", None) if enable_precision else None
+config = get_config()
+precision_value = config.precision_value
 
-def apply_precision(value):
+def apply_precision(value, backend=FLOAT):
     """
-    Applies precision rounding if enabled.
+    Applies precision rounding if enabled. This is the only rounding of an evaluation:
+    the operators compute at full precision of the numeric backend.
     """
     if precision_value is not None:
-        return round(value, precision_value)
+        return backend.round(value, precision_value)
     return value
 
-def evaluate_expression(expression):
+# Outcome of one expression evaluated by evaluate_many; error is None on success
+BatchResult = namedtuple("BatchResult", ["expression", "result", "error"])
+
+# Cache of parsed expressions keyed by expression text for the float backend and
+# (expression text, backend name) for the others
+expression_cache = LRUCache(config.get("expression_cache_size", 256))
+
+# The result_cache module while result_cache_enabled is set, None otherwise. It is only
+# imported once the cache is enabled, keeping it out of the startup of the default setup.
+result_cache = None
+
+def load_result_cache(values):
+    global result_cache
+    if values.get("result_cache_enabled", False):
+        import result_cache as module
+        result_cache = module
+    else:
+        result_cache = None
+
+load_result_cache(config)
+
+def apply_config(values, old_values):
+    """
+    Picks up precision, cache size and result cache settings after the configuration is
+    reloaded and drops cached expressions, whose evaluation may depend on the old settings.
+    """
+    global precision_value
+    precision_value = config.precision_value
+    expression_cache.resize(values.get("expression_cache_size", 256))
+    expression_cache.clear()
+    load_result_cache(values)
+
+config.subscribe(apply_config)
+
+# Metrics of evaluate_expression, looked up once since they are updated on every call
+evaluations_counter = metrics.counter("evaluations_total")
+evaluation_histogram = metrics.histogram("evaluation_seconds")
+
+metrics.register_collector(lambda: {
+    f"expression_cache_{key}": value for key, value in expression_cache.info().items()
+})
+
+def compile_for(expression, backend):
+    """
+    Compiles an expression for a numeric backend. Literals are converted before constant
+    folding, so that e.g. 0.1+0.2 is folded exactly by the decimal and fraction backends.
+    """
+    if backend is FLOAT:
+        return compile_expression(expression)
+    return optimize(backend.specialize(compile_expression(expression, optimized=False)))
+
+def get_compiled(expression, backend=FLOAT):
+    """
+    Returns the compiled form of an expression, using the cache when possible.
+    """
+    key = cache_key(expression, backend)
+    compiled = expression_cache.get(key)
+    if compiled is None:
+        compiled = compile_for(expression, backend)
+        expression_cache.put(key, compiled)
+    return compiled
+
+def cache_info():
+    """
+    Returns hit, miss and eviction counters of the compiled expression cache.
+    """
+    return expression_cache.info()
+
+def clear_cache():
+    """
+    Empties the compiled expression cache.
+    """
+    expression_cache.clear()
+
+def evaluate_expression(expression, variables=None, log=True, backend=None):
     """
     Evaluates a mathematical expression, including basic and trigonometric functions.
-    Logs the result or any error that occurs during evaluation.
+    Writes exactly one log record with the result or the error, which embeds the trace
+    of the function calls if log_trace is enabled.
+    :param variables: Optional mapping of variable names used in the expression to values.
+    :param log: Set to False to skip the log record, see also instrumentation.set_logging_enabled.
+    :param backend: Numeric backend name ("float", "decimal" or "fraction") or NumericBackend,
+        defaults to the numeric_backend setting. The result has the backend's number type.
+    With result_cache_enabled, results of expressions without variables are looked up in
+    the persistent result cache before evaluating, see result_cache.py.
     """
+    config.check_reload()
+    trace = instrumentation.new_trace() if log else None
+    timed = metrics.enabled
+    if timed:
+        start = mark = perf_counter()
     try:
-        # Map basic operators to functions
-        basic_operations = {
-            "+": basic_operators.add,
-            "-": basic_operators.subtract,
-            "*": basic_operators.multiply,
-            "/": basic_operators.divide,
-            "^": complex_operators.exponent
-        }
-
-        # Map trigonometric functions to their module implementations
-        trig_operations = {
-            "sin": trigonometry.sin,
-            "cos": trigonometry.cos,
-            "tan": trigonometry.tan,
-            "cot": trigonometry.cot,
-            "arcsin": trigonometry.arcsin,
-            "arccos": trigonometry.arccos,
-            "arctan": trigonometry.arctan,
-            "arccot": trigonometry.arccot,
-            "pi": lambda: pi  # Handle 'pi' as a constant
-        }
-
-        # Evaluate trigonometric functions first using regex
-        def evaluate_trig(match):
-            func_name = match.group(1)  # Trigonometric function name
-            argument = float(match.group(2))  # Extract the angle or value
-            if func_name in trig_operations:
-                return str(apply_precision(trig_operations[func_name](argument)))
-            raise ValueError(f"Unsupported function: {func_name}")
-
-        # Replace trigonometric functions with their evaluated results
-        expression = re.sub(r'(sin|cos|tan|cot|arcsin|arccos|arctan|arccot)\((-?\d+(\.\d+)?)\)',
-                            evaluate_trig, expression)
-
-         # Replace the π symbol with its value
-        expression = expression.replace("π", str(pi))
-
-        # Securely evaluate the expression using eval
-        allowed_names = {**basic_operations, **trig_operations, "pi": pi}
-        code = compile(expression, "<string>", "eval")
-        for name in code.co_names:
-            if name not in allowed_names:
+        backend = get_backend(backend)
+        if result_cache is not None:
+            result = result_cache.lookup(expression, backend)
+            if result is not None:
+                if timed:
+                    metrics.stage("cache_lookup", mark)
+                if log:
+                    instrumentation.record("Expression Evaluation", expression, result, trace)
+                return result
+        key = cache_key(expression, backend)
+        compiled = expression_cache.get(key)
+        if timed:
+            mark = metrics.stage("cache_lookup", mark)
+        if compiled is None:
+            compiled = compile_for(expression, backend)
+            expression_cache.put(key, compiled)
+            if timed:
+                mark = metrics.stage("compile", mark)
+        for name in compiled.variables:
+            if variables is None or name not in variables:
                 raise ValueError(f"Use of '{name}' is not allowed.")
-
-        result = eval(code, {"__builtins__": None}, allowed_names)
-        result = apply_precision(result)
+        if backend is not FLOAT:
+            variables = backend.convert_variables(variables)
+        if timed:
+            mark = metrics.stage("validate", mark)
+        result = compiled.evaluate(variables, trace)
+        if timed:
+            mark = metrics.stage("execute", mark)
+        result = apply_precision(result, backend)
+        if timed:
+            metrics.stage("precision", mark)
+        if result_cache is not None:
+            if compiled.variables:
+                result_cache.skip(expression, backend)
+            else:
+                result_cache.store(expression, backend, result)
 
         # Log the successful operation
-        log_operation("Expression Evaluation", expression, result)
+        if log:
+            instrumentation.record("Expression Evaluation", expression, result, trace)
 
         return result
 
     except ZeroDivisionError:
-        log_operation("Error", expression, "Division by zero")
+        if timed:
+            metrics.increment("evaluation_errors_total", type="ZeroDivisionError")
+        if log:
+            instrumentation.record("Error", expression, "Division by zero", trace)
         raise ValueError("Division by zero is not allowed.")
     except ValueError as ve:
-        log_operation("Error", expression, f"Invalid value: {ve}")
+        if timed:
+            metrics.increment("evaluation_errors_total", type="ValueError")
+        if log:
+            instrumentation.record("Error", expression, f"Invalid value: {ve}", trace)
         raise ValueError(f"Invalid value: {ve}")
     except Exception as e:
-        log_operation("Error", expression, f"Unexpected error: {e}")
-        raise ValueError(f"Error evaluating expression: {e}")
+        if timed:
+            metrics.increment("evaluation_errors_total", type=type(e).__name__)
+        message = describe_error(e)
+        if log:
+            instrumentation.record("Error", expression, f"Unexpected error: {message}", trace)
+        raise ValueError(f"Error evaluating expression: {message}")
+    finally:
+        if timed:
+            evaluations_counter.increment()
+            evaluation_histogram.observe(perf_counter() - start)
+
+def evaluate_vectorized(expression, **arrays):
+    """
+    Evaluates one expression over arrays of inputs using NumPy array kernels.
+    Elements that break a domain rule (division by zero, logarithm of a non-positive value,
+    a tangent pole, ...) are set to NaN and marked False in the returned mask.
+    Writes a single summary log record for the whole batch.
+    :param expression: The expression to evaluate, using the keyword names as variables.
+    :param arrays: Variable names bound to NumPy arrays (or anything array-like).
+    :return: A tuple of the result array and the boolean validity mask.
+    """
+    import numpy as np
+    from array_operators import evaluate_arrays
+
+    config.check_reload()
+    try:
+        compiled = get_compiled(expression)
+        for name in compiled.variables:
+            if name not in arrays:
+                raise ValueError(f"Use of '{name}' is not allowed.")
+        arrays = {name: np.asarray(values, dtype=float) for name, values in arrays.items()}
+        result, valid = evaluate_arrays(compiled, arrays)
+        if precision_value is not None:
+            result = np.round(result, precision_value)
+    except ValueError as ve:
+        instrumentation.record("Error", expression, f"Invalid value: {ve}")
+        raise ValueError(f"Invalid value: {ve}")
+
+    invalid = int(valid.size - np.count_nonzero(valid))
+    instrumentation.record("Vectorized Evaluation", expression, f"{valid.size} values, {invalid} invalid")
+    return result, valid
+
+
+def evaluate_chunk(expressions, backend=None, log=True):
+    """
+    Evaluates a list of expressions while capturing their log records.
+    Runs inside the worker processes of iter_evaluate.
+    :return: A tuple of the BatchResult list and the captured log records.
+    """
+    db_log.start_capture()
+    try:
+        outcomes = []
+        for expression in expressions:
+            try:
+                outcomes.append(BatchResult(expression, evaluate_expression(expression, None, log, backend), None))
+            except ValueError as ve:
+                outcomes.append(BatchResult(expression, None, str(ve)))
+        return outcomes, db_log.drain_captured()
+    finally:
+        db_log.stop_capture()
+        if result_cache is not None:
+            # Worker processes exit without running atexit handlers
+            result_cache.flush()
+
+def iter_evaluate(expressions, workers=1, chunksize=256, backend=None, log=True):
+    """
+    Evaluates a stream of independent expressions, yielding a BatchResult per expression
+    in input order. Only a few chunks are read ahead, so memory stays bounded however long
+    the input is. Log records are written by this process in one bulk insert per chunk.
+    :param expressions: An iterable of expression strings, consumed lazily.
+    :param workers: Number of worker processes. With a single worker the expressions
+        are evaluated in this process.
+    :param chunksize: Number of expressions sent to a worker at a time.
+    :param backend: Numeric backend name, see evaluate_expression.
+    :param log: Set to False to skip the log records.
+    """
+    from itertools import islice
+
+    config.check_reload()
+    expressions = iter(expressions)
+    chunks = iter(lambda: list(islice(expressions, chunksize)), [])
+
+    if workers <= 1:
+        for chunk in chunks:
+            outcomes, records = evaluate_chunk(chunk, backend, log)
+            db_log.log_operations(records)
+            yield from outcomes
+        return
+
+    from collections import deque
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(executor.submit(evaluate_chunk, chunk, backend, log))
+            # Keep two chunks per worker in flight: enough to keep them busy
+            if len(pending) >= workers * 2:
+                outcomes, records = pending.popleft().result()
+                db_log.log_operations(records)
+                yield from outcomes
+        while pending:
+            outcomes, records = pending.popleft().result()
+            db_log.log_operations(records)
+            yield from outcomes
+
+def evaluate_many(expressions, workers=None, chunksize=None, backend=None):
+    """
+    Evaluates independent expressions in parallel across a pool of worker processes.
+    Workers do not touch the database: their log records are sent back and written by
+    this process in one bulk insert per chunk.
+    :param expressions: An iterable of expression strings.
+    :param workers: Number of worker processes, defaults to the number of CPUs.
+        With a single worker the expressions are evaluated in this process.
+    :param chunksize: Number of expressions sent to a worker at a time.
+    :param backend: Numeric backend name, see evaluate_expression.
+    :return: A list of BatchResult tuples in the same order as the input.
+    """
+    import os
+
+    expressions = list(expressions)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if chunksize is None:
+        chunksize = max(1, len(expressions) // (workers * 4))
+    if len(expressions) <= chunksize:
+        workers = 1
+    return list(iter_evaluate(expressions, workers, chunksize, backend))
@@ -0,0 +1,425 @@
+import re
+from math import pi
+import basic_operators
+import complex_operators
+import trigonometry
+
+# Instruction opcodes of the stack machine
+PUSH = 0    # Push a constant (name is the literal's text, if any)
+LOAD = 1    # Push the value of a variable
+UNARY = 2   # Apply a one-argument function to the top of the stack
+BINARY = 3  # Apply a two-argument function to the top two values
+CALL = 4    # Call a function with a given number of arguments
+STORE = 5   # Copy the top of the stack into a temporary slot
+FETCH = 6   # Push the value of a temporary slot
+
+# Map binary operators to their module implementations
+BINARY_OPERATORS = {
+    "+": basic_operators.add,
+    "-": basic_operators.subtract,
+    "*": basic_operators.multiply,
+    "/": basic_operators.divide,
+    "^": complex_operators.exponent,
+    "**": complex_operators.exponent
+}
+
+# Map function names to (implementation, allowed argument counts)
+FUNCTIONS = {
+    "sin": (trigonometry.sin, (1,)),
+    "cos": (trigonometry.cos, (1,)),
+    "tan": (trigonometry.tan, (1,)),
+    "cot": (trigonometry.cot, (1,)),
+    "arcsin": (trigonometry.arcsin, (1,)),
+    "arccos": (trigonometry.arccos, (1,)),
+    "arctan": (trigonometry.arctan, (1,)),
+    "arccot": (trigonometry.arccot, (1,)),
+    "log": (complex_operators.logarithm, (1, 2))
+}
+
+CONSTANTS = {
+    "pi": pi,
+    "π": pi
+}
+
+TOKEN_PATTERN = re.compile(r"""
+    (?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+  | (?P<name>[A-Za-z_][A-Za-z0-9_]*|π)
+  | (?P<operator>\*\*|[-+*/^])
+  | (?P<paren>[(),])
+  | (?P<space>\s+)
+""", re.VERBOSE)
+
+
+def tokenize(expression):
+    """
+    Splits an expression into (kind, text, position) tokens in a single pass.
+    Raises a ValueError on characters that are not part of the grammar.
+    """
+    position = 0
+    length = len(expression)
+    while position < length:
+        match = TOKEN_PATTERN.match(expression, position)
+        if match is None:
+            raise ValueError(f"Unexpected character '{expression[position]}' at position {position}.")
+        kind = match.lastgroup
+        if kind != "space":
+            yield kind, match.group(), position
+        position = match.end()
+    yield "end", "", position
+
+
+class CompiledExpression:
+    """
+    A parsed expression in the form of a compact instruction list for a stack machine.
+    It can be evaluated many times without parsing the text again.
+    """
+
+    __slots__ = ("source", "instructions", "variables", "temps")
+
+    def __init__(self, source, instructions, variables, temps=0):
+        """
+        :param temps: Number of temporary slots used by STORE and FETCH instructions.
+        """
+        self.source = source
+        self.instructions = tuple(instructions)
+        self.variables = frozenset(variables)
+        self.temps = temps
+
+    def evaluate(self, variables=None, trace=None):
+        """
+        Runs the instruction list and returns the value left on the stack.
+        :param variables: A mapping of variable names to values.
+        :param trace: Optional list that receives one entry per function call made.
+        """
+        if trace is not None:
+            return self.evaluate_traced(variables, trace)
+        stack = []
+        push = stack.append
+        temps = [None] * self.temps
+        for opcode, argument, name in self.instructions:
+            if opcode == PUSH:
+                push(argument)
+            elif opcode == BINARY:
+                right = stack.pop()
+                stack[-1] = argument(stack[-1], right)
+            elif opcode == UNARY:
+                stack[-1] = argument(stack[-1])
+            elif opcode == LOAD:
+                try:
+                    push(variables[argument])
+                except (KeyError, TypeError):
+                    raise ValueError(f"Use of '{argument}' is not allowed.")
+            elif opcode == FETCH:
+                push(temps[argument])
+            elif opcode == STORE:
+                temps[argument] = stack[-1]
+            else:
+                count = name[1]
+                arguments = stack[-count:]
+                del stack[-count:]
+                push(argument(*arguments))
+        return stack[0]
+
+    def evaluate_traced(self, variables, trace):
+        """
+        Same as evaluate, but appends {"function", "arguments", "result"} entries to the
+        trace for every named function call (operators are not traced).
+        """
+        stack = []
+        temps = [None] * self.temps
+        for opcode, argument, name in self.instructions:
+            if opcode == PUSH:
+                stack.append(argument)
+            elif opcode == LOAD:
+                try:
+                    stack.append(variables[argument])
+                except (KeyError, TypeError):
+                    raise ValueError(f"Use of '{argument}' is not allowed.")
+            elif opcode == FETCH:
+                stack.append(temps[argument])
+            elif opcode == STORE:
+                temps[argument] = stack[-1]
+            elif opcode == BINARY:
+                right = stack.pop()
+                stack[-1] = argument(stack[-1], right)
+            else:
+                count, function_name = (1, name) if opcode == UNARY else (name[1], name[0])
+                arguments = stack[-count:]
+                del stack[-count:]
+                result = argument(*arguments)
+                if function_name != "-":
+                    trace.append({"function": function_name, "arguments": arguments, "result": result})
+                stack.append(result)
+        return stack[0]
+
+    def __repr__(self):
+        return f"CompiledExpression({self.source!r})"
+
+
+class Parser:
+    """
+    Recursive descent parser that emits stack machine instructions while reading the tokens.
+    Precedence from lowest to highest: + -, * /, unary + -, ^ (right associative).
+    """
+
+    def __init__(self, expression):
+        self.expression = expression
+        self.tokens = tokenize(expression)
+        self.instructions = []
+        self.variables = set()
+        self.advance()
+
+    def advance(self):
+        self.kind, self.text, self.position = next(self.tokens)
+
+    def expect(self, text):
+        if self.text != text or self.kind == "end":
+            found = f"'{self.text}'" if self.kind != "end" else "end of expression"
+            raise ValueError(f"Expected '{text}' at position {self.position}, found {found}.")
+        self.advance()
+
+    def emit(self, opcode, argument=None, name=None):
+        self.instructions.append((opcode, argument, name))
+
+    def parse(self):
+        if self.kind == "end":
+            raise ValueError("The expression is empty.")
+        self.parse_sum()
+        if self.kind != "end":
+            raise ValueError(f"Unexpected '{self.text}' at position {self.position}.")
+        return CompiledExpression(self.expression, self.instructions, self.variables)
+
+    def parse_sum(self):
+        self.parse_product()
+        while self.kind == "operator" and self.text in ("+", "-"):
+            operator = self.text
+            self.advance()
+            self.parse_product()
+            self.emit(BINARY, BINARY_OPERATORS[operator], operator)
+
+    def parse_product(self):
+        self.parse_unary()
+        while self.kind == "operator" and self.text in ("*", "/"):
+            operator = self.text
+            self.advance()
+            self.parse_unary()
+            self.emit(BINARY, BINARY_OPERATORS[operator], operator)
+
+    def parse_unary(self):
+        if self.kind == "operator" and self.text in ("+", "-"):
+            operator = self.text
+            self.advance()
+            self.parse_unary()
+            if operator == "-":
+                self.emit(UNARY, basic_operators.negate, "-")
+            return
+        self.parse_power()
+
+    def parse_power(self):
+        self.parse_primary()
+        if self.kind == "operator" and self.text in ("^", "**"):
+            operator = self.text
+            self.advance()
+            self.parse_unary()  # Right associative, allows 2^-1
+            self.emit(BINARY, BINARY_OPERATORS[operator], "^")
+
+    def parse_primary(self):
+        kind, text, position = self.kind, self.text, self.position
+        if kind == "number":
+            self.advance()
+            value = float(text) if any(c in text for c in ".eE") else int(text)
+            self.emit(PUSH, value, text)  # The text is kept for exact numeric backends
+        elif kind == "name":
+            self.advance()
+            if self.text == "(" and self.kind == "paren":
+                self.parse_call(text, position)
+            elif text in CONSTANTS:
+                self.emit(PUSH, CONSTANTS[text])
+            elif text in FUNCTIONS:
+                raise ValueError(f"Function '{text}' at position {position} must be called with arguments.")
+            else:
+                self.variables.add(text)
+                self.emit(LOAD, text)
+        elif text == "(":
+            self.advance()
+            self.parse_sum()
+            self.expect(")")
+        elif kind == "end":
+            raise ValueError("Unexpected end of expression.")
+        else:
+            raise ValueError(f"Unexpected '{text}' at position {position}.")
+
+    def parse_call(self, name, position):
+        if name not in FUNCTIONS:
+            raise ValueError(f"Use of '{name}' is not allowed.")
+        function, arities = FUNCTIONS[name]
+        self.advance()  # Skip "("
+        count = 0
+        if self.text != ")":
+            self.parse_sum()
+            count = 1
+            while self.text == "," and self.kind == "paren":
+                self.advance()
+                self.parse_sum()
+                count += 1
+        self.expect(")")
+        if count not in arities:
+            raise ValueError(f"Function '{name}' at position {position} does not take {count} argument(s).")
+        if count == 1:
+            self.emit(UNARY, function, name)
+        else:
+            self.emit(CALL, function, (name, count))
+
+
+def make_node(instruction, children, nodes):
+    """
+    Returns the (instruction, children) node, reusing the one in nodes if an equal node
+    was made before. Equal subexpressions are then the same object and can be told apart
+    by id, instead of hashing and comparing whole subtrees, which is quadratic for long
+    chains. Constants are only shared with constants of the same type, so that e.g.
+    a folded 2 doesn't turn into a folded 2.0.
+    """
+    if children:
+        key = instruction, tuple(map(id, children))
+    else:
+        key = instruction, type(instruction[1])
+    return nodes.setdefault(key, (instruction, children))
+
+
+def build_tree(instructions, nodes):
+    """
+    Turns an instruction list without temporary slots into a tree of
+    (instruction, children) nodes. Equal subexpressions give the same node.
+    """
+    stack = []
+    for instruction in instructions:
+        opcode, argument, name = instruction
+        count = 0 if opcode in (PUSH, LOAD) else 1 if opcode == UNARY else 2 if opcode == BINARY else name[1]
+        children = tuple(stack[len(stack) - count:])
+        del stack[len(stack) - count:]
+        stack.append(make_node(instruction, children, nodes))
+    return stack[0]
+
+
+def is_constant(node, value):
+    return node[0][0] == PUSH and node[0][1] == value
+
+
+def simplify(node, nodes):
+    """
+    Folds constant subexpressions and removes trivial identities, bottom up.
+    The tree is walked with an explicit stack, so long chains such as x+x+...+x don't
+    run into the recursion limit.
+    """
+    results = []
+    stack = [(node, False)]
+    while stack:
+        node, visited = stack.pop()
+        instruction, children = node
+        if not children:
+            results.append(node)
+        elif not visited:
+            stack.append((node, True))
+            stack.extend((child, False) for child in reversed(children))
+        else:
+            count = len(children)
+            children = tuple(results[len(results) - count:])
+            del results[len(results) - count:]
+            results.append(simplify_node(instruction, children, nodes))
+    return results[0]
+
+
+def simplify_node(instruction, children, nodes):
+    """
+    Simplifies one node whose children are already simplified.
+    A constant subexpression whose evaluation raises is kept as it is, so that the
+    error is still raised, and logged, when the expression is evaluated.
+    """
+    function = instruction[1]
+
+    if all(child[0][0] == PUSH for child in children):
+        try:
+            value = function(*(child[0][1] for child in children))
+        except Exception:
+            pass
+        else:
+            return make_node((PUSH, value, None), (), nodes)
+
+    if instruction[0] == BINARY:
+        left, right = children
+        if function in (basic_operators.add, basic_operators.subtract) and is_constant(right, 0):
+            return left
+        if function is basic_operators.add and is_constant(left, 0):
+            return right
+        if function in (basic_operators.multiply, basic_operators.divide, complex_operators.exponent) \
+                and is_constant(right, 1):
+            return left
+        if function is basic_operators.multiply and is_constant(left, 1):
+            return right
+    elif function is basic_operators.negate and children[0][0][1] is basic_operators.negate:
+        return children[0][1][0]  # --x
+    return make_node(instruction, children, nodes)
+
+
+def count_subexpressions(node, counts):
+    """
+    Counts how often each non-leaf subexpression is used, by node id. The children of
+    a repeated subexpression are counted once, since it is computed only once.
+    """
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if not node[1]:
+            continue
+        count = counts[id(node)] = counts.get(id(node), 0) + 1
+        if count == 1:
+            stack.extend(node[1])
+
+
+def emit_tree(node, counts, slots, instructions):
+    """
+    Appends the instructions of a tree. The first occurrence of a repeated subexpression
+    stores its value in a temporary slot, the later ones fetch it.
+    """
+    stack = [(node, False)]
+    while stack:
+        node, visited = stack.pop()
+        instruction, children = node
+        if visited:
+            instructions.append(instruction)
+            if counts.get(id(node), 0) > 1:
+                slot = slots[id(node)] = len(slots)
+                instructions.append((STORE, slot, None))
+        elif id(node) in slots:
+            instructions.append((FETCH, slots[id(node)], None))
+        else:
+            stack.append((node, True))
+            stack.extend((child, False) for child in reversed(children))
+
+
+def optimize(compiled):
+    """
+    Returns an optimized copy of a CompiledExpression: constant subexpressions are folded,
+    x+0, x-0, x*1, x/1, x^1 and --x are reduced to x, and repeated subexpressions such as
+    the two sin(x) in sin(x)*sin(x) are computed once. Domain errors (division by zero,
+    logarithm of a non-positive value, ...) are raised at evaluation time as before.
+    Folded function calls no longer appear in evaluation traces.
+    """
+    # Every node made while optimizing, keeping them alive while they are keyed by id
+    nodes = {}
+    root = simplify(build_tree(compiled.instructions, nodes), nodes)
+    counts = {}
+    count_subexpressions(root, counts)
+    slots = {}
+    instructions = []
+    emit_tree(root, counts, slots, instructions)
+    return CompiledExpression(compiled.source, instructions, compiled.variables, len(slots))
+
+
+def compile_expression(expression, optimized=True):
+    """
+    Parses an expression into a CompiledExpression that can be evaluated repeatedly.
+    :param optimized: Set to False to skip the optimize pass.
+    """
+    compiled = Parser(expression).parse()
+    return optimize(compiled) if optimized else compiled
@@ -1,23 +1,17 @@
 import tkinter as tk
-<<<<<<< HEAD
-from tkinter import messagebox, font
-from expression_evaluator import evaluate_expression
-from db_log import reset_logs, fetch_logs
-
-# Initialize the main window first
-=======
 from tkinter import messagebox, font, ttk
 from expression_evaluator import evaluate_expression
-from db_log import fetch_logs, reset_logs, delete_log, reorganize_ids
+from db_log import (search_logs, sort_key, count_logs, last_log_id, deletion_count, reset_logs, delete_log,
+                    fetch_log_details, log_statistics, top_expressions)
+from plot import show_plot
 
 # Initialize the main window
->>>>>>> develop
 root = tk.Tk()
 root.title("Resizable Calculator")
 root.geometry("500x600")  # Initial size
 
 # Configure grid rows and columns for resizing
-for i in range(9):  # 9 rows (including Clear and Show Logs)
+for i in range(9):  # 9 rows (including Clear, Plot and Show Logs)
     root.grid_rowconfigure(i, weight=1)
 for j in range(4):  # 4 columns
     root.grid_columnconfigure(j, weight=1)
@@ -33,19 +27,11 @@ def append_to_expression(value):
     current_text = display.get()
     operators = set("+-*/^")
 
-<<<<<<< HEAD
-    # If the last character is an operator and the new value is also an operator
-=======
->>>>>>> develop
     if current_text and current_text[-1] in operators and value in operators:
         # Replace the last operator with the new one
         display.set(current_text[:-1] + value)
     else:
-<<<<<<< HEAD
-       # Automatically insert '*' if necessary
-=======
         # Automatically insert '*' if necessary
->>>>>>> develop
         if (
             current_text
             and (current_text[-1].isdigit() or current_text[-1] == "π" or current_text[-1] == ")")
@@ -55,10 +41,6 @@ def append_to_expression(value):
         ):
             display.set(current_text + "*" + str(value))
         else:
-<<<<<<< HEAD
-            # Otherwise, append the value as normal
-=======
->>>>>>> develop
             display.set(current_text + str(value))
 
 def clear_expression():
@@ -74,33 +56,6 @@ def calculate_expression():
     """
     try:
         expression = display.get()
-<<<<<<< HEAD
-        if not expression.strip():  # Handle empty input
-            raise ValueError("The expression is empty.")
-
-        print(f"Evaluating: {expression}")  # Debugging
-        result = evaluate_expression(expression)  # Calls the centralized evaluator
-        display.set(result)  # Display the result in the calculator
-
-    except ValueError as ve:
-        # Display user-friendly error messages
-        messagebox.showerror("Error", str(ve))
-        display.set("")  # Clear the display if there is an error
-
-    except Exception as e:
-        # Handle unexpected errors gracefully
-        messagebox.showerror("Error", f"An unexpected error occurred: {e}")
-        display.set("")
-
-
-import tkinter as tk
-from tkinter import ttk
-from db_log import fetch_logs, reset_logs
-
-def show_logs():
-    """
-    Opens a new window to display logs in a table format and allows clearing logs.
-=======
         if not expression.strip():
             raise ValueError("The expression is empty.")
         result = evaluate_expression(expression)
@@ -115,145 +70,303 @@ def show_logs():
 def show_logs():
     """
     Opens a new window to display logs in a table format and allows clearing all or selected logs.
->>>>>>> develop
-    Automatically refreshes every 2 seconds.
+    Only the rows that fit in the window are loaded from the database (virtual scrolling).
+    Rows are numbered by their position in the table, log IDs are never rewritten.
+    The search box and the column headings filter and sort the logs; both are done by
+    indexed SQL queries that return one page of rows at a time.
+    Automatically refreshes every 2 seconds when logs were added or deleted.
+    A panel above the table shows statistics read from the summary tables.
     """
-    def update_logs():
+    state = {
+        "first": 0,                      # Position of the first displayed row in the sorted logs
+        "visible": 20,                   # Number of rows that fit in the table
+        "selected": None,                # Id of the selected log, kept while scrolled out of view
+        "text": "",                      # Current search text
+        "sort": "id",                    # Column the logs are sorted by, see SORT_COLUMNS
+        "descending": False,
+        "total": count_logs(),           # Number of logs matching the search
+        "rows": [],                      # Displayed rows, reused when scrolling
+        "rows_first": 0,                 # Position of the first of them
+        "deletions": deletion_count(),   # Detect changes made since the rows were loaded
+        "last_id": last_log_id(),
+        "search_job": None               # Pending delayed search, see on_search_change
+    }
+
+    def query(**page):
+        return search_logs(state["text"] or None, None, state["sort"], state["descending"], **page)
+
+    def load_rows(first, count):
+        """
+        Returns count rows starting at position first. Rows already displayed are reused and
+        the rows scrolled into view are fetched by keyset; jumps are fetched by position.
         """
-        Updates the table with the latest logs from the database.
-<<<<<<< HEAD
+        rows, start = state["rows"], state["rows_first"]
+        if rows and start <= first <= start + len(rows):
+            kept = rows[first - start:first - start + count]
+            if len(kept) < count:
+                kept += query(after=sort_key(rows[-1], state["sort"]), limit=count - len(kept))
+            return kept
+        if rows and first < start <= first + count:
+            return (query(before=sort_key(rows[0], state["sort"]), limit=start - first) + rows)[:count]
+        if first + count >= state["total"]:
+            # The last page is the first one in reverse order, however long the table
+            rows = search_logs(state["text"] or None, None, state["sort"], not state["descending"], limit=count)
+            rows.reverse()
+            return rows
+        return query(offset=first, limit=count)
+
+    def visible_rows():
         """
-        for row in tree.get_children():  # Clear the existing rows
-            tree.delete(row)
+        Returns how many rows fit in the table at its current height.
+        """
+        row_height = int(ttk.Style().lookup("Treeview", "rowheight") or 20)
+        return max(1, tree.winfo_height() // row_height - 1)  # One row is taken by the headings
 
-        logs = fetch_logs()  # Fetch logs from the database
-        if logs:
-            for log in logs:
-                tree.insert("", "end", values=log)  # Insert each log as a row
-        else:
-            tree.insert("", "end", values=("No logs available", "", "", "", ""))
+    def render():
+        """
+        Shows the window of rows starting at state["first"] and updates the scrollbar.
+        """
+        count = state["visible"]
+        total = state["total"]
+        state["first"] = max(0, min(state["first"], total - count))
+        first = state["first"]
+
+        tree.delete(*tree.get_children())
+        if not total:
+            state["rows"] = []
+            tree.insert("", "end", iid="empty", values=("", "No logs available", "", "", "", ""))
+            scrollbar.set(0, 1)
+            return
+
+        logs = load_rows(first, count)
+        state["rows"], state["rows_first"] = logs, first
+        for number, log in enumerate(logs, start=first + 1):
+            tree.insert("", "end", iid=str(log[0]), values=(number, *log))
 
-        logs_window.after(2000, update_logs)  # Schedule the next update
-=======
-        Preserves the current selection, if valid.
+        # Restore the selection if the selected log is in view
+        selected = state["selected"]
+        if selected is not None and tree.exists(str(selected)):
+            tree.selection_set(str(selected))
+        scrollbar.set(first / total, min(1, (first + count) / total))
+
+    def reload(first=0):
+        """
+        Counts the logs matching the search again and shows them from position first.
+        """
+        state["total"] = count_logs(state["text"] or None)
+        state["rows"] = []
+        state["first"] = first
+        render()
+
+    def scroll(action, amount, unit=None):
         """
+        Handles scrollbar and mouse wheel commands by moving the window of displayed rows.
+        """
+        if action == "moveto":
+            state["first"] = int(float(amount) * state["total"])
+        else:
+            step = state["visible"] if unit == "pages" else 1
+            state["first"] += int(amount) * step
+        render()
+
+    def on_mouse_wheel(event):
+        if event.num == 4 or event.delta > 0:
+            scroll("scroll", -3)
+        else:
+            scroll("scroll", 3)
+        return "break"
+
+    def on_resize(event):
+        visible = visible_rows()
+        if visible != state["visible"]:
+            state["visible"] = visible
+            render()
+
+    def on_select(event):
         selected = tree.selection()
-        selected_id = None
-        if selected:
-            selected_log = tree.item(selected[0])["values"]
-            if selected_log:
-                selected_id = selected_log[0]
-
-        # Clear the existing rows
-        for row in tree.get_children():
-            tree.delete(row)
-
-        # Fetch and populate logs
-        logs = fetch_logs()
-        if logs:
-            for log in logs:
-                tree.insert("", "end", values=log)
+        if selected and selected[0] != "empty":
+            state["selected"] = int(selected[0])
+
+    def on_search_change(*args):
+        """
+        Runs the search shortly after the user stops typing.
+        """
+        if state["search_job"] is not None:
+            logs_window.after_cancel(state["search_job"])
+        state["search_job"] = logs_window.after(300, apply_search)
+
+    def apply_search():
+        state["search_job"] = None
+        text = search_text.get().strip()
+        if text != state["text"]:
+            state["text"] = text
+            reload()
+
+    def sort_by(column):
+        """
+        Sorts the logs by a column; clicking the same heading again reverses the order.
+        """
+        if state["sort"] == column:
+            state["descending"] = not state["descending"]
         else:
-            tree.insert("", "end", values=("No logs available", "", "", "", ""))
+            state["sort"], state["descending"] = column, False
+        for heading, name in sort_columns.items():
+            arrow = (" \u25bc" if state["descending"] else " \u25b2") if name == column else ""
+            tree.heading(heading, text=heading + arrow)
+        reload()
 
-        # Restore the selection if the ID still exists
-        if selected_id is not None:
-            for item in tree.get_children():
-                if tree.item(item)["values"][0] == selected_id:
-                    tree.selection_set(item)
-                    break
+    def refresh_logs():
+        """
+        Reloads the displayed rows if logs were added or deleted since the last refresh.
+        Follows new logs when the view is at the end of the table.
+        """
+        deletions, last_id = deletion_count(), last_log_id()
+        if deletions == state["deletions"] and last_id == state["last_id"]:
+            return
+        state["deletions"], state["last_id"] = deletions, last_id
+        at_end = state["first"] + state["visible"] >= state["total"]
+        state["total"] = count_logs(state["text"] or None)
+        state["rows"] = []
+        if at_end:
+            state["first"] = state["total"]
+        render()
+
+    def refresh_stats():
+        """
+        Updates the statistics panel: totals, error rate, busiest operators and expressions.
+        """
+        stats = log_statistics()
+        if stats is None:
+            return
+        operators = ", ".join(f"{operator}: {count}" for operator, count in list(stats["operators"].items())[:3])
+        expressions = ", ".join(f"{expression} ({count})" for expression, count, errors in top_expressions(3))
+        stats_text.set(
+            f"Logs: {stats['total']}   Errors: {stats['errors']} ({stats['error_rate']:.1%})"
+            f"   Operators: {operators or '-'}\nTop expressions: {expressions or '-'}"
+        )
 
-        # Schedule the next update
+    def update_logs():
+        """
+        Refreshes the table and schedules the next update while the window is open.
+        """
+        if not logs_window.winfo_exists():
+            return
+        refresh_logs()
+        refresh_stats()
         logs_window.after(2000, update_logs)
->>>>>>> develop
 
     def clear_logs_action():
         """
         Clears all logs and refreshes the table.
         """
-<<<<<<< HEAD
-        reset_logs()
-        for row in tree.get_children():  # Clear the table rows
-            tree.delete(row)
-        tree.insert("", "end", values=("No logs available", "", "", "", ""))
-=======
         if messagebox.askyesno("Confirm", "Are you sure you want to clear all logs?"):
             reset_logs()
-            reorganize_ids()  # Reorganize IDs after clearing logs
-            update_logs()
+            state["selected"] = None
+            refresh_logs()
+            refresh_stats()
 
     def clear_selected_log():
         """
         Deletes the selected log and refreshes the table.
         """
-        selected = tree.selection()
-        if not selected:
+        log_id = state["selected"]
+        if log_id is None:
             messagebox.showwarning("Warning", "No log selected.")
             return
 
-        selected_log = tree.item(selected[0])["values"]
-        if not selected_log or selected_log[0] == "No logs available":
-            messagebox.showwarning("Warning", "Invalid selection.")
-            return
-
-        log_id = selected_log[0]
         try:
             delete_log(log_id)
-            reorganize_ids()  # Reorganize IDs after deleting a log
-            update_logs()
-            messagebox.showinfo("Success", f"Log ID {log_id} deleted and IDs updated.")
+            state["selected"] = None
+            refresh_logs()
+            messagebox.showinfo("Success", f"Log ID {log_id} deleted.")
         except Exception as e:
             messagebox.showerror("Error", f"Failed to delete log ID {log_id}: {e}")
->>>>>>> develop
+
+    def show_log_details(event=None):
+        """
+        Shows the function calls recorded with the selected log (see the log_trace setting).
+        """
+        log_id = state["selected"]
+        if log_id is None:
+            messagebox.showwarning("Warning", "No log selected.", parent=logs_window)
+            return
+        details = fetch_log_details(log_id)
+        if not details or not details.get("trace"):
+            messagebox.showinfo("Details", f"No function calls were recorded for log ID {log_id}. "
+                                           "Enable log_trace to record them.", parent=logs_window)
+            return
+        calls = [f"{call['function']}({', '.join(str(argument) for argument in call['arguments'])}) = {call['result']}"
+                 for call in details["trace"]]
+        messagebox.showinfo("Details", f"Function calls of log ID {log_id}:\n\n" + "\n".join(calls),
+                            parent=logs_window)
 
     # Create the logs window
     logs_window = tk.Toplevel()
     logs_window.title("Logs")
-<<<<<<< HEAD
-    logs_window.geometry("850x400")  # Set an appropriate initial size
-=======
     logs_window.geometry("800x450")  # Set an appropriate initial size
->>>>>>> develop
-
-    # Create the table using Treeview
-    columns = ("ID", "Operator", "Expression", "Result", "Timestamp")
-    tree = ttk.Treeview(logs_window, columns=columns, show="headings")
-    tree.pack(fill="both", expand=True)
 
-    # Configure column headings
-    tree.heading("ID", text="ID")
-    tree.heading("Operator", text="Operator")
-    tree.heading("Expression", text="Expression")
-    tree.heading("Result", text="Result")
-    tree.heading("Timestamp", text="Timestamp")
+    # Statistics panel
+    stats_text = tk.StringVar()
+    stats_label = tk.Label(logs_window, textvariable=stats_text, font=("Arial", 11), justify="left", anchor="w")
+    stats_label.pack(side="top", fill="x", padx=10, pady=(10, 0))
+
+    # Search box, matching the text anywhere in the expression or the result
+    search_frame = tk.Frame(logs_window)
+    search_frame.pack(side="top", fill="x", padx=10, pady=5)
+    tk.Label(search_frame, text="Search:", font=("Arial", 11)).pack(side="left")
+    search_text = tk.StringVar()
+    search_entry = tk.Entry(search_frame, textvariable=search_text, font=("Arial", 11))
+    search_entry.pack(side="left", fill="x", expand=True, padx=5)
+    search_text.trace_add("write", on_search_change)
+
+    # Create the table using Treeview, with a scrollbar driven by the virtual row window
+    table_frame = tk.Frame(logs_window)
+    table_frame.pack(side="top", fill="both", expand=True)
+
+    columns = ("No.", "ID", "Operator", "Expression", "Result", "Timestamp")
+    tree = ttk.Treeview(table_frame, columns=columns, show="headings", selectmode="browse")
+    scrollbar = ttk.Scrollbar(table_frame, orient="vertical", command=scroll)
+    scrollbar.pack(side="right", fill="y")
+    tree.pack(side="left", fill="both", expand=True)
+
+    # Configure column headings; clicking a heading sorts by its column
+    sort_columns = {"ID": "id", "Operator": "operator", "Expression": "expression",
+                    "Result": "result", "Timestamp": "timestamp"}
+    tree.heading("No.", text="No.")
+    for heading, column in sort_columns.items():
+        tree.heading(heading, text=heading, command=lambda column=column: sort_by(column))
+    tree.heading("ID", text="ID \u25b2")
 
     # Set column widths
+    tree.column("No.", width=60, anchor="center")
     tree.column("ID", width=50, anchor="center")
     tree.column("Operator", width=150, anchor="center")
-    tree.column("Expression", width=300, anchor="w")
+    tree.column("Expression", width=250, anchor="w")
     tree.column("Result", width=150, anchor="center")
     tree.column("Timestamp", width=200, anchor="center")
 
-<<<<<<< HEAD
-    # Add a "Clear Logs" button
-    clear_logs_btn = tk.Button(logs_window, text="Clear Logs", font=("Arial", 14), command=clear_logs_action)
-    clear_logs_btn.pack(fill="x", padx=10, pady=10)
-=======
-    # Add buttons for clearing logs
+    tree.bind("<<TreeviewSelect>>", on_select)
+    tree.bind("<Double-1>", show_log_details)
+    tree.bind("<Configure>", on_resize)
+    tree.bind("<MouseWheel>", on_mouse_wheel)
+    tree.bind("<Button-4>", on_mouse_wheel)
+    tree.bind("<Button-5>", on_mouse_wheel)
+
+    # Add buttons for clearing logs and showing the details of a log
     btn_clear_selected = tk.Button(logs_window, text="Clear Selected", font=("Arial", 14), command=clear_selected_log)
     btn_clear_selected.pack(side="left", fill="x", expand=True, padx=10, pady=10)
 
+    btn_details = tk.Button(logs_window, text="Details", font=("Arial", 14), command=show_log_details)
+    btn_details.pack(side="left", fill="x", expand=True, padx=10, pady=10)
+
     btn_clear_all = tk.Button(logs_window, text="Clear All", font=("Arial", 14), command=clear_logs_action)
     btn_clear_all.pack(side="right", fill="x", expand=True, padx=10, pady=10)
->>>>>>> develop
 
-    # Initial log update and start auto-refresh
-    update_logs()
+    # Initial log display and start auto-refresh
+    render()
+    refresh_stats()
+    logs_window.after(2000, update_logs)
 
-<<<<<<< HEAD
-
-=======
->>>>>>> develop
 def adjust_font(event):
     """
     Dynamically adjusts the button text size based on window size.
@@ -275,25 +388,14 @@ buttons = [
     ("7", 1, 0), ("8", 1, 1), ("9", 1, 2), ("/", 1, 3),
     ("4", 2, 0), ("5", 2, 1), ("6", 2, 2), ("*", 2, 3),
     ("1", 3, 0), ("2", 3, 1), ("3", 3, 2), ("-", 3, 3),
-<<<<<<< HEAD
-    ("0", 4, 0), (".", 4, 1), ("=", 4, 2), ("+", 4, 3),  # Change the command here
-=======
     ("0", 4, 0), (".", 4, 1), ("=", 4, 2), ("+", 4, 3),
->>>>>>> develop
 ]
 
 for text, row, col in buttons:
     if text == "=":
-<<<<<<< HEAD
-        btn = tk.Button(root, text=text, font=button_font, command=calculate_expression)  # Connect "=" button to calculate_expression
-    else:
-        btn = tk.Button(root, text=text, font=button_font,
-                        command=lambda val=text: append_to_expression(val))
-=======
         btn = tk.Button(root, text=text, font=button_font, command=calculate_expression)
     else:
         btn = tk.Button(root, text=text, font=button_font, command=lambda val=text: append_to_expression(val))
->>>>>>> develop
     btn.grid(row=row, column=col, sticky="nsew", padx=5, pady=5)
 
 # Additional operator buttons
@@ -302,12 +404,7 @@ extra_buttons = [
 ]
 
 for text, row, col in extra_buttons:
-<<<<<<< HEAD
-    btn = tk.Button(root, text=text, font=button_font,
-                    command=lambda val=text: append_to_expression(val))
-=======
     btn = tk.Button(root, text=text, font=button_font, command=lambda val=text: append_to_expression(val))
->>>>>>> develop
     btn.grid(row=row, column=col, sticky="nsew", padx=5, pady=5)
 
 # Trigonometric function buttons
@@ -317,27 +414,22 @@ trig_buttons = [
 ]
 
 for text, row, col in trig_buttons:
-<<<<<<< HEAD
-    btn = tk.Button(root, text=text, font=button_font,
-                    command=lambda val=text: append_to_expression(val + "("))
-=======
     btn = tk.Button(root, text=text, font=button_font, command=lambda val=text: append_to_expression(val + "("))
->>>>>>> develop
     btn.grid(row=row, column=col, sticky="nsew", padx=5, pady=5)
 
-# Enlarged Clear and Show Logs buttons
+# Enlarged Clear button, Plot and Show Logs buttons
 btn_clear = tk.Button(root, text="Clear", font=button_font, command=clear_expression)
 btn_clear.grid(row=8, column=0, columnspan=2, sticky="nsew", padx=5, pady=5)
 
+# Plots the displayed expression as a function of x
+btn_plot = tk.Button(root, text="Plot", font=button_font, command=lambda: show_plot(display.get()))
+btn_plot.grid(row=8, column=2, sticky="nsew", padx=5, pady=5)
+
 btn_show_logs = tk.Button(root, text="Show Logs", font=button_font, command=show_logs)
-btn_show_logs.grid(row=8, column=2, columnspan=2, sticky="nsew", padx=5, pady=5)
+btn_show_logs.grid(row=8, column=3, sticky="nsew", padx=5, pady=5)
 
 # Bind the resize event to adjust font size
 root.bind("<Configure>", adjust_font)
 
 # Run the main loop
-<<<<<<< HEAD
-root.mainloop()
-=======
 root.mainloop()
->>>>>>> develop
@@ -0,0 +1,65 @@
+import json
+import metrics
+from time import perf_counter
+from config import get_config
+from db_log import log_operation
+
+# Load configuration
+config = get_config()
+
+# Whether evaluations write a record to the log database
+logging_enabled = config.get("log_evaluations", True)
+# Whether evaluation records embed the trace of the function calls made
+trace_enabled = config.get("log_trace", False)
+
+def apply_config(values, old_values):
+    """
+    Applies logging settings changed in the configuration file. Settings that didn't
+    change in the file keep any value set with set_logging_enabled or set_trace_enabled.
+    """
+    global logging_enabled, trace_enabled
+    if values.get("log_evaluations") != old_values.get("log_evaluations"):
+        logging_enabled = values.get("log_evaluations", True)
+    if values.get("log_trace") != old_values.get("log_trace"):
+        trace_enabled = values.get("log_trace", False)
+
+config.subscribe(apply_config)
+
+def set_logging_enabled(enabled):
+    """
+    Enables or disables the log records written by evaluations, e.g. for library use.
+    """
+    global logging_enabled
+    logging_enabled = enabled
+
+def set_trace_enabled(enabled):
+    """
+    Enables or disables embedding the function call trace in evaluation records.
+    """
+    global trace_enabled
+    trace_enabled = enabled
+
+def new_trace():
+    """
+    Returns an empty trace to pass to CompiledExpression.evaluate if tracing is enabled,
+    otherwise None.
+    """
+    return [] if logging_enabled and trace_enabled else None
+
+def record(operator, expression, result, trace=None):
+    """
+    Writes one structured log record, unless logging is disabled.
+    :param operator: The operation type (e.g., "Expression Evaluation")
+    :param expression: The full mathematical expression
+    :param result: The result of the operation, or the error message
+    :param trace: Optional list of function calls, stored as JSON in the details column
+    """
+    if not logging_enabled:
+        return
+    timed = metrics.enabled
+    if timed:
+        start = perf_counter()
+    details = json.dumps({"trace": trace}, default=str) if trace else None
+    log_operation(operator, expression, result, details)
+    if timed:
+        metrics.stage("log_write", start)
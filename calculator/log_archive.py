@@ -0,0 +1,332 @@
+import atexit
+import glob
+import gzip
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+from datetime import datetime, timedelta, timezone
+import db_log
+
+# Number of rows moved to the archive per transaction
+ARCHIVE_BATCH_SIZE = 5000
+
+# Partition files are named after the month of the rows they contain
+PARTITION_PREFIX = "operation_logs_"
+
+# Decompressed copies of compressed partitions: path -> (modification time, copy path).
+# The copies live in a temporary directory removed when the process exits.
+_decompressed = {}
+_decompressed_lock = threading.Lock()
+_temp_dir = None
+
+
+def archive_dir():
+    """
+    Returns the archive directory, resolved relative to the live database file.
+    """
+    return os.path.join(os.path.dirname(os.path.abspath(db_log.DB_FILE)), db_log.config["log_archive_dir"])
+
+
+def partition_path(month):
+    """
+    Returns the path of the uncompressed archive database for a month ('YYYY_MM').
+    """
+    return os.path.join(archive_dir(), f"{PARTITION_PREFIX}{month}.db")
+
+
+def list_partitions():
+    """
+    Returns (month, path) pairs of all archive partitions in chronological order.
+    Compressed partitions have a path ending in '.db.gz'.
+    """
+    partitions = {}
+    for path in glob.glob(os.path.join(archive_dir(), f"{PARTITION_PREFIX}*.db*")):
+        name = os.path.basename(path)
+        if not (name.endswith(".db") or name.endswith(".db.gz")):
+            continue
+        month = name[len(PARTITION_PREFIX):].split(".")[0]
+        # Prefer the uncompressed file if a partition was reopened for writing
+        if month not in partitions or path.endswith(".db"):
+            partitions[month] = path
+    return sorted(partitions.items())
+
+
+def open_partition(month):
+    """
+    Opens the archive database of a month for writing, decompressing it first if needed.
+    """
+    path = partition_path(month)
+    if os.path.exists(path + ".gz") and not os.path.exists(path):
+        with gzip.open(path + ".gz", "rb") as source, open(path, "wb") as target:
+            shutil.copyfileobj(source, target)
+        os.remove(path + ".gz")
+    connection = sqlite3.connect(path)
+    connection.execute("""
+        CREATE TABLE IF NOT EXISTS operation_logs (
+            id INTEGER PRIMARY KEY,
+            operator TEXT NOT NULL,
+            expression TEXT NOT NULL,
+            result TEXT NOT NULL,
+            timestamp DATETIME,
+            details TEXT
+        )
+    """)
+    if "details" not in [row[1] for row in connection.execute("PRAGMA table_info(operation_logs)")]:
+        connection.execute("ALTER TABLE operation_logs ADD COLUMN details TEXT")
+    connection.execute("CREATE INDEX IF NOT EXISTS idx_operation_logs_timestamp ON operation_logs (timestamp)")
+    connection.execute("CREATE INDEX IF NOT EXISTS idx_operation_logs_operator ON operation_logs (operator)")
+    return connection
+
+
+def compress_partition(month):
+    """
+    Replaces the archive database of a month with a gzip-compressed copy.
+    """
+    path = partition_path(month)
+    if not os.path.exists(path):
+        return
+    with open(path, "rb") as source, gzip.open(path + ".gz", "wb") as target:
+        shutil.copyfileobj(source, target)
+    os.remove(path)
+
+
+def readable_path(path):
+    """
+    Returns a path SQLite can open for a partition, decompressing '.gz' files into a
+    temporary directory once per file version. The copy of an older version is removed.
+    """
+    global _temp_dir
+    if not path.endswith(".gz"):
+        return path
+    mtime = os.stat(path).st_mtime_ns
+    with _decompressed_lock:
+        cached = _decompressed.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        if _temp_dir is None:
+            _temp_dir = tempfile.mkdtemp(prefix="calculator_archive_")
+            atexit.register(shutil.rmtree, _temp_dir, ignore_errors=True)
+        if cached is not None:
+            try:
+                os.remove(cached[1])
+            except OSError:
+                pass  # Still open on Windows; removed with the directory at exit
+        target = os.path.join(_temp_dir, f"{mtime}_{os.path.basename(path)[:-3]}")
+        with gzip.open(path, "rb") as source, open(target, "wb") as copy:
+            shutil.copyfileobj(source, copy)
+        _decompressed[path] = (mtime, target)
+        return target
+
+
+def archive_rows(condition, parameters):
+    """
+    Moves the live rows matching a SQL condition into the monthly partitions, in batches.
+    Rows are committed to the archive before they are deleted from the live table, and
+    archive inserts ignore existing IDs, so an interrupted run can simply be repeated.
+    A live row is only deleted once the archive holds an identical copy; a row whose ID is
+    taken by a different archived row stays in the live table.
+    :return: The number of archived rows.
+    """
+    connection = db_log.connect_db()
+    moved = 0
+    last_id = None
+    while True:
+        rows = connection.execute(
+            f"SELECT {db_log.LOG_COLUMNS}, details FROM operation_logs WHERE {condition} AND id > ? "
+            f"ORDER BY id LIMIT ?",
+            (*parameters, last_id if last_id is not None else -1, ARCHIVE_BATCH_SIZE)
+        ).fetchall()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+
+        by_month = {}
+        for row in rows:
+            month = (row[4] or "0000-00")[:7].replace("-", "_")
+            by_month.setdefault(month, []).append(row)
+        archived = []
+        for month, month_rows in by_month.items():
+            partition = open_partition(month)
+            try:
+                with partition:
+                    partition.executemany(
+                        f"INSERT OR IGNORE INTO operation_logs ({db_log.LOG_COLUMNS}, details) VALUES (?, ?, ?, ?, ?, ?)",
+                        month_rows
+                    )
+                stored = set(partition.execute(
+                    f"SELECT {db_log.LOG_COLUMNS}, details FROM operation_logs WHERE id BETWEEN ? AND ?",
+                    (month_rows[0][0], month_rows[-1][0])
+                ))
+            finally:
+                partition.close()
+            archived.extend(row[0] for row in month_rows if row in stored)
+
+        conflicts = len(rows) - len(archived)
+        if conflicts:
+            print(f"Error archiving logs: {conflicts} IDs are already used in the archive, keeping those rows.")
+        with connection:
+            connection.executemany("DELETE FROM operation_logs WHERE id = ?", [(log_id,) for log_id in archived])
+            db_log.record_deletion(connection)
+        moved += len(archived)
+
+    return moved
+
+
+def has_partitions():
+    """
+    Returns whether any logs have been archived, in which case their IDs must not be reused.
+    """
+    return len(list_partitions()) > 0
+
+
+def compress_closed_partitions():
+    """
+    Compresses the uncompressed partitions of past months. The current month stays
+    uncompressed since it still receives rows.
+    """
+    current_month = datetime.now(timezone.utc).strftime("%Y_%m")
+    for month, path in list_partitions():
+        if month < current_month and path.endswith(".db"):
+            compress_partition(month)
+
+
+def used_bytes(connection):
+    """
+    Returns the number of bytes of the database file occupied by live pages.
+    """
+    page_size = connection.execute("PRAGMA page_size").fetchone()[0]
+    page_count = connection.execute("PRAGMA page_count").fetchone()[0]
+    free_pages = connection.execute("PRAGMA freelist_count").fetchone()[0]
+    return (page_count - free_pages) * page_size
+
+
+def enforce_retention(max_age_days=None, max_rows=None, max_file_mb=None):
+    """
+    Moves logs that exceed the retention policy from the live table into the archive.
+    Arguments default to the log_retention_* configuration keys; None disables a limit.
+    Pages freed in the live database are reused by new logs, so its size stays bounded.
+    :return: The number of archived rows.
+    """
+    config = db_log.config
+    max_age_days = max_age_days if max_age_days is not None else config["log_retention_max_age_days"]
+    max_rows = max_rows if max_rows is not None else config["log_retention_max_rows"]
+    max_file_mb = max_file_mb if max_file_mb is not None else config["log_retention_max_file_mb"]
+
+    db_log.flush()
+    connection = db_log.connect_db()
+    os.makedirs(archive_dir(), exist_ok=True)
+    moved = 0
+
+    if max_age_days is not None:
+        cutoff = datetime.now(timezone.utc) - timedelta(days=max_age_days)
+        moved += archive_rows("timestamp < ?", (cutoff.strftime("%Y-%m-%d %H:%M:%S"),))
+
+    if max_rows is not None:
+        count = connection.execute("SELECT COUNT(*) FROM operation_logs").fetchone()[0]
+        if count > max_rows:
+            # The newest row beyond the limit; it and all older rows are archived
+            row = connection.execute("SELECT id FROM operation_logs ORDER BY id DESC LIMIT 1 OFFSET ?",
+                                     (max_rows,)).fetchone()
+            moved += archive_rows("id <= ?", (row[0],))
+
+    if max_file_mb is not None:
+        limit = max_file_mb * 1024 * 1024
+        used = used_bytes(connection)
+        if used > limit:
+            count = connection.execute("SELECT COUNT(*) FROM operation_logs").fetchone()[0]
+            # Archive the oldest share of rows proportional to the excess, plus a margin
+            excess = min(count, int(count * (1 - limit / used) * 1.1) + 1)
+            row = connection.execute("SELECT id FROM operation_logs ORDER BY id LIMIT 1 OFFSET ?",
+                                     (excess - 1,)).fetchone()
+            if row is not None:
+                moved += archive_rows("id <= ?", (row[0],))
+
+    if config["log_archive_compress"]:
+        compress_closed_partitions()
+    return moved
+
+
+def iter_archived_logs(chunk_size=1000, filters=None, columns=db_log.LOG_COLUMNS):
+    """
+    Streams the archived logs, oldest partition first, with the same columns and
+    filters as db_log.iter_logs.
+    """
+    conditions, parameters = db_log.build_filters(filters)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    for month, path in list_partitions():
+        connection = sqlite3.connect(readable_path(path))
+        try:
+            cursor = connection.execute(
+                f"SELECT {columns} FROM operation_logs {where} ORDER BY id", parameters
+            )
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield from rows
+        finally:
+            connection.close()
+
+
+def fetch_archived_page(after_id=None, limit=100, filters=None, newest_first=False):
+    """
+    Fetches up to limit archived logs after after_id from every partition, merged in id
+    order. Used by db_log.fetch_logs_page to page across live and archived logs.
+    """
+    conditions, parameters = db_log.build_filters(filters)
+    if after_id is not None:
+        conditions.append("id < ?" if newest_first else "id > ?")
+        parameters.append(after_id)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    order = "DESC" if newest_first else "ASC"
+    rows = []
+    for month, path in list_partitions():
+        connection = sqlite3.connect(readable_path(path))
+        try:
+            rows.extend(connection.execute(
+                f"SELECT {db_log.LOG_COLUMNS} FROM operation_logs {where} ORDER BY id {order} LIMIT ?",
+                (*parameters, limit)
+            ))
+        finally:
+            connection.close()
+    rows.sort(key=lambda row: row[0], reverse=newest_first)
+    return rows[:limit]
+
+
+# Background thread enforcing the retention policy, see start_retention_worker
+_worker = None
+_worker_stop = threading.Event()
+
+def start_retention_worker(interval=None):
+    """
+    Starts a daemon thread that calls enforce_retention every interval seconds.
+    :param interval: Seconds between runs, defaults to log_retention_interval.
+    """
+    global _worker
+    if _worker is not None and _worker.is_alive():
+        return _worker
+    interval = interval if interval is not None else db_log.config["log_retention_interval"]
+    _worker_stop.clear()
+
+    def run():
+        while not _worker_stop.is_set():
+            try:
+                enforce_retention()
+            except Exception as e:
+                print(f"Error enforcing log retention: {e}")
+            _worker_stop.wait(interval)
+        db_log.close_db()
+
+    _worker = threading.Thread(target=run, name="log-retention", daemon=True)
+    _worker.start()
+    return _worker
+
+def stop_retention_worker():
+    """
+    Stops the retention thread after its current run.
+    """
+    _worker_stop.set()
+    if _worker is not None:
+        _worker.join()
@@ -0,0 +1,231 @@
+import argparse
+import csv
+import json
+import os
+import sys
+from itertools import islice
+import db_log
+
+# Columns written by export_logs and read by import_logs, in order
+EXPORT_COLUMNS = ["id", "operator", "expression", "result", "timestamp", "details"]
+
+# Output format by file extension
+FORMATS = {
+    ".csv": "csv",
+    ".jsonl": "jsonl",
+    ".ndjson": "jsonl",
+    ".parquet": "parquet",
+    ".arrow": "arrow",
+    ".feather": "arrow",
+}
+
+# Rows read, converted and written at a time; memory use is proportional to it
+CHUNK_SIZE = 50000
+
+
+def detect_format(path, format=None):
+    """
+    Returns the explicitly given format, or the one implied by the file extension.
+    """
+    if format is not None:
+        if format not in FORMATS.values():
+            raise ValueError(f"Unknown format '{format}'. Must be csv, jsonl, parquet or arrow.")
+        return format
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in FORMATS:
+        raise ValueError(f"Cannot tell the format of '{path}', pass it explicitly.")
+    return FORMATS[extension]
+
+
+def iter_chunks(rows, chunk_size):
+    rows = iter(rows)
+    return iter(lambda: list(islice(rows, chunk_size)), [])
+
+
+def import_pyarrow():
+    """
+    Imports pyarrow, which is only needed for the columnar formats.
+    """
+    try:
+        import pyarrow
+        return pyarrow
+    except ImportError:
+        raise ValueError("The parquet and arrow formats require pyarrow (pip install pyarrow).")
+
+
+def arrow_schema(pa):
+    return pa.schema([
+        ("id", pa.int64()),
+        ("operator", pa.string()),
+        ("expression", pa.string()),
+        ("result", pa.string()),
+        ("timestamp", pa.timestamp("s")),
+        ("details", pa.string()),
+    ])
+
+
+def arrow_batch(pa, schema, rows):
+    """
+    Converts a chunk of rows to a RecordBatch, column by column.
+    """
+    columns = list(zip(*rows))
+    arrays = []
+    for index, field in enumerate(schema):
+        if field.name == "timestamp":
+            # SQLite stores 'YYYY-MM-DD HH:MM:SS' text, which Arrow parses when casting
+            arrays.append(pa.array(columns[index], pa.string()).cast(field.type))
+        else:
+            arrays.append(pa.array(columns[index], field.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def export_logs(path, format=None, filters=None, include_archived=False, chunk_size=CHUNK_SIZE):
+    """
+    Streams the operation logs into a file, one chunk of rows at a time, so memory use
+    stays constant however many logs there are.
+    :param path: The output file; '-' writes csv or jsonl to stdout.
+    :param format: "csv", "jsonl", "parquet" (one row group per chunk) or "arrow"
+        (Arrow IPC file); defaults to the format implied by the extension.
+    :param filters: Optional filter dictionary with operator, since and until, see db_log.build_filters.
+    :param include_archived: Also export the logs moved to the archive.
+    :return: The number of exported rows.
+    """
+    format = detect_format(path, format) if path != "-" else (format or "jsonl")
+    db_log.flush()
+    rows = db_log.iter_logs(chunk_size, filters, include_archived, db_log.LOG_COLUMNS + ", details")
+    count = 0
+
+    if format in ("parquet", "arrow"):
+        pa = import_pyarrow()
+        schema = arrow_schema(pa)
+        if format == "parquet":
+            import pyarrow.parquet
+            writer = pyarrow.parquet.ParquetWriter(path, schema, compression="zstd")
+            write = writer.write_batch
+        else:
+            import pyarrow.ipc
+            writer = pyarrow.ipc.new_file(path, schema)
+            write = writer.write_batch
+        try:
+            for chunk in iter_chunks(rows, chunk_size):
+                write(arrow_batch(pa, schema, chunk))
+                count += len(chunk)
+        finally:
+            writer.close()
+        return count
+
+    file = sys.stdout if path == "-" else open(path, "w", encoding="utf-8", newline="")
+    try:
+        if format == "csv":
+            writer = csv.writer(file)
+            writer.writerow(EXPORT_COLUMNS)
+            for chunk in iter_chunks(rows, chunk_size):
+                writer.writerows(chunk)
+                count += len(chunk)
+        else:
+            for chunk in iter_chunks(rows, chunk_size):
+                file.writelines(json.dumps(dict(zip(EXPORT_COLUMNS, row))) + "\n" for row in chunk)
+                count += len(chunk)
+    finally:
+        if file is not sys.stdout:
+            file.close()
+    return count
+
+
+def read_rows(path, format, chunk_size):
+    """
+    Yields the rows of an exported file as (id, operator, expression, result, timestamp, details) tuples.
+    """
+    if format in ("parquet", "arrow"):
+        pa = import_pyarrow()
+        if format == "parquet":
+            import pyarrow.parquet
+            batches = pyarrow.parquet.ParquetFile(path).iter_batches(batch_size=chunk_size, columns=EXPORT_COLUMNS)
+        else:
+            import pyarrow.ipc
+            reader = pyarrow.ipc.open_file(path)
+            batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+        for batch in batches:
+            batch = batch.select(EXPORT_COLUMNS)
+            # Parquet may store the timestamps in milliseconds, which would print fractions
+            timestamps = batch.column("timestamp").cast(pa.timestamp("s")).cast(pa.string())
+            columns = [batch.column(name).to_pylist() for name in EXPORT_COLUMNS]
+            columns[4] = timestamps.to_pylist()
+            yield from zip(*columns)
+        return
+
+    with open(path, "r", encoding="utf-8", newline="") as file:
+        if format == "csv":
+            reader = csv.reader(file)
+            header = next(reader, None)
+            if header != EXPORT_COLUMNS:
+                raise ValueError(f"Unexpected CSV header {header}, expected {EXPORT_COLUMNS}.")
+            for row in reader:
+                # CSV has no NULL: empty ids and details were NULL when exported
+                yield (int(row[0]) if row[0] else None, row[1], row[2], row[3], row[4] or None, row[5] or None)
+        else:
+            for line in file:
+                if line.strip():
+                    record = json.loads(line)
+                    yield tuple(record.get(column) for column in EXPORT_COLUMNS)
+
+
+def import_logs(path, format=None, keep_ids=True, chunk_size=CHUNK_SIZE):
+    """
+    Loads an exported file back into the operation logs with batched inserts in a single
+    transaction: either all rows are imported or, on an error, none.
+    :param keep_ids: Keep the exported ids, skipping rows whose id already exists, so that
+        importing the same file twice is harmless. With False the rows get new ids.
+    :return: The number of rows inserted.
+    """
+    format = detect_format(path, format)
+    db_log.flush()
+    connection = db_log.connect_db()
+    if keep_ids:
+        statement = f"INSERT OR IGNORE INTO operation_logs ({', '.join(EXPORT_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?)"
+    else:
+        statement = f"INSERT INTO operation_logs ({', '.join(EXPORT_COLUMNS[1:])}) VALUES (?, ?, ?, ?, ?)"
+
+    count = 0
+    with connection:
+        for chunk in iter_chunks(read_rows(path, format, chunk_size), chunk_size):
+            if not keep_ids:
+                chunk = [row[1:] for row in chunk]
+            count += connection.executemany(statement, chunk).rowcount
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export or import the operation logs in bulk.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = commands.add_parser("export", help="Write the logs to a file.")
+    export_parser.add_argument("path", help="Output file; the extension selects the format, '-' writes stdout.")
+    export_parser.add_argument("--format", choices=["csv", "jsonl", "parquet", "arrow"])
+    export_parser.add_argument("--operator", help="Only export logs of this operator.")
+    export_parser.add_argument("--since", help="Only export logs at or after this time ('YYYY-MM-DD HH:MM:SS').")
+    export_parser.add_argument("--until", help="Only export logs before this time.")
+    export_parser.add_argument("--include-archived", action="store_true", help="Also export archived logs.")
+
+    import_parser = commands.add_parser("import", help="Load logs from an exported file.")
+    import_parser.add_argument("path", help="Input file; the extension selects the format.")
+    import_parser.add_argument("--format", choices=["csv", "jsonl", "parquet", "arrow"])
+    import_parser.add_argument("--new-ids", action="store_true", help="Give the imported rows new ids.")
+
+    args = parser.parse_args(argv)
+    try:
+        if args.command == "export":
+            filters = {"operator": args.operator, "since": args.since, "until": args.until}
+            count = export_logs(args.path, args.format, filters, args.include_archived)
+            print(f"Exported {count} logs.", file=sys.stderr)
+        else:
+            count = import_logs(args.path, args.format, not args.new_ids)
+            print(f"Imported {count} logs.", file=sys.stderr)
+    except (ValueError, OSError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
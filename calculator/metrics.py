@@ -0,0 +1,265 @@
+import json
+import math
+from math import frexp
+import threading
+from time import perf_counter
+from config import get_config
+
+# Load configuration
+config = get_config()
+
+# Whether timings and counters are recorded. Callers check this flag before reading the
+# clock, so disabled metrics cost one attribute lookup per measuring point.
+enabled = config.get("metrics_enabled", False)
+
+def apply_config(values, old_values):
+    """
+    Applies the metrics_enabled setting if it changed in the configuration file.
+    """
+    global enabled
+    if values.get("metrics_enabled") != old_values.get("metrics_enabled"):
+        enabled = values.get("metrics_enabled", False)
+
+config.subscribe(apply_config)
+
+def set_enabled(flag):
+    """
+    Enables or disables the recording of metrics.
+    """
+    global enabled
+    enabled = flag
+
+# Prefix of the metric names in the Prometheus text format
+PREFIX = "calculator_"
+
+# Upper bound of the first histogram bucket in seconds; each further bucket doubles it
+BUCKET_BASE = 1e-6
+BUCKET_COUNT = 32
+SCALE = 1 / BUCKET_BASE
+
+
+class Histogram:
+    """
+    A histogram of durations with logarithmic buckets: bucket i counts the values below
+    BUCKET_BASE * 2**i, the last bucket everything above. Observing a value is a frexp
+    call and a few increments, cheap enough for the evaluation hot path.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def observe(self, value):
+        """
+        Records one value in seconds.
+        """
+        index = frexp(value * SCALE)[1] if value > BUCKET_BASE else 0
+        with self._lock:
+            self.counts[index if index < BUCKET_COUNT else BUCKET_COUNT - 1] += 1
+            self.count += 1
+            self.sum += value
+            if value > self.max:
+                self.max = value
+            if value < self.min:
+                self.min = value
+
+    def reset(self):
+        with self._lock:
+            self.counts = [0] * BUCKET_COUNT
+            self.count = 0
+            self.sum = 0.0
+            self.min = math.inf
+            self.max = 0.0
+
+    def snapshot(self):
+        with self._lock:
+            counts = list(self.counts)
+            count, total, low, high = self.count, self.sum, self.min, self.max
+        return {
+            "count": count,
+            "sum": total,
+            "min": low if count else None,
+            "max": high if count else None,
+            "mean": total / count if count else None,
+            "p50": quantile(counts, count, high, 0.5),
+            "p90": quantile(counts, count, high, 0.9),
+            "p99": quantile(counts, count, high, 0.99),
+            "buckets": {f"{BUCKET_BASE * 2 ** index:g}": n for index, n in enumerate(counts) if n}
+        }
+
+
+def quantile(counts, count, high, q):
+    """
+    Estimates a quantile from histogram bucket counts as the upper bound of the bucket
+    that contains it, capped at the largest value observed.
+    """
+    if not count:
+        return None
+    rank = q * count
+    seen = 0
+    for index, n in enumerate(counts):
+        seen += n
+        if n and seen >= rank:
+            return min(BUCKET_BASE * 2 ** index, high)
+    return high
+
+
+class Counter:
+    """
+    A monotonically increasing count.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0
+
+    def increment(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def reset(self):
+        with self._lock:
+            self.value = 0
+
+
+# Registered metrics keyed by (name, sorted label pairs)
+_histograms = {}
+_counters = {}
+_registry_lock = threading.Lock()
+
+# Functions returning {name: value} gauges that are read when a snapshot is taken
+_collectors = []
+
+def histogram(name, **labels):
+    """
+    Returns the histogram with the given name and labels, creating it on first use.
+    Hot paths should keep the returned object instead of looking it up per call.
+    """
+    key = (name, tuple(sorted(labels.items())))
+    metric = _histograms.get(key)
+    if metric is None:
+        with _registry_lock:
+            metric = _histograms.setdefault(key, Histogram())
+    return metric
+
+def counter(name, **labels):
+    """
+    Returns the counter with the given name and labels, creating it on first use.
+    """
+    key = (name, tuple(sorted(labels.items())))
+    metric = _counters.get(key)
+    if metric is None:
+        with _registry_lock:
+            metric = _counters.setdefault(key, Counter())
+    return metric
+
+def register_collector(collector):
+    """
+    Registers a function returning a {name: number} dictionary of current values
+    (cache sizes, queue lengths, ...) included in every snapshot.
+    """
+    _collectors.append(collector)
+
+def observe(name, start, **labels):
+    """
+    Records the time elapsed since start (a perf_counter value) in a histogram.
+    :return: The current perf_counter value, to be used as the start of the next measurement.
+    """
+    now = perf_counter()
+    histogram(name, **labels).observe(now - start)
+    return now
+
+def increment(name, amount=1, **labels):
+    counter(name, **labels).increment(amount)
+
+# Durations of the stages of evaluate_expression
+STAGES = ("cache_lookup", "compile", "validate", "execute", "precision", "log_write")
+_stage_histograms = {stage: histogram("evaluation_stage_seconds", stage=stage) for stage in STAGES}
+
+def stage(name, start):
+    """
+    Records the time since start under an evaluation stage.
+    :return: The current perf_counter value, the start of the next stage.
+    """
+    now = perf_counter()
+    _stage_histograms[name].observe(now - start)
+    return now
+
+def reset():
+    """
+    Sets all counters and histograms back to zero.
+    """
+    for metric in list(_histograms.values()) + list(_counters.values()):
+        metric.reset()
+
+def format_labels(labels):
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}" if labels else ""
+
+def collect_gauges():
+    """
+    Calls the registered collectors and merges their values.
+    """
+    gauges = {}
+    for collector in _collectors:
+        try:
+            gauges.update(collector())
+        except Exception as e:
+            print(f"Error collecting metrics: {e}")
+    return gauges
+
+def snapshot():
+    """
+    Returns the current value of every metric as a dictionary that can be serialized to JSON.
+    """
+    gauges = collect_gauges()
+    return {
+        "enabled": enabled,
+        "counters": {name + format_labels(labels): metric.value
+                     for (name, labels), metric in sorted(_counters.items())},
+        "histograms": {name + format_labels(labels): metric.snapshot()
+                       for (name, labels), metric in sorted(_histograms.items()) if metric.count},
+        "gauges": gauges
+    }
+
+def to_json(indent=2):
+    """
+    Returns the snapshot as JSON text.
+    """
+    return json.dumps(snapshot(), indent=indent)
+
+def to_prometheus():
+    """
+    Returns all metrics in the Prometheus text exposition format.
+    """
+    lines = []
+    typed = set()
+
+    def declare(name, kind):
+        if name not in typed:
+            typed.add(name)
+            lines.append(f"# TYPE {PREFIX}{name} {kind}")
+
+    for (name, labels), metric in sorted(_counters.items()):
+        declare(name, "counter")
+        lines.append(f"{PREFIX}{name}{format_labels(labels)} {metric.value}")
+
+    for (name, labels), metric in sorted(_histograms.items()):
+        with metric._lock:
+            counts = list(metric.counts)
+            count, total = metric.count, metric.sum
+        if not count:
+            continue
+        declare(name, "histogram")
+        cumulative = 0
+        for index, n in enumerate(counts[:-1]):
+            cumulative += n
+            bound = format_labels(labels + (("le", f"{BUCKET_BASE * 2 ** index:g}"),))
+            lines.append(f"{PREFIX}{name}_bucket{bound} {cumulative}")
+        lines.append(f"{PREFIX}{name}_bucket{format_labels(labels + (('le', '+Inf'),))} {count}")
+        lines.append(f"{PREFIX}{name}_sum{format_labels(labels)} {total}")
+        lines.append(f"{PREFIX}{name}_count{format_labels(labels)} {count}")
+
+    for name, value in sorted(collect_gauges().items()):
+        declare(name, "gauge")
+        lines.append(f"{PREFIX}{name} {value}")
+    return "\n".join(lines) + "\n"
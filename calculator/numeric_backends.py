@@ -0,0 +1,256 @@
+import math
+import basic_operators
+import complex_operators
+import trigonometry
+from config import get_config
+from expression_parser import PUSH, UNARY, BINARY, CALL, CompiledExpression
+
+# Load configuration
+config = get_config()
+
+# The decimal module and the Fraction type, imported when their backend is first used,
+# see load_decimal_backend and load_fraction_backend
+decimal = None
+Fraction = None
+
+# Context of the decimal backend: digits kept by every Decimal operation
+decimal_context = None
+
+def apply_config(values, old_values):
+    """
+    Picks up the decimal precision and default backend after the configuration is reloaded.
+    """
+    global decimal_context, default_backend
+    if decimal is not None:
+        decimal_context = decimal.Context(prec=values.get("decimal_precision", 28))
+    default_backend = BACKENDS.get(values.get("numeric_backend", "float"))
+
+config.subscribe(apply_config)
+
+
+class NumericBackend:
+    """
+    A number type expressions can be evaluated with. A backend converts the literals and
+    variables of an expression and replaces the operator functions that need a
+    type-specific implementation; all other functions are used as they are.
+    """
+
+    def __init__(self, name, convert=None, functions=None, rounding=None):
+        """
+        :param name: The name used to select the backend.
+        :param convert: Function turning a literal's text or a variable's value into the
+            backend's number type, None to keep the values of the parser.
+        :param functions: Mapping of scalar operator functions to their replacements.
+        :param rounding: Function rounding a result to a number of decimal places, None
+            for the built-in round.
+        """
+        self.name = name
+        self.convert = convert
+        self.functions = functions or {}
+        self.rounding = rounding or round
+
+    def specialize(self, compiled):
+        """
+        Returns a copy of an unoptimized CompiledExpression that computes with this backend.
+        Constants must be converted before they are folded, so optimize afterwards.
+        """
+        if self.convert is None and not self.functions:
+            return compiled
+        instructions = []
+        for opcode, argument, name in compiled.instructions:
+            if opcode == PUSH and self.convert is not None:
+                # The parser keeps the text of literals, so 0.1 stays exactly 0.1
+                argument = self.convert(name if name is not None else argument)
+            elif opcode in (UNARY, BINARY, CALL):
+                argument = self.functions.get(argument, argument)
+            instructions.append((opcode, argument, name))
+        return CompiledExpression(compiled.source, instructions, compiled.variables, compiled.temps)
+
+    def convert_variables(self, variables):
+        """
+        Converts the values of a variables mapping to the backend's number type.
+        """
+        if self.convert is None or not variables:
+            return variables
+        return {name: self.convert(value) for name, value in variables.items()}
+
+    def round(self, value, digits):
+        """
+        Rounds a result to the given number of decimal places.
+        """
+        return self.rounding(value, digits)
+
+    def __repr__(self):
+        return f"NumericBackend({self.name!r})"
+
+
+# Decimal backend: arithmetic is done in decimal_context, functions without a Decimal
+# implementation (trigonometry) are computed as floats and converted back.
+def to_decimal(value):
+    if isinstance(value, float):
+        return decimal.Decimal(repr(value))
+    return decimal.Decimal(value)
+
+def decimal_add(a, b):
+    return decimal_context.add(a, b)
+
+def decimal_subtract(a, b):
+    return decimal_context.subtract(a, b)
+
+def decimal_multiply(a, b):
+    return decimal_context.multiply(a, b)
+
+def decimal_divide(a, b):
+    if b == 0:
+        raise ZeroDivisionError("Division by zero is not allowed.")
+    return decimal_context.divide(a, b)
+
+def decimal_negate(a):
+    return decimal_context.minus(a)
+
+def decimal_exponent(base, power):
+    complex_operators.check_exponent(base, power)
+    return decimal_context.power(base, power)
+
+def decimal_logarithm(value, base=None):
+    complex_operators.check_logarithm(value, base if base is not None else math.e)
+    if base is None:
+        return decimal_context.ln(value)
+    if base == 10:
+        return decimal_context.log10(value)
+    return decimal_context.divide(decimal_context.ln(value), decimal_context.ln(base))
+
+def decimal_round(value, digits):
+    """
+    Rounds a Decimal to digits decimal places. round() would work in the default context
+    of 28 digits and fail for results of 1e23 and more, so the precision is chosen to fit
+    the integer digits of the value. Values with more integer digits than decimal_context
+    keeps have no fractional digits and are returned as they are.
+    """
+    if not value.is_finite() or value.adjusted() >= decimal_context.prec:
+        return value
+    # One more digit in case rounding carries into a new leading digit
+    context = decimal.Context(prec=max(value.adjusted() + 2 + digits, 1))
+    return value.quantize(decimal.Decimal(1).scaleb(-digits), context=context)
+
+def via_float(function):
+    """
+    Wraps a float function so that it takes and returns Decimals.
+    """
+    def call(*arguments):
+        return to_decimal(function(*(float(argument) for argument in arguments)))
+    call.__name__ = function.__name__
+    return call
+
+# Fraction backend: + - * / are exact with the plain operators; integer powers stay exact,
+# the other functions have irrational results and return floats.
+def to_fraction(value):
+    if isinstance(value, float):
+        return Fraction(repr(value))
+    return Fraction(value)
+
+# Largest exact power the fraction backend computes, in bits of its numerator or
+# denominator: exact powers grow without bound and would hang the evaluation. Python
+# refuses to print integers over 4300 digits (about 14300 bits) anyway.
+FRACTION_MAX_BITS = 14000
+
+def fraction_exponent(base, power):
+    complex_operators.check_exponent(base, power)
+    if isinstance(power, Fraction) and power.denominator == 1:
+        if isinstance(base, (int, Fraction)):
+            bits = max(base.numerator.bit_length(), base.denominator.bit_length())
+            if bits > 1 and abs(power.numerator) * (bits - 1) > FRACTION_MAX_BITS:
+                raise ValueError("Result is too large for the fraction backend.")
+        return base ** power.numerator
+    return math.pow(base, power)
+
+
+def load_decimal_backend():
+    """
+    Imports decimal and registers the decimal backend.
+    """
+    global decimal, decimal_context
+    import decimal
+    decimal_context = decimal.Context(prec=config.get("decimal_precision", 28))
+    register_backend(NumericBackend("decimal", to_decimal, {
+        basic_operators.add: decimal_add,
+        basic_operators.subtract: decimal_subtract,
+        basic_operators.multiply: decimal_multiply,
+        basic_operators.divide: decimal_divide,
+        basic_operators.negate: decimal_negate,
+        complex_operators.exponent: decimal_exponent,
+        complex_operators.logarithm: decimal_logarithm,
+        **{function: via_float(function) for function in (
+            trigonometry.sin, trigonometry.cos, trigonometry.tan, trigonometry.cot,
+            trigonometry.arcsin, trigonometry.arccos, trigonometry.arctan, trigonometry.arccot
+        )}
+    }, decimal_round))
+
+def load_fraction_backend():
+    """
+    Imports fractions and registers the fraction backend.
+    """
+    global Fraction
+    from fractions import Fraction
+    register_backend(NumericBackend("fraction", to_fraction, {
+        complex_operators.exponent: fraction_exponent
+    }))
+
+
+FLOAT = NumericBackend("float")
+
+# Backends selectable by name, see get_backend
+BACKENDS = {FLOAT.name: FLOAT}
+
+# Built-in backends that are only set up when first selected, since they import modules
+# most evaluations don't need
+BACKEND_LOADERS = {"decimal": load_decimal_backend, "fraction": load_fraction_backend}
+
+# The backend named by numeric_backend, None if the name is unknown
+default_backend = BACKENDS.get(config.get("numeric_backend", "float"))
+
+def register_backend(backend):
+    """
+    Makes a NumericBackend selectable by its name.
+    """
+    global default_backend
+    BACKENDS[backend.name] = backend
+    default_backend = BACKENDS.get(config.get("numeric_backend", "float"))
+
+def get_backend(name=None):
+    """
+    Returns the backend with the given name, or the one set by numeric_backend.
+    Raises a ValueError for unknown names.
+    """
+    if isinstance(name, NumericBackend):
+        return name
+    if name is None:
+        if default_backend is not None:
+            return default_backend
+        name = config.get("numeric_backend", "float")
+    if name not in BACKENDS and name in BACKEND_LOADERS:
+        BACKEND_LOADERS[name]()
+    try:
+        return BACKENDS[name]
+    except KeyError:
+        names = ", ".join({**BACKENDS, **BACKEND_LOADERS})
+        raise ValueError(f"Unknown numeric backend '{name}'. Must be one of: {names}.")
+
+def describe_error(error):
+    """
+    Returns a readable message for an error raised by an operator. The signals of the
+    decimal context only print as a list of their classes, e.g. "[<class 'decimal.Overflow'>]".
+    """
+    if decimal is not None:
+        if isinstance(error, decimal.Overflow):
+            return "Result is too large for the decimal backend."
+        if isinstance(error, decimal.InvalidOperation):
+            return "Invalid operation for the decimal backend."
+    return str(error)
+
+def cache_key(expression, backend):
+    """
+    Returns the key of an expression evaluated with a backend in the expression caches:
+    the expression text for the float backend, (expression text, backend name) otherwise.
+    """
+    return expression if backend is FLOAT else (expression, backend.name)
@@ -0,0 +1,317 @@
+import math
+import time
+import tkinter as tk
+from tkinter import messagebox
+from cache import LRUCache
+from expression_evaluator import get_compiled
+
+# Initial x range of a plot; the y range is fitted to the curve
+DEFAULT_X_RANGE = (-10.0, 10.0)
+
+# Screen pixels between the samples of the initial grid, before refinement
+GRID_PIXELS = 6
+
+# An interval is split while its midpoint is further than this many pixels from the
+# straight line between its ends, or its ends are more than a view height apart.
+# Intervals lying above or below the view altogether are not split.
+TOLERANCE_PIXELS = 0.5
+
+# Intervals narrower than this fraction of a pixel are not split any further; a jump
+# across the whole view that is still there at this width is drawn as a break (a pole)
+MIN_INTERVAL_PIXELS = 0.25
+
+# Upper bound of the function evaluations made for one drawing
+MAX_EVALUATIONS = 20000
+
+# Number of samples remembered across redraws
+SAMPLE_CACHE_SIZE = 200000
+
+# Zoom factor of one mouse wheel step
+ZOOM_STEP = 1.25
+
+
+class FunctionSampler:
+    """
+    Samples a function of one variable for drawing. Sample points lie on a dyadic grid
+    (multiples of a power of two), so after a pan or a zoom most of the points of the new
+    view were already computed and are served from the cache.
+    The expression is compiled once and evaluated without logging or rounding.
+    """
+
+    def __init__(self, expression, variable="x"):
+        """
+        Raises a ValueError if the expression is invalid or uses another variable.
+        """
+        self.expression = expression
+        self.compiled = get_compiled(expression)
+        for name in self.compiled.variables:
+            if name != variable:
+                raise ValueError(f"Unknown name '{name}', the only variable is '{variable}'.")
+        self.variable = variable
+        self.samples = LRUCache(SAMPLE_CACHE_SIZE)
+        self.evaluations = 0
+
+    def value(self, x):
+        """
+        Returns the function value at x, or None where it is undefined (a pole, outside
+        the domain of a function, a division by zero) or not a finite number.
+        """
+        y = self.samples.get(x, self)
+        if y is not self:
+            return y
+        self.evaluations += 1
+        try:
+            y = float(self.compiled.evaluate({self.variable: x}))
+            if not math.isfinite(y):
+                y = None
+        except (ArithmeticError, ValueError, TypeError):
+            y = None
+        self.samples.put(x, y)
+        return y
+
+    def sample(self, x_min, x_max, y_min, y_max, width, height):
+        """
+        Samples the function for a view of width x height pixels showing the given ranges.
+        Intervals are split where the curve bends or jumps, so the samples are dense near
+        steep regions and poles and sparse where the function is smooth.
+        :return: A list of polylines, each a list of (x, y) points to be connected; the
+            curve is broken at undefined points and at poles.
+        """
+        x_pixel = (x_max - x_min) / max(width, 1)
+        y_pixel = (y_max - y_min) / max(height, 1)
+        tolerance = TOLERANCE_PIXELS * y_pixel
+        jump = y_max - y_min
+        min_interval = MIN_INTERVAL_PIXELS * x_pixel
+        budget = self.evaluations + MAX_EVALUATIONS
+
+        # The grid step is a power of two, so the grid points of a zoomed view are a subset
+        # or a refinement of those of the previous view
+        step = 2.0 ** math.floor(math.log2(GRID_PIXELS * x_pixel))
+        first = math.floor(x_min / step)
+        last = math.ceil(x_max / step)
+
+        lines = []
+        line = []
+
+        def add(x, y, connected):
+            nonlocal line
+            if y is None or not connected:
+                if len(line) > 0:
+                    lines.append(line)
+                line = []
+            if y is not None:
+                line.append((x, y))
+
+        def needs_split(y0, y_mid, y1):
+            if y0 is None or y1 is None or y_mid is None:
+                # Locate the edge of an undefined region, unless it's undefined throughout
+                return not (y0 is None and y1 is None and y_mid is None)
+            if min(y0, y_mid, y1) > y_max or max(y0, y_mid, y1) < y_min:
+                return False
+            return abs(y_mid - (y0 + y1) / 2) > tolerance or abs(y1 - y0) > jump
+
+        def is_pole(y0, y1):
+            return y0 is not None and y1 is not None and abs(y1 - y0) > jump \
+                and min(y0, y1) < y_max and max(y0, y1) > y_min
+
+        x0 = first * step
+        y0 = self.value(x0)
+        add(x0, y0, True)
+        for index in range(first + 1, last + 1):
+            x1 = index * step
+            y1 = self.value(x1)
+            # Depth-first refinement of [x0, x1] with an explicit stack of right halves
+            stack = [(x1, y1)]
+            left, y_left = x0, y0
+            while stack:
+                right, y_right = stack[-1]
+                middle = (left + right) / 2
+                if right - left > min_interval and self.evaluations < budget:
+                    y_middle = self.value(middle)
+                    if needs_split(y_left, y_middle, y_right):
+                        stack.append((middle, y_middle))
+                        continue
+                    add(middle, y_middle, True)
+                    add(right, y_right, True)
+                else:
+                    # Still a jump across the view at sub-pixel width: a pole, don't connect
+                    add(right, y_right, self.evaluations >= budget or not is_pole(y_left, y_right))
+                stack.pop()
+                left, y_left = right, y_right
+            x0, y0 = x1, y1
+        if line:
+            lines.append(line)
+        return lines
+
+    def fit_range(self, x_min, x_max, width):
+        """
+        Returns a y range showing most of the curve over [x_min, x_max]: the central 90% of
+        the sampled values plus a margin, ignoring the huge values next to poles.
+        """
+        step = 2.0 ** math.floor(math.log2(GRID_PIXELS * (x_max - x_min) / max(width, 1)))
+        values = sorted(y for y in (self.value(index * step) for index in
+                                    range(math.floor(x_min / step), math.ceil(x_max / step) + 1))
+                        if y is not None)
+        if not values:
+            return -10.0, 10.0
+        low = values[int(len(values) * 0.05)]
+        high = values[int((len(values) - 1) * 0.95)]
+        if high - low < 1e-9:
+            low, high = low - 1, high + 1
+        margin = (high - low) * 0.1
+        return low - margin, high + margin
+
+
+def nice_step(span, count):
+    """
+    Returns a round grid step (1, 2 or 5 times a power of ten) giving about count lines over span.
+    """
+    raw = span / max(count, 1)
+    power = 10 ** math.floor(math.log10(raw))
+    for factor in (1, 2, 5, 10):
+        if raw <= factor * power:
+            return factor * power
+    return 10 * power
+
+
+def show_plot(expression=""):
+    """
+    Opens a window plotting an expression in x. Drag to pan, use the mouse wheel to zoom
+    around the pointer; redraws reuse the samples computed for earlier views.
+    """
+    view = {
+        "x_min": DEFAULT_X_RANGE[0], "x_max": DEFAULT_X_RANGE[1],
+        "y_min": -10.0, "y_max": 10.0,
+        "sampler": None,
+        "drag": None          # Pointer position of the last drag event
+    }
+
+    def to_screen(x, y, width, height):
+        px = (x - view["x_min"]) / (view["x_max"] - view["x_min"]) * width
+        py = (view["y_max"] - y) / (view["y_max"] - view["y_min"]) * height
+        # Keep far off-screen points within what Tk can draw
+        return px, min(max(py, -10 * height), 11 * height)
+
+    def draw_axes(width, height):
+        """
+        Draws grid lines with labels and the two axes.
+        """
+        x_step = nice_step(view["x_max"] - view["x_min"], width // 80)
+        y_step = nice_step(view["y_max"] - view["y_min"], height // 60)
+        x = math.ceil(view["x_min"] / x_step) * x_step
+        while x <= view["x_max"]:
+            px, _ = to_screen(x, 0, width, height)
+            canvas.create_line(px, 0, px, height, fill="#e6e6e6")
+            canvas.create_text(px + 2, height - 2, text=f"{x:.6g}", anchor="sw", fill="#808080")
+            x += x_step
+        y = math.ceil(view["y_min"] / y_step) * y_step
+        while y <= view["y_max"]:
+            _, py = to_screen(0, y, width, height)
+            canvas.create_line(0, py, width, py, fill="#e6e6e6")
+            canvas.create_text(2, py - 2, text=f"{y:.6g}", anchor="sw", fill="#808080")
+            y += y_step
+        origin_x, origin_y = to_screen(0, 0, width, height)
+        canvas.create_line(0, origin_y, width, origin_y, fill="#606060")
+        canvas.create_line(origin_x, 0, origin_x, height, fill="#606060")
+
+    def redraw():
+        """
+        Samples the function for the current view and draws it.
+        """
+        width, height = canvas.winfo_width(), canvas.winfo_height()
+        canvas.delete("all")
+        draw_axes(width, height)
+        sampler = view["sampler"]
+        if sampler is None:
+            return
+        start = time.perf_counter()
+        evaluations = sampler.evaluations
+        lines = sampler.sample(view["x_min"], view["x_max"], view["y_min"], view["y_max"], width, height)
+        points = 0
+        for line in lines:
+            coordinates = [value for x, y in line for value in to_screen(x, y, width, height)]
+            points += len(line)
+            if len(line) == 1:
+                px, py = coordinates
+                canvas.create_oval(px - 1, py - 1, px + 1, py + 1, fill="blue", outline="blue")
+            else:
+                canvas.create_line(*coordinates, fill="blue", width=2)
+        status.set(f"{points} points, {sampler.evaluations - evaluations} evaluated, "
+                   f"{(time.perf_counter() - start) * 1000:.0f} ms")
+
+    def plot_expression(event=None):
+        """
+        Compiles the entered expression and shows it in the default x range.
+        """
+        try:
+            sampler = FunctionSampler(expression_text.get())
+        except ValueError as ve:
+            messagebox.showerror("Error", str(ve), parent=window)
+            return
+        view["sampler"] = sampler
+        view["x_min"], view["x_max"] = DEFAULT_X_RANGE
+        view["y_min"], view["y_max"] = sampler.fit_range(view["x_min"], view["x_max"], canvas.winfo_width())
+        redraw()
+
+    def on_press(event):
+        view["drag"] = (event.x, event.y)
+
+    def on_drag(event):
+        """
+        Pans the view by the distance the pointer moved.
+        """
+        last_x, last_y = view["drag"]
+        view["drag"] = (event.x, event.y)
+        dx = (event.x - last_x) / canvas.winfo_width() * (view["x_max"] - view["x_min"])
+        dy = (event.y - last_y) / canvas.winfo_height() * (view["y_max"] - view["y_min"])
+        view["x_min"] -= dx
+        view["x_max"] -= dx
+        view["y_min"] += dy
+        view["y_max"] += dy
+        redraw()
+
+    def on_mouse_wheel(event):
+        """
+        Zooms in or out keeping the point under the pointer in place.
+        """
+        factor = 1 / ZOOM_STEP if event.num == 4 or event.delta > 0 else ZOOM_STEP
+        width, height = canvas.winfo_width(), canvas.winfo_height()
+        x = view["x_min"] + event.x / width * (view["x_max"] - view["x_min"])
+        y = view["y_max"] - event.y / height * (view["y_max"] - view["y_min"])
+        view["x_min"] = x - (x - view["x_min"]) * factor
+        view["x_max"] = x + (view["x_max"] - x) * factor
+        view["y_min"] = y - (y - view["y_min"]) * factor
+        view["y_max"] = y + (view["y_max"] - y) * factor
+        redraw()
+        return "break"
+
+    # Create the plot window
+    window = tk.Toplevel()
+    window.title("Plot")
+    window.geometry("700x550")
+
+    # Expression entry
+    input_frame = tk.Frame(window)
+    input_frame.pack(side="top", fill="x", padx=10, pady=5)
+    tk.Label(input_frame, text="f(x) =", font=("Arial", 12)).pack(side="left")
+    expression_text = tk.StringVar(value=expression)
+    expression_entry = tk.Entry(input_frame, textvariable=expression_text, font=("Arial", 12))
+    expression_entry.pack(side="left", fill="x", expand=True, padx=5)
+    expression_entry.bind("<Return>", plot_expression)
+    tk.Button(input_frame, text="Plot", font=("Arial", 12), command=plot_expression).pack(side="left")
+
+    canvas = tk.Canvas(window, background="white")
+    canvas.pack(side="top", fill="both", expand=True, padx=10)
+
+    status = tk.StringVar()
+    tk.Label(window, textvariable=status, font=("Arial", 10), anchor="w").pack(side="bottom", fill="x", padx=10)
+
+    canvas.bind("<Configure>", lambda event: redraw())
+    canvas.bind("<ButtonPress-1>", on_press)
+    canvas.bind("<B1-Motion>", on_drag)
+    canvas.bind("<MouseWheel>", on_mouse_wheel)
+    canvas.bind("<Button-4>", on_mouse_wheel)
+    canvas.bind("<Button-5>", on_mouse_wheel)
+
+    if expression:
+        window.after(100, plot_expression)
@@ -0,0 +1,254 @@
+import atexit
+import hashlib
+import json
+import threading
+import time
+from decimal import Decimal
+from fractions import Fraction
+import db_log
+import metrics
+from cache import LRUCache
+from config import get_config
+from expression_parser import tokenize
+from numeric_backends import cache_key
+
+# Load configuration
+config = get_config()
+
+# Whether evaluate_expression reuses earlier results. Off by default: a cached result
+# skips the evaluation, so it must only be enabled while the operators don't change.
+enabled = config.get("result_cache_enabled", False)
+
+# Bumped when a code change makes stored results invalid
+CACHE_VERSION = 2
+
+# Stored results are written in batches: when this many are waiting, or at the first
+# store after FLUSH_INTERVAL seconds, and when the process exits
+FLUSH_SIZE = 256
+FLUSH_INTERVAL = 1.0
+
+# In-memory tier in front of the database, keyed like the compiled expression cache,
+# see numeric_backends.cache_key
+memory = LRUCache(config.get("result_cache_memory_size", 4096))
+
+# Marker kept in the memory tier for expressions whose result depends on variables
+UNCACHEABLE = object()
+
+# Fingerprints of the settings results depend on, by backend name, see fingerprint
+_fingerprints = {}
+
+# Results waiting to be written: (fingerprint, expression, result, type, last_used)
+_pending = []
+_pending_since = None
+_lock = threading.Lock()
+
+# Database files whose result table has been created by this process
+_tables_ready = set()
+
+# Lookups answered by the database tier, results stored, and entries evicted from it
+counters = {"database_hits": 0, "stores": 0, "database_evictions": 0}
+
+def apply_config(values, old_values):
+    """
+    Picks up the cache settings after the configuration is reloaded. Cached results stay
+    valid for settings they were computed with: the database is keyed by a fingerprint of
+    them, and the memory tier is cleared.
+    """
+    global enabled
+    enabled = values.get("result_cache_enabled", False)
+    memory.resize(values.get("result_cache_memory_size", 4096))
+    memory.clear()
+    _fingerprints.clear()
+
+config.subscribe(apply_config)
+
+metrics.register_collector(lambda: {f"result_cache_{key}": value for key, value in info().items()})
+
+
+def normalize(expression):
+    """
+    Returns the canonical text of an expression: tokens separated by single spaces, 'π'
+    spelled 'pi' and '**' spelled '^', so that equivalent spellings share a cache entry.
+    Only whitespace between tokens is normalized: '1 2' and '12' stay different.
+    Raises a ValueError for text that is not a valid token sequence.
+    """
+    parts = []
+    for kind, text, position in tokenize(expression):
+        if text == "π":
+            text = "pi"
+        elif text == "**":
+            text = "^"
+        parts.append(text)
+    return " ".join(parts)
+
+def fingerprint(backend):
+    """
+    Returns a hash of the settings that change the result of an evaluation with a backend:
+    the output precision, the angle unit and the precision of the decimal backend.
+    """
+    digest = _fingerprints.get(backend.name)
+    if digest is None:
+        settings = {
+            "version": CACHE_VERSION,
+            "backend": backend.name,
+            "precision": config.precision_value,
+            "angle_unit": config.get("angle_unit", "radians"),
+        }
+        if backend.name == "decimal":
+            settings["decimal_precision"] = config.get("decimal_precision", 28)
+        digest = hashlib.sha1(json.dumps(settings, sort_keys=True).encode()).hexdigest()[:16]
+        _fingerprints[backend.name] = digest
+    return digest
+
+
+# Conversion of results to and from their stored text, by type
+ENCODERS = {float: ("float", repr), int: ("int", str), Decimal: ("decimal", str), Fraction: ("fraction", str)}
+DECODERS = {"float": float, "int": int, "decimal": Decimal, "fraction": Fraction}
+
+
+def setup_table(connection):
+    """
+    Creates the result table in the log database if it doesn't exist.
+    """
+    if db_log.DB_FILE in _tables_ready:
+        return
+    with connection:
+        connection.execute("""
+            CREATE TABLE IF NOT EXISTS result_cache (
+                fingerprint TEXT NOT NULL,  -- Hash of the settings, see fingerprint
+                expression TEXT NOT NULL,   -- Normalized expression text
+                result TEXT NOT NULL,
+                type TEXT NOT NULL,         -- Number type of the result, see DECODERS
+                last_used REAL NOT NULL,    -- For least-recently-used eviction
+                PRIMARY KEY (fingerprint, expression)
+            ) WITHOUT ROWID
+        """)
+        connection.execute("CREATE INDEX IF NOT EXISTS idx_result_cache_last_used ON result_cache (last_used)")
+    _tables_ready.add(db_log.DB_FILE)
+
+def connect():
+    connection = db_log.connect_db()
+    setup_table(connection)
+    return connection
+
+
+def lookup(expression, backend):
+    """
+    Returns the cached result of an expression evaluated with a backend under the current
+    settings, or None if there is none. Only expressions without variables are cached.
+    """
+    key = cache_key(expression, backend)
+    result = memory.get(key)
+    if result is not None:
+        return None if result is UNCACHEABLE else result
+    try:
+        normalized = normalize(expression)
+        row = connect().execute(
+            "SELECT result, type FROM result_cache WHERE fingerprint = ? AND expression = ?",
+            (fingerprint(backend), normalized)
+        ).fetchone()
+    except ValueError:
+        return None
+    except Exception as e:
+        print(f"Error reading the result cache: {e}")
+        return None
+    if row is None:
+        return None
+    result = DECODERS[row[1]](row[0])
+    memory.put(key, result)
+    counters["database_hits"] += 1
+    # Write the hit back to refresh the entry's last use
+    queue(backend, normalized, row[0], row[1])
+    return result
+
+def store(expression, backend, result):
+    """
+    Caches the result of an expression that has no variables.
+    """
+    encoder = ENCODERS.get(type(result))
+    if encoder is None:
+        return
+    memory.put(cache_key(expression, backend), result)
+    try:
+        normalized = normalize(expression)
+    except ValueError:
+        return
+    counters["stores"] += 1
+    queue(backend, normalized, encoder[1](result), encoder[0])
+
+def skip(expression, backend):
+    """
+    Remembers that an expression uses variables, so that its lookups stop at the memory tier.
+    """
+    memory.put(cache_key(expression, backend), UNCACHEABLE)
+
+def queue(backend, normalized, text, type_name):
+    global _pending_since
+    now = time.time()
+    with _lock:
+        _pending.append((fingerprint(backend), normalized, text, type_name, now))
+        if _pending_since is None:
+            _pending_since = now
+        due = len(_pending) >= FLUSH_SIZE or now - _pending_since >= FLUSH_INTERVAL
+    if due:
+        flush()
+
+
+def flush():
+    """
+    Writes the waiting results in one transaction, then evicts the least recently used
+    entries beyond result_cache_size.
+    """
+    global _pending_since
+    with _lock:
+        if not _pending:
+            return
+        batch = list(_pending)
+        del _pending[:]
+        _pending_since = None
+    try:
+        connection = connect()
+        with connection:
+            connection.executemany("""
+                INSERT INTO result_cache (fingerprint, expression, result, type, last_used)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (fingerprint, expression) DO UPDATE SET last_used = excluded.last_used
+            """, batch)
+            excess = connection.execute("SELECT COUNT(*) FROM result_cache").fetchone()[0] \
+                - config.get("result_cache_size", 100000)
+            if excess > 0:
+                connection.execute("""
+                    DELETE FROM result_cache WHERE (fingerprint, expression) IN (
+                        SELECT fingerprint, expression FROM result_cache ORDER BY last_used LIMIT ?
+                    )
+                """, (excess,))
+                counters["database_evictions"] += excess
+    except Exception as e:
+        print(f"Error writing the result cache: {e}")
+
+atexit.register(flush)
+
+
+def clear():
+    """
+    Removes all cached results from memory and the database.
+    """
+    with _lock:
+        del _pending[:]
+    memory.clear()
+    try:
+        connection = connect()
+        with connection:
+            connection.execute("DELETE FROM result_cache")
+    except Exception as e:
+        print(f"Error clearing the result cache: {e}")
+
+def info():
+    """
+    Returns the counters of both tiers as a dictionary.
+    """
+    return {
+        **{f"memory_{key}": value for key, value in memory.info().items()},
+        **counters,
+        "pending": len(_pending),
+    }
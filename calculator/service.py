@@ -0,0 +1,537 @@
+import argparse
+import asyncio
+import http.client
+import json
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+# The service never shows popups, so keep tkinter out of the process
+os.environ.setdefault("CALCULATOR_HEADLESS", "1")
+
+import db_log  # noqa: E402
+import metrics  # noqa: E402
+from cli import format_result  # noqa: E402
+from expression_evaluator import evaluate_expression  # noqa: E402
+
+# Largest request body accepted, in bytes
+MAX_BODY_SIZE = 10 * 1024 * 1024
+
+STATUS_TEXT = {
+    200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+    413: "Payload Too Large", 422: "Unprocessable Entity", 504: "Gateway Timeout"
+}
+
+
+def evaluate_requests(requests):
+    """
+    Evaluates a batch of (expression, variables, backend) requests while capturing their
+    log records. Runs in the worker threads or processes of the service.
+    :return: A tuple of the (result, error) list and the captured log records.
+    """
+    db_log.start_capture()
+    try:
+        outcomes = []
+        for expression, variables, backend in requests:
+            try:
+                outcomes.append((evaluate_expression(expression, variables, backend=backend), None))
+            except ValueError as ve:
+                outcomes.append((None, str(ve)))
+        return outcomes, db_log.drain_captured()
+    finally:
+        db_log.stop_capture()
+
+
+class EvaluationService:
+    """
+    An HTTP/JSON evaluation server on asyncio. Requests are queued and sent to a thread or
+    process pool in batches, identical requests in flight share one evaluation, and the
+    log records of all evaluations are written in bulk by a single background thread so
+    that SQLite never blocks the event loop.
+
+    Endpoints:
+        POST /evaluate        {"expression": "...", "variables": {...}, "backend": "..."}
+        POST /evaluate/batch  {"expressions": ["...", {"expression": "...", ...}], "backend": "..."}
+        GET  /stats           Service counters, latency percentiles and throughput as JSON
+        GET  /metrics         All metrics in the Prometheus text format
+    """
+
+    def __init__(self, host="127.0.0.1", port=8080, unix_socket=None, workers=None, processes=False,
+                 timeout=5.0, batch_size=64, log_interval=0.2):
+        """
+        :param unix_socket: Path of a Unix socket to listen on instead of host and port.
+        :param workers: Number of worker threads or processes, defaults to the number of CPUs.
+        :param processes: Evaluate in worker processes instead of threads.
+        :param timeout: Seconds a request may wait for its result before a 504 is returned.
+        :param batch_size: Maximum number of queued evaluations sent to a worker at once.
+        :param log_interval: Seconds between bulk writes of the collected log records.
+        """
+        self.host = host
+        self.port = port
+        self.unix_socket = unix_socket
+        self.workers = workers or os.cpu_count() or 1
+        self.processes = processes
+        self.timeout = timeout
+        self.batch_size = batch_size
+        self.log_interval = log_interval
+
+        self.server = None
+        self.executor = None
+        self.log_executor = None
+        self.queue = None
+        self.slots = None
+        self.in_flight = {}
+        self.log_records = []
+        self.tasks = set()
+        self.connections = {}
+        self.started = None
+        self.loop = None
+        self.thread = None
+
+        self.request_histogram = metrics.histogram("service_request_seconds")
+        self.batch_histogram = metrics.histogram("service_batch_seconds")
+        self.requests = metrics.counter("service_requests_total")
+        self.evaluations = metrics.counter("service_evaluations_total")
+        self.coalesced = metrics.counter("service_coalesced_total")
+        self.timeouts = metrics.counter("service_timeouts_total")
+        self.errors = metrics.counter("service_errors_total")
+        self.batches = metrics.counter("service_batches_total")
+
+    @property
+    def address(self):
+        """
+        The socket address the server listens on, with the actual port if port 0 was given.
+        """
+        if self.server is None:
+            return None
+        return self.server.sockets[0].getsockname()
+
+    async def start(self):
+        executor_class = ProcessPoolExecutor if self.processes else ThreadPoolExecutor
+        self.executor = executor_class(max_workers=self.workers)
+        self.log_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="service-log")
+        self.queue = asyncio.Queue()
+        self.slots = asyncio.Semaphore(self.workers)
+        self.started = time.monotonic()
+        self.spawn(self.dispatch_loop())
+        self.spawn(self.log_loop())
+        if self.unix_socket:
+            self.server = await asyncio.start_unix_server(self.handle_connection, path=self.unix_socket)
+        else:
+            self.server = await asyncio.start_server(self.handle_connection, self.host, self.port)
+
+    async def close(self):
+        """
+        Stops accepting connections, writes the pending log records and shuts the pools down.
+        """
+        if self.server is not None:
+            self.server.close()
+        # Close idle keep-alive connections, which would keep the server from closing
+        connections = list(self.connections.items())
+        for task, writer in connections:
+            writer.close()
+        await asyncio.gather(*(task for task, writer in connections), return_exceptions=True)
+        for task in list(self.tasks):
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        if self.server is not None:
+            await self.server.wait_closed()
+        await self.flush_logs()
+        self.executor.shutdown()
+        self.log_executor.submit(db_log.close_db).result()
+        self.log_executor.shutdown()
+
+    async def serve_forever(self):
+        """
+        Serves until cancelled or the process receives SIGTERM, then closes gracefully.
+        """
+        await self.start()
+        try:
+            asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+        except (NotImplementedError, RuntimeError):
+            pass  # No signal handlers on Windows or outside the main thread
+        try:
+            await self.server.serve_forever()
+        except asyncio.CancelledError:
+            pass
+        finally:
+            await self.close()
+
+    def spawn(self, coroutine):
+        task = asyncio.ensure_future(coroutine)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return task
+
+    # Evaluation
+
+    def submit(self, expression, variables=None, backend=None):
+        """
+        Queues an evaluation, or joins the identical one already in flight.
+        :return: A future resolving to a (result, error) tuple.
+        """
+        key = (expression, json.dumps(variables, sort_keys=True), backend)
+        future = self.in_flight.get(key)
+        if future is not None:
+            self.coalesced.increment()
+            return future
+        future = asyncio.get_running_loop().create_future()
+        self.in_flight[key] = future
+        future.add_done_callback(lambda _: self.in_flight.pop(key, None))
+        self.queue.put_nowait(((expression, variables, backend), future))
+        return future
+
+    async def dispatch_loop(self):
+        """
+        Sends the queued evaluations to the pool. A batch takes everything queued at the
+        time a worker becomes free, so batches grow with the load without adding latency.
+        """
+        while True:
+            await self.slots.acquire()
+            batch = [await self.queue.get()]
+            while len(batch) < self.batch_size and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            self.spawn(self.run_batch(batch))
+
+    async def run_batch(self, batch):
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        try:
+            outcomes, records = await loop.run_in_executor(
+                self.executor, evaluate_requests, [request for request, future in batch]
+            )
+        except Exception as e:
+            for request, future in batch:
+                if not future.done():
+                    future.set_result((None, f"Error evaluating expression: {e}"))
+            return
+        finally:
+            self.slots.release()
+        self.batch_histogram.observe(time.perf_counter() - start)
+        self.batches.increment()
+        self.evaluations.increment(len(batch))
+        for (request, future), outcome in zip(batch, outcomes):
+            if not future.done():
+                future.set_result(outcome)
+        self.log_records.extend(records)
+
+    async def evaluate(self, expression, variables=None, backend=None):
+        """
+        Evaluates one expression with the request timeout.
+        Raises asyncio.TimeoutError if the result takes longer.
+        :return: A (result, error) tuple; error is None on success.
+        """
+        try:
+            # Shielded, so a timeout doesn't cancel the evaluation shared with other requests
+            return await asyncio.wait_for(asyncio.shield(self.submit(expression, variables, backend)), self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts.increment()
+            raise
+
+    # Logging
+
+    async def log_loop(self):
+        while True:
+            await asyncio.sleep(self.log_interval)
+            await self.flush_logs()
+
+    async def flush_logs(self):
+        """
+        Writes the collected log records in one transaction on the log thread.
+        """
+        if not self.log_records:
+            return
+        records, self.log_records = self.log_records, []
+        await asyncio.get_running_loop().run_in_executor(self.log_executor, db_log.log_operations, records)
+
+    # HTTP
+
+    async def handle_connection(self, reader, writer):
+        """
+        Serves the HTTP/1.1 requests of one connection, keeping it open between requests.
+        """
+        task = asyncio.current_task()
+        self.connections[task] = writer
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, path, version = request_line.decode("latin-1").split()
+                except ValueError:
+                    await self.respond(writer, 400, {"error": "Malformed request line."}, False)
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                try:
+                    length = int(headers.get("content-length") or 0)
+                    if length < 0:
+                        raise ValueError(length)
+                except ValueError:
+                    await self.respond(writer, 400, {"error": "Invalid Content-Length."}, False)
+                    break
+                if length > MAX_BODY_SIZE:
+                    await self.respond(writer, 413, {"error": "Request body too large."}, False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+
+                start = time.perf_counter()
+                status, payload = await self.route(method, path.split("?")[0], body)
+                self.requests.increment()
+                self.request_histogram.observe(time.perf_counter() - start)
+                await self.respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.connections.pop(task, None)
+            writer.close()
+
+    async def respond(self, writer, status, payload, keep_alive):
+        if isinstance(payload, str):
+            body, content_type = payload.encode(), "text/plain; version=0.0.4"
+        else:
+            body, content_type = json.dumps(payload).encode(), "application/json"
+        writer.write(
+            f"HTTP/1.1 {status} {STATUS_TEXT[status]}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+
+    async def route(self, method, path, body):
+        """
+        :return: A tuple of the HTTP status and the response payload.
+        """
+        routes = {
+            "/evaluate": ("POST", self.handle_evaluate),
+            "/evaluate/batch": ("POST", self.handle_batch),
+            "/stats": ("GET", self.handle_stats),
+            "/metrics": ("GET", self.handle_metrics),
+        }
+        if path not in routes:
+            return 404, {"error": f"Unknown path '{path}'."}
+        expected, handler = routes[path]
+        if method != expected:
+            return 405, {"error": f"Use {expected} for {path}."}
+        if method == "GET":
+            return 200, handler()
+        try:
+            request = json.loads(body or b"{}")
+        except ValueError as e:
+            return 400, {"error": f"Invalid JSON: {e}"}
+        try:
+            return await handler(request)
+        except (TypeError, KeyError, AttributeError) as e:
+            return 400, {"error": f"Invalid request: {e}"}
+
+    async def handle_evaluate(self, request):
+        expression = request["expression"]
+        if not isinstance(expression, str):
+            raise TypeError("'expression' must be a string")
+        try:
+            result, error = await self.evaluate(expression, request.get("variables"), request.get("backend"))
+        except asyncio.TimeoutError:
+            return 504, {"expression": expression, "result": None, "error": self.timeout_message()}
+        if error is not None:
+            self.errors.increment()
+            return 422, {"expression": expression, "result": None, "error": error}
+        return 200, {"expression": expression, "result": format_result(result), "error": None}
+
+    async def handle_batch(self, request):
+        backend = request.get("backend")
+        items = []
+        for item in request["expressions"]:
+            if isinstance(item, str):
+                items.append((item, None))
+            else:
+                items.append((item["expression"], item.get("variables")))
+        outcomes = await asyncio.gather(*(self.evaluate(expression, variables, backend)
+                                          for expression, variables in items), return_exceptions=True)
+        results = []
+        for (expression, variables), outcome in zip(items, outcomes):
+            if isinstance(outcome, asyncio.TimeoutError):
+                outcome = (None, self.timeout_message())
+            elif isinstance(outcome, BaseException):
+                raise outcome
+            result, error = outcome
+            if error is not None:
+                self.errors.increment()
+            results.append({"expression": expression, "result": format_result(result), "error": error})
+        return 200, {"results": results}
+
+    def timeout_message(self):
+        return f"Evaluation timed out after {self.timeout} seconds."
+
+    def handle_stats(self):
+        return self.stats()
+
+    def handle_metrics(self):
+        return metrics.to_prometheus()
+
+    def stats(self):
+        """
+        Returns the service counters, request latency percentiles and throughput.
+        """
+        uptime = time.monotonic() - self.started if self.started else 0.0
+        latency = self.request_histogram.snapshot()
+        batches = self.batches.value
+        return {
+            "uptime": round(uptime, 3),
+            "requests": self.requests.value,
+            "evaluations": self.evaluations.value,
+            "coalesced": self.coalesced.value,
+            "timeouts": self.timeouts.value,
+            "errors": self.errors.value,
+            "batches": batches,
+            "mean_batch_size": round(self.evaluations.value / batches, 2) if batches else None,
+            "queued": self.queue.qsize() if self.queue else 0,
+            "in_flight": len(self.in_flight),
+            "pending_log_records": len(self.log_records),
+            "evaluations_per_second": round(self.evaluations.value / uptime, 1) if uptime else None,
+            "latency": {key: latency[key] for key in ("count", "mean", "p50", "p90", "p99", "max")},
+        }
+
+
+def serve_in_thread(service):
+    """
+    Runs a service on an event loop in a daemon thread, e.g. for tests and benchmarks.
+    Returns once the server accepts connections; call stop_thread to shut it down.
+    """
+    ready = threading.Event()
+    errors = []
+
+    def run():
+        loop = asyncio.new_event_loop()
+        service.loop = loop
+        try:
+            loop.run_until_complete(service.start())
+        except Exception as e:
+            errors.append(e)
+            ready.set()
+            return
+        ready.set()
+        try:
+            loop.run_forever()
+        finally:
+            loop.run_until_complete(service.close())
+            loop.close()
+
+    service.thread = threading.Thread(target=run, name="evaluation-service", daemon=True)
+    service.thread.start()
+    ready.wait()
+    if errors:
+        raise errors[0]
+    return service.thread
+
+def stop_thread(service):
+    """
+    Stops a service started with serve_in_thread.
+    """
+    service.loop.call_soon_threadsafe(service.loop.stop)
+    service.thread.join()
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """
+    An HTTPConnection over a Unix socket.
+    """
+
+    def __init__(self, path, timeout=None):
+        super().__init__("localhost", timeout=timeout)
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.path)
+
+
+class ServiceClient:
+    """
+    A blocking client for the evaluation service that keeps its connection open.
+    """
+
+    def __init__(self, host="127.0.0.1", port=8080, unix_socket=None, timeout=30):
+        if unix_socket:
+            self.connection = UnixHTTPConnection(unix_socket, timeout=timeout)
+        else:
+            self.connection = http.client.HTTPConnection(host, port, timeout=timeout)
+
+    def request(self, method, path, payload=None):
+        """
+        :return: A tuple of the HTTP status and the decoded JSON (or text) response.
+        """
+        body = json.dumps(payload) if payload is not None else None
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        self.connection.request(method, path, body=body, headers=headers)
+        response = self.connection.getresponse()
+        data = response.read()
+        if response.getheader("Content-Type", "").startswith("application/json"):
+            return response.status, json.loads(data)
+        return response.status, data.decode()
+
+    def evaluate(self, expression, variables=None, backend=None):
+        """
+        :return: The response with the result, or the error message.
+        """
+        payload = {"expression": expression}
+        if variables is not None:
+            payload["variables"] = variables
+        if backend is not None:
+            payload["backend"] = backend
+        return self.request("POST", "/evaluate", payload)[1]
+
+    def evaluate_batch(self, expressions, backend=None):
+        """
+        :param expressions: Expression strings or {"expression", "variables"} objects.
+        :return: The list of results in request order.
+        """
+        payload = {"expressions": list(expressions)}
+        if backend is not None:
+            payload["backend"] = backend
+        return self.request("POST", "/evaluate/batch", payload)[1]["results"]
+
+    def stats(self):
+        return self.request("GET", "/stats")[1]
+
+    def close(self):
+        self.connection.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve expression evaluation over HTTP/JSON.")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on.")
+    parser.add_argument("--port", type=int, default=8080, help="Port to listen on.")
+    parser.add_argument("--unix-socket", help="Listen on this Unix socket instead of a TCP port.")
+    parser.add_argument("--workers", type=int, help="Worker threads or processes, defaults to the CPU count.")
+    parser.add_argument("--processes", action="store_true", help="Evaluate in worker processes.")
+    parser.add_argument("--timeout", type=float, default=5.0, help="Per-request timeout in seconds.")
+    parser.add_argument("--batch-size", type=int, default=64, help="Maximum evaluations per worker batch.")
+    args = parser.parse_args(argv)
+
+    service = EvaluationService(args.host, args.port, args.unix_socket, args.workers, args.processes,
+                                args.timeout, args.batch_size)
+    try:
+        asyncio.run(service.serve_forever())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
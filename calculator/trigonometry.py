@@ -1,14 +1,22 @@
 import math
-from config import load_config
-from error_handler import handle_error
-from db_log import log_operation  # Import the logging function for database
+from config import get_config
 
 # Load configuration
-config = load_config()
-enable_precision = config.get("enable_precision", False)
-precision_value = config.get("precision_value", None) if enable_precision else None
+config = get_config()
+precision_value = config.precision_value
 angle_unit = config.get("angle_unit", "radians")  # Default to radians
 
+def apply_config(values, old_values):
+    """
+    Picks up the precision (used by the array functions) and angle unit settings after the
+    configuration is reloaded.
+    """
+    global precision_value, angle_unit
+    precision_value = config.precision_value
+    angle_unit = values.get("angle_unit", "radians")
+
+config.subscribe(apply_config)
+
 def to_radians(angle):
     """
     Converts an angle to radians if the configuration is set to degrees.
@@ -17,138 +25,138 @@ def to_radians(angle):
         return math.radians(angle)
     return angle
 
-def apply_precision(value):
-    """
-    Applies precision rounding if enabled.
-    """
-    if precision_value is not None:
-        return round(value, precision_value)
-    return value
-
 # Core trigonometric functions
+# These are pure computations: they don't log or round, and undefined values raise a ValueError.
+# Logging and rounding are done once per evaluation by the caller, see instrumentation.
 def sin(angle):
     """
-    Calculates the sine of an angle (in radians or degrees based on config) and logs the operation.
+    Calculates the sine of an angle (in radians or degrees based on config).
     """
-    try:
-        angle = to_radians(angle)
-        result = math.sin(angle)
-        result = apply_precision(result)
-        log_operation("Sine", f"Angle: {angle} (radians)", result)
-        return result
-    except Exception as e:
-        handle_error(e, display_to_user=True)
-        log_operation("Sine", f"Angle: {angle} (radians)", "Error: An unexpected error occurred")
-        return "Error"
+    return math.sin(to_radians(angle))
 
 def cos(angle):
     """
-    Calculates the cosine of an angle (in radians or degrees based on config) and logs the operation.
+    Calculates the cosine of an angle (in radians or degrees based on config).
     """
-    try:
-        angle = to_radians(angle)
-        result = math.cos(angle)
-        result = apply_precision(result)
-        log_operation("Cosine", f"Angle: {angle} (radians)", result)
-        return result
-    except Exception as e:
-        handle_error(e, display_to_user=True)
-        log_operation("Cosine", f"Angle: {angle} (radians)", "Error: An unexpected error occurred")
-        return "Error"
+    return math.cos(to_radians(angle))
 
 def tan(angle):
     """
-    Calculates the tangent of an angle (in radians or degrees based on config). Checks for undefined values and logs the operation.
-    """
-    try:
-        angle = to_radians(angle)
-        if math.isclose(math.cos(angle), 0, abs_tol=1e-10):
-            raise ValueError("Tangent is undefined at this angle.")
-        result = math.tan(angle)
-        result = apply_precision(result)
-        log_operation("Tangent", f"Angle: {angle} (radians)", result)
-        return result
-    except Exception as e:
-        handle_error(e, display_to_user=True)
-        log_operation("Tangent", f"Angle: {angle} (radians)", "Error: An unexpected error occurred")
-        return "Error"
+    Calculates the tangent of an angle (in radians or degrees based on config). Checks for undefined values.
+    """
+    angle = to_radians(angle)
+    if math.isclose(math.cos(angle), 0, abs_tol=1e-10):
+        raise ValueError("Tangent is undefined at this angle.")
+    return math.tan(angle)
 
 def cot(angle):
     """
-    Calculates the cotangent of an angle (in radians or degrees based on config). Checks for undefined values and logs the operation.
-    """
-    try:
-        angle = to_radians(angle)
-        if math.isclose(math.sin(angle), 0, abs_tol=1e-10):
-            raise ValueError("Cotangent is undefined at this angle.")
-        result = 1 / math.tan(angle)
-        result = apply_precision(result)
-        log_operation("Cotangent", f"Angle: {angle} (radians)", result)
-        return result
-    except Exception as e:
-        handle_error(e, display_to_user=True)
-        log_operation("Cotangent", f"Angle: {angle} (radians)", "Error: An unexpected error occurred")
-        return "Error"
+    Calculates the cotangent of an angle (in radians or degrees based on config). Checks for undefined values.
+    """
+    angle = to_radians(angle)
+    if math.isclose(math.sin(angle), 0, abs_tol=1e-10):
+        raise ValueError("Cotangent is undefined at this angle.")
+    return 1 / math.tan(angle)
 
 # Inverse trigonometric functions
 def arcsin(value):
     """
-    Calculates the arcsine of a value. Ensures the input is within [-1, 1] and logs the operation.
+    Calculates the arcsine of a value. Ensures the input is within [-1, 1].
     """
-    try:
-        if not -1 <= value <= 1:
-            raise ValueError("Arcsin is undefined for values outside [-1, 1].")
-        result = math.asin(value)
-        result = apply_precision(result)
-        log_operation("Arcsine", f"Value: {value}", result)
-        return result
-    except Exception as e:
-        handle_error(e, display_to_user=True)
-        log_operation("Arcsine", f"Value: {value}", "Error: An unexpected error occurred")
-        return "Error"
+    if not -1 <= value <= 1:
+        raise ValueError("Arcsin is undefined for values outside [-1, 1].")
+    return math.asin(value)
 
 def arccos(value):
     """
-    Calculates the arccosine of a value. Ensures the input is within [-1, 1] and logs the operation.
+    Calculates the arccosine of a value. Ensures the input is within [-1, 1].
     """
-    try:
-        if not -1 <= value <= 1:
-            raise ValueError("Arccos is undefined for values outside [-1, 1].")
-        result = math.acos(value)
-        result = apply_precision(result)
-        log_operation("Arccosine", f"Value: {value}", result)
-        return result
-    except Exception as e:
-        handle_error(e, display_to_user=True)
-        log_operation("Arccosine", f"Value: {value}", "Error: An unexpected error occurred")
-        return "Error"
+    if not -1 <= value <= 1:
+        raise ValueError("Arccos is undefined for values outside [-1, 1].")
+    return math.acos(value)
 
 def arctan(value):
     """
-    Calculates the arctangent of a value and logs the operation.
+    Calculates the arctangent of a value.
     """
-    try:
-        result = math.atan(value)
-        result = apply_precision(result)
-        log_operation("Arctangent", f"Value: {value}", result)
-        return result
-    except Exception as e:
-        handle_error(e, display_to_user=True)
-        log_operation("Arctangent", f"Value: {value}", "Error: An unexpected error occurred")
-        return "Error"
+    return math.atan(value)
 
 def arccot(value):
     """
-    Calculates the arccotangent of a value and logs the operation.
-    """
-    try:
-        if math.isclose(value, 0, abs_tol=1e-10):
-            raise ValueError("Arccot is undefined for value 0.")
-        result = math.atan(1 / value)
-        result = apply_precision(result)
-        log_operation("Arccotangent", f"Value: {value}", result)
-        return result
-    except Exception as e:
-        handle_error(e, display_to_user=True)
-        log_operation("Arccotangent", f"Value: {value}", "Error: An unexpected error occurred")
-        return "Error"
\ No newline at end of file
+    Calculates the arccotangent of a value.
+    """
+    if math.isclose(value, 0, abs_tol=1e-10):
+        raise ValueError("Arccot is undefined for value 0.")
+    return math.atan(1 / value)
+
+
+# Array trigonometric functions
+def evaluate_array(operator, kernel_name, values):
+    """
+    Applies an array kernel from array_operators to a NumPy array or any buffer of numbers.
+    Applies the angle unit, domain checks and precision element-wise, and writes a single
+    summary log record for the whole batch. Requires NumPy.
+    :return: A tuple of the result array (NaN where undefined) and the boolean validity mask.
+    """
+    import numpy as np
+    import array_operators
+    import instrumentation
+
+    values = np.asarray(values, dtype=float)
+    with np.errstate(all="ignore"):
+        result, valid = getattr(array_operators, kernel_name)(values)
+    if valid is None:
+        valid = np.ones(result.shape, dtype=bool)
+    if precision_value is not None:
+        result = np.round(result, precision_value)
+    invalid = int(valid.size - np.count_nonzero(valid))
+    instrumentation.record(operator, f"Array of {values.size} values", f"{valid.size - invalid} valid, {invalid} undefined")
+    return result, valid
+
+def sin_array(angles):
+    """
+    Calculates the sine of every angle in an array. See evaluate_array.
+    """
+    return evaluate_array("Sine", "sin", angles)
+
+def cos_array(angles):
+    """
+    Calculates the cosine of every angle in an array. See evaluate_array.
+    """
+    return evaluate_array("Cosine", "cos", angles)
+
+def tan_array(angles):
+    """
+    Calculates the tangent of every angle in an array, masking angles where it is undefined.
+    """
+    return evaluate_array("Tangent", "tan", angles)
+
+def cot_array(angles):
+    """
+    Calculates the cotangent of every angle in an array, masking angles where it is undefined.
+    """
+    return evaluate_array("Cotangent", "cot", angles)
+
+def arcsin_array(values):
+    """
+    Calculates the arcsine of every value in an array, masking values outside [-1, 1].
+    """
+    return evaluate_array("Arcsine", "arcsin", values)
+
+def arccos_array(values):
+    """
+    Calculates the arccosine of every value in an array, masking values outside [-1, 1].
+    """
+    return evaluate_array("Arccosine", "arccos", values)
+
+def arctan_array(values):
+    """
+    Calculates the arctangent of every value in an array. See evaluate_array.
+    """
+    return evaluate_array("Arctangent", "arctan", values)
+
+def arccot_array(values):
+    """
+    Calculates the arccotangent of every value in an array, masking values close to 0.
+    """
+    return evaluate_array("Arccotangent", "arccot", values)
@@ -0,0 +1,85 @@
+"""
+Tests of the optimize pass of expression_parser: identities, constant folding and
+common subexpressions must not change the value (or the error) of an expression.
+
+    python -m pytest tests
+"""
+import os
+import sys
+
+import pytest
+
+CALCULATOR_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "calculator")
+
+os.environ.setdefault("CALCULATOR_HEADLESS", "1")
+sys.path.insert(0, CALCULATOR_DIR)
+
+from expression_parser import PUSH, LOAD, STORE, FETCH, compile_expression  # noqa: E402
+
+# Values of the variables used by the expressions below
+VARIABLES = {"x": 0.7, "y": -2.5}
+
+
+def evaluate_both(expression):
+    """
+    Evaluates an expression with and without the optimize pass.
+    """
+    optimized = compile_expression(expression).evaluate(VARIABLES)
+    unoptimized = compile_expression(expression, optimized=False).evaluate(VARIABLES)
+    return optimized, unoptimized
+
+
+@pytest.mark.parametrize("expression", ["x+0", "0+x", "x-0", "x*1", "1*x", "x/1", "x^1", "--x", "((x+0)*1)^1"])
+def test_identities_reduce_to_the_variable(expression):
+    compiled = compile_expression(expression)
+    assert compiled.instructions == ((LOAD, "x", None),)
+    assert compiled.evaluate(VARIABLES) == VARIABLES["x"]
+
+
+def test_constants_are_folded():
+    compiled = compile_expression("2*3+x")
+    assert compiled.instructions[0] == (PUSH, 6, None)
+    assert compiled.evaluate(VARIABLES) == 6 + VARIABLES["x"]
+
+
+@pytest.mark.parametrize("expression", ["x+1/0", "x*(2-2)+1/(2-2)", "sin(x)+log(0)", "x+arcsin(2)"])
+def test_folding_keeps_constants_that_raise(expression):
+    optimized = compile_expression(expression)
+    assert len(optimized.instructions) > 1
+    with pytest.raises(Exception) as unoptimized_error:
+        compile_expression(expression, optimized=False).evaluate(VARIABLES)
+    with pytest.raises(unoptimized_error.type):
+        optimized.evaluate(VARIABLES)
+
+
+@pytest.mark.parametrize("expression", [
+    "sin(x)*sin(x)",
+    "sin(x)^2+cos(x)^2-sin(x)*cos(x)",
+    "(x+y)*(x+y)/(x+y+1)",
+    "log(x*x+1, 2)+log(x*x+1, 2)",
+    "-(x-y)+-(x-y)*--(x-y)",
+    "x*(3-1)+y*(2.5-0.5)",
+])
+def test_common_subexpressions_match_unoptimized(expression):
+    optimized, unoptimized = evaluate_both(expression)
+    assert optimized == pytest.approx(unoptimized)
+    assert type(optimized) is type(unoptimized)
+
+
+def test_common_subexpressions_are_computed_once():
+    compiled = compile_expression("sin(x)*sin(x)")
+    opcodes = [opcode for opcode, _, _ in compiled.instructions]
+    assert compiled.temps == 1
+    assert opcodes.count(STORE) == 1 and opcodes.count(FETCH) == 1
+
+
+@pytest.mark.parametrize("expression", [
+    "+".join(["x"] * 5000),
+    "-".join(["x"] * 5000),
+    "*".join(["1"] * 5000) + "*x",
+    "+".join(["sin(x)"] * 3000),
+    "(" + "+".join(["x"] * 3000) + ")*(" + "+".join(["x"] * 3000) + ")",
+], ids=["sum", "difference", "product", "calls", "repeated_sum"])
+def test_long_chains(expression):
+    optimized, unoptimized = evaluate_both(expression)
+    assert optimized == pytest.approx(unoptimized)